@@ -0,0 +1,220 @@
+"""baseline schema with indexes for hot queries
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 11:10:06.087210
+
+Базовая схема. Раньше таблицы создавал Base.metadata.create_all при старте,
+поэтому миграция идемпотентна: на существующей БД создает только недостающие
+таблицы и индексы (и чистит дубли user_progress перед уникальным индексом).
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя, таблица, колонки, unique)
+INDEXES = [
+    # Были и при create_all
+    ("ix_users_email", "users", ["email"], True),
+    ("ix_users_id", "users", ["id"], False),
+    ("ix_careers_id", "careers", ["id"], False),
+    ("ix_chat_messages_id", "chat_messages", ["id"], False),
+    ("ix_milestones_id", "milestones", ["id"], False),
+    ("ix_modules_id", "modules", ["id"], False),
+    ("ix_roadmap_jobs_status", "roadmap_jobs", ["status"], False),
+    ("ix_roadmap_jobs_user_id", "roadmap_jobs", ["user_id"], False),
+    ("ix_checkpoints_id", "checkpoints", ["id"], False),
+    ("ix_practice_tasks_id", "practice_tasks", ["id"], False),
+    ("ix_questions_id", "questions", ["id"], False),
+    ("ix_resources_id", "resources", ["id"], False),
+    ("ix_user_progress_id", "user_progress", ["id"], False),
+    # Новые: колонки, по которым фильтруют горячие запросы
+    ("ix_careers_user_id", "careers", ["user_id"], False),
+    ("ix_modules_career_id", "modules", ["career_id"], False),
+    ("ix_questions_module_id", "questions", ["module_id"], False),
+    ("ix_resources_module_id", "resources", ["module_id"], False),
+    ("ix_chat_messages_user_created", "chat_messages", ["user_id", "created_at"], False),
+    ("ux_user_progress_user_module", "user_progress", ["user_id", "module_id"], True),
+]
+
+
+def _has_table(name: str) -> bool:
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def _existing_indexes(table: str) -> set[str]:
+    return {ix["name"] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("username", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=True),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("careers"):
+        op.create_table(
+            "careers",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("title", sa.String(), nullable=True),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("difficulty", sa.String(), nullable=True),
+            sa.Column("total_estimated_hours", sa.Integer(), nullable=True),
+            sa.Column("total_weeks", sa.Integer(), nullable=True),
+            sa.Column("focus", sa.String(), nullable=True),
+            sa.Column("assumptions_json", sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("chat_messages"):
+        op.create_table(
+            "chat_messages",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("role", sa.String(), nullable=True),
+            sa.Column("content", sa.Text(), nullable=True),
+            sa.Column("context_topic", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("is_liked", sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("milestones"):
+        op.create_table(
+            "milestones",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("career_id", sa.Integer(), nullable=True),
+            sa.Column("name", sa.String(), nullable=True),
+            sa.Column("modules_json", sa.Text(), nullable=True),
+            sa.Column("outcome", sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(["career_id"], ["careers.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("modules"):
+        op.create_table(
+            "modules",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("career_id", sa.Integer(), nullable=True),
+            sa.Column("module_id_str", sa.String(), nullable=True),
+            sa.Column("depends_on_json", sa.Text(), nullable=True),
+            sa.Column("topic", sa.String(), nullable=True),
+            sa.Column("goal", sa.Text(), nullable=True),
+            sa.Column("summary", sa.Text(), nullable=True),
+            sa.Column("estimated_hours", sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(["career_id"], ["careers.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("roadmap_jobs"):
+        op.create_table(
+            "roadmap_jobs",
+            sa.Column("id", sa.String(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("request_json", sa.Text(), nullable=True),
+            sa.Column("career_id", sa.Integer(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("attempts", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["career_id"], ["careers.id"], ),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("checkpoints"):
+        op.create_table(
+            "checkpoints",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("module_id", sa.Integer(), nullable=True),
+            sa.Column("what_to_show", sa.Text(), nullable=True),
+            sa.Column("how_to_self_check", sa.Text(), nullable=True),
+            sa.Column("rubric_json", sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(["module_id"], ["modules.id"], ),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("module_id")
+        )
+    if not _has_table("practice_tasks"):
+        op.create_table(
+            "practice_tasks",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("module_id", sa.Integer(), nullable=True),
+            sa.Column("title", sa.String(), nullable=True),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("deliverables_json", sa.Text(), nullable=True),
+            sa.Column("acceptance_criteria_json", sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(["module_id"], ["modules.id"], ),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("module_id")
+        )
+    if not _has_table("questions"):
+        op.create_table(
+            "questions",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("module_id", sa.Integer(), nullable=True),
+            sa.Column("question_text", sa.Text(), nullable=True),
+            sa.Column("options_json", sa.Text(), nullable=True),
+            sa.Column("correct_index", sa.Integer(), nullable=True),
+            sa.Column("explanation", sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(["module_id"], ["modules.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("resources"):
+        op.create_table(
+            "resources",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("module_id", sa.Integer(), nullable=True),
+            sa.Column("title", sa.String(), nullable=True),
+            sa.Column("type", sa.String(), nullable=True),
+            sa.Column("url", sa.String(), nullable=True),
+            sa.Column("search_query", sa.String(), nullable=True),
+            sa.Column("level", sa.String(), nullable=True),
+            sa.Column("why_this", sa.Text(), nullable=True),
+            sa.Column("time_estimate_hours", sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(["module_id"], ["modules.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+    if not _has_table("user_progress"):
+        op.create_table(
+            "user_progress",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("module_id", sa.Integer(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.ForeignKeyConstraint(["module_id"], ["modules.id"], ),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ),
+            sa.PrimaryKeyConstraint("id")
+        )
+
+    # Дубли (user_id, module_id) могли появиться из-за гонки в start_career —
+    # оставляем самую раннюю запись, иначе уникальный индекс не создастся
+    op.execute(
+        "DELETE FROM user_progress WHERE id NOT IN ("
+        "SELECT MIN(id) FROM user_progress GROUP BY user_id, module_id)"
+    )
+
+    for name, table, columns, unique in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    for table in (
+        "user_progress", "resources", "questions", "practice_tasks", "checkpoints",
+        "roadmap_jobs", "modules", "milestones", "chat_messages", "careers", "users",
+    ):
+        op.drop_table(table)
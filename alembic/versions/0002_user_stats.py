@@ -0,0 +1,80 @@
+"""user_stats: denormalized profile stats
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 14:02:41.518330
+
+Таблица user_stats (xp, уровень, счетчики, бейджи) для /me и бэкфилл
+из user_progress одним агрегирующим запросом.
+
+"""
+import json
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Правила геймификации на момент миграции — замороженная копия app/services/user_stats.py.
+# Не импортируем оттуда: смена правил не должна менять то, что пишет историческая миграция
+XP_PER_MODULE = 100
+XP_PER_LEVEL = 500
+BADGES = [
+    ("Explorer", lambda completed, level: True),
+    ("First Step", lambda completed, level: completed >= 1),
+    ("High Five", lambda completed, level: completed >= 5),
+    ("Dedicated", lambda completed, level: completed >= 10),
+    ("Pro", lambda completed, level: level >= 5),
+]
+
+
+def _stats_row(user_id: int, completed: int, started: int) -> dict:
+    xp = completed * XP_PER_MODULE
+    level = 1 + xp // XP_PER_LEVEL
+    return {
+        "user_id": user_id,
+        "xp": xp,
+        "level": level,
+        "completed_modules": completed,
+        "modules_started": started,
+        "badges_json": json.dumps([name for name, rule in BADGES if rule(completed, level)]),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def upgrade() -> None:
+    user_stats = op.create_table(
+        "user_stats",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("xp", sa.Integer(), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column("completed_modules", sa.Integer(), nullable=False),
+        sa.Column("modules_started", sa.Integer(), nullable=False),
+        sa.Column("badges_json", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+    # Бэкфилл: схема зафиксирована здесь, а не берется из текущих моделей
+    rows = op.get_bind().execute(sa.text(
+        "SELECT users.id, "
+        "COALESCE(SUM(CASE WHEN user_progress.status = 'COMPLETED' THEN 1 ELSE 0 END), 0), "
+        "COUNT(user_progress.id) "
+        "FROM users LEFT JOIN user_progress ON user_progress.user_id = users.id "
+        "GROUP BY users.id"
+    )).all()
+    if rows:
+        op.bulk_insert(user_stats, [_stats_row(uid, int(done), int(started)) for uid, done, started in rows])
+
+
+def downgrade() -> None:
+    op.drop_table("user_stats")
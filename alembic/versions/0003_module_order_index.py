@@ -0,0 +1,99 @@
+"""modules.order_index: stored topological order
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 15:20:07.331904
+
+Порядок модулей раньше вычислялся на каждом чтении (regex по "M<номер>").
+Теперь он хранится: бэкфилл — топологическая сортировка depends_on каждой
+карьеры, при равенстве сохраняется прежний порядок (номер из module_id_str, затем id).
+
+"""
+import heapq
+import json
+import re
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _legacy_order_key(row) -> int:
+    match = re.search(r"\d+", row.module_id_str or "")
+    return int(match.group()) if match else row.id
+
+
+def _parse_depends_on(raw) -> list[str]:
+    # До 0004 depends_on_json — Text
+    try:
+        value = json.loads(raw) if raw else []
+    except ValueError:
+        return []
+    return [dep for dep in value if isinstance(dep, str)] if isinstance(value, list) else []
+
+
+def _topological_order(names: list, depends_on: list) -> list[int]:
+    """
+    Замороженная копия app.services.progression.topological_order на момент
+    миграции: бэкфилл не должен зависеть от текущего кода приложения.
+    Позиции во входном порядке, при равенстве он сохраняется; ссылки на
+    несуществующие модули и на себя игнорируются, модули из цикла идут в конец.
+    """
+    positions = {name: pos for pos, name in enumerate(names) if name}
+    prerequisites = [
+        {positions[dep] for dep in _parse_depends_on(raw) if dep in positions and positions[dep] != pos}
+        for pos, raw in enumerate(depends_on)
+    ]
+
+    dependents = [[] for _ in names]
+    remaining = [len(prereqs) for prereqs in prerequisites]
+    for pos, prereqs in enumerate(prerequisites):
+        for dep in prereqs:
+            dependents[dep].append(pos)
+
+    ready = [pos for pos, count in enumerate(remaining) if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        pos = heapq.heappop(ready)
+        order.append(pos)
+        for child in dependents[pos]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                heapq.heappush(ready, child)
+
+    placed = set(order)
+    return order + [pos for pos in range(len(names)) if pos not in placed]
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("modules") as batch_op:
+        batch_op.add_column(sa.Column("order_index", sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, career_id, module_id_str, depends_on_json FROM modules ORDER BY career_id, id"
+    )).all()
+
+    updates = []
+    for _, career_rows in groupby(rows, key=lambda r: r.career_id):
+        career_rows = sorted(career_rows, key=lambda r: (_legacy_order_key(r), r.id))
+        order = _topological_order([r.module_id_str for r in career_rows],
+                                   [r.depends_on_json for r in career_rows])
+        updates += [{"pk": career_rows[pos].id, "idx": idx + 1} for idx, pos in enumerate(order)]
+
+    if updates:
+        bind.execute(sa.text("UPDATE modules SET order_index = :idx WHERE id = :pk"), updates)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("modules") as batch_op:
+        batch_op.drop_column("order_index")
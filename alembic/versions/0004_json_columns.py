@@ -0,0 +1,73 @@
+"""roadmap content: JSON columns instead of JSON-in-Text
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 16:05:52.904117
+
+Колонки *_json были Text с json.dumps на записи и json.loads на каждом чтении.
+Сначала чиним строки, которые не разбираются как JSON (иначе чтение через
+sa.JSON упадет), затем меняем тип. В PostgreSQL — ALTER ... USING col::json,
+в SQLite значения уже лежат JSON-текстом, batch mode только пересобирает таблицу.
+Заодно user_stats.badges_json из 0002.
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = {
+    "careers": ["assumptions_json"],
+    "modules": ["depends_on_json"],
+    "milestones": ["modules_json"],
+    "practice_tasks": ["deliverables_json", "acceptance_criteria_json"],
+    "checkpoints": ["rubric_json"],
+    "questions": ["options_json"],
+    "user_stats": ["badges_json"],
+}
+# У user_stats первичный ключ — user_id
+PRIMARY_KEYS = {"user_stats": "user_id"}
+
+
+def _is_valid_json(value: str) -> bool:
+    try:
+        json.loads(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _repair_invalid_json(bind, table: str, column: str):
+    pk = PRIMARY_KEYS.get(table, "id")
+    rows = bind.execute(sa.text(f"SELECT {pk}, {column} FROM {table} WHERE {column} IS NOT NULL")).all()
+    broken = [{"pk": row[0]} for row in rows if not _is_valid_json(row[1])]
+    if broken:
+        bind.execute(sa.text(f"UPDATE {table} SET {column} = '[]' WHERE {pk} = :pk"), broken)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            _repair_invalid_json(bind, table, column)
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(
+                    column, existing_type=sa.Text(), type_=sa.JSON(), postgresql_using=f"{column}::json"
+                )
+
+
+def downgrade() -> None:
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, existing_type=sa.JSON(), type_=sa.Text())
@@ -0,0 +1,28 @@
+"""careers.content_version for roadmap snapshots and ETags
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 17:12:30.448016
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("careers") as batch_op:
+        batch_op.add_column(sa.Column("content_version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("careers") as batch_op:
+        batch_op.drop_column("content_version")
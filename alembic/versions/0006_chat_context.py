@@ -0,0 +1,39 @@
+"""chat context: topic keyset index and rolling summaries
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 18:31:14.062589
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_chat_messages_user_topic_id", "chat_messages", ["user_id", "context_topic", "id"], unique=False
+    )
+    op.create_table(
+        "chat_summaries",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("context_topic", sa.String(), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False),
+        sa.Column("summarized_until_id", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("user_id", "context_topic"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("chat_summaries")
+    op.drop_index("ix_chat_messages_user_topic_id", table_name="chat_messages")
@@ -1,11 +1,11 @@
 # app/api/deps.py
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from jose import JWTError
 from app.core.config import settings
 from app.db.session import SessionLocal
 from app.models.user import User
+from app.services.auth_cache import auth_cache, CurrentUser
 
 # Указываем, откуда брать токен (из URL /login)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
@@ -19,10 +19,9 @@ def get_db():
         db.close()
 
 
-# Магия: превращаем токен в объект User
-def get_current_user(
-        db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
+# Магия: превращаем токен в пользователя.
+# На попадании в кэш ни jwt.decode, ни запроса в users нет — только два dict-lookup.
+def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -30,15 +29,33 @@ def get_current_user(
     )
     try:
         # Декодируем токен
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = auth_cache.decode_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    # Ищем юзера в БД
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+    user = auth_cache.get_user(email)
+    if user is not None:
+        return user
+
+    # Ищем юзера в БД (своя короткая сессия: на попадании в кэш она не нужна)
+    db = SessionLocal()
+    try:
+        db_user = db.query(User).filter(User.email == email).first()
+        if db_user is None:
+            raise credentials_exception
+        user = CurrentUser.from_orm_user(db_user)
+    finally:
+        db.close()
+
+    auth_cache.set_user(user)
+    return user
+
+
+def get_current_admin(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    # Админы задаются списком ADMIN_EMAILS в настройках
+    if current_user.email not in settings.ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -0,0 +1,67 @@
+# app/api/v1/admin.py
+from typing import Literal
+from fastapi import APIRouter, Depends, Query
+
+from app.core.config import settings
+from app.core.security import password_hasher
+from app.db.profiling import slow_queries
+from app.db.write_queue import write_queue
+from app.services.ai_roadmap_v2 import roadmap_cache
+from app.services.auth_cache import CurrentUser, auth_cache
+from app.api import deps
+
+router = APIRouter()
+
+
+@router.get("/sql/slow-queries")
+def get_slow_queries(
+        limit: int = Query(20, ge=1, le=200),
+        order_by: Literal["max_ms", "total_ms", "count"] = "max_ms",
+        admin: CurrentUser = Depends(deps.get_current_admin)
+):
+    """
+    Топ нормализованных SQL-запросов процесса (нужен SQL_PROFILING=true).
+    """
+    return {
+        "enabled": settings.SQL_PROFILING,
+        "queries": slow_queries.top(limit, order_by=order_by),
+    }
+
+
+@router.delete("/sql/slow-queries", status_code=204)
+def reset_slow_queries(admin: CurrentUser = Depends(deps.get_current_admin)):
+    slow_queries.reset()
+
+
+@router.get("/db/write-queue")
+def get_write_queue_stats(admin: CurrentUser = Depends(deps.get_current_admin)):
+    """
+    Group commit SQLite: размер пачек и ожидание (нужен SQLITE_WRITE_QUEUE_ENABLED=true).
+    """
+    return write_queue.stats()
+
+
+@router.get("/cache/auth")
+def get_auth_cache_stats(admin: CurrentUser = Depends(deps.get_current_admin)):
+    """
+    Hit rate кэша токенов и пользователей.
+    """
+    return auth_cache.stats()
+
+
+@router.get("/cache/roadmap-generation")
+def get_generation_cache_stats(admin: CurrentUser = Depends(deps.get_current_admin)):
+    """
+    Счетчики кэша генерации роадмапов (hit/miss по tier'ам) — по ним подбираем TTL.
+    """
+    if roadmap_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **roadmap_cache.stats()}
+
+
+@router.get("/auth/hasher")
+def get_password_hasher_stats(admin: CurrentUser = Depends(deps.get_current_admin)):
+    """
+    Очередь и задержки bcrypt-пула: по ним подбираем PASSWORD_HASH_WORKERS.
+    """
+    return password_hasher.stats()
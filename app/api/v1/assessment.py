@@ -1,12 +1,14 @@
 # app/api/v1/assessment.py
-import json
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
 from app.db.session import SessionLocal
-from app.models.roadmap import Question, UserProgress, Module
-from app.models.user import User
+from app.db.write_queue import run_write
+from app.models.roadmap import Question, UserProgress
+from app.services.auth_cache import CurrentUser
+from app.services.progression import progression
+from app.services.user_stats import record_progress
 from app.schemas.quiz import QuestionPublic, AnswerSubmit
 from app.api import deps
 
@@ -18,7 +20,7 @@ router = APIRouter()
 def get_quiz_for_node(
         module_id: int,
         db: Session = Depends(deps.get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: CurrentUser = Depends(deps.get_current_user)
 ):
     # Проверим, доступен ли этот урок юзеру? (Нельзя решать тесты закрытых уроков)
     progress = db.query(UserProgress).filter(
@@ -31,24 +33,40 @@ def get_quiz_for_node(
 
     questions = db.query(Question).filter(Question.module_id == module_id).all()
 
-    # Превращаем JSON-строку из БД в Python-список для ответа
+    # options_json — JSON-колонка, SQLAlchemy уже вернул список
     result = []
     for q in questions:
         result.append({
             "id": q.id,
             "text": q.question_text,  # В модели Question поле называется question_text
-            "options": json.loads(q.options_json)  # Распаковка JSON
+            "options": q.options_json
         })
     return result
 
 
+def _complete_module(db: Session, user_id: int, module_id: int) -> bool:
+    # 1. Обновляем текущий узел на COMPLETED.
+    # Условный UPDATE: повторная сдача (или параллельный дубль запроса)
+    # не начислит XP второй раз
+    newly_completed = db.query(UserProgress).filter(
+        UserProgress.user_id == user_id,
+        UserProgress.module_id == module_id,
+        UserProgress.status != "COMPLETED"
+    ).update({UserProgress.status: "COMPLETED"}, synchronize_session=False)
+    if newly_completed:
+        record_progress(db, user_id, completed_delta=1)
+        # 2. Открываем модули, у которых теперь выполнены все зависимости (depends_on)
+        progression.complete_module(db, user_id, module_id)
+    return bool(newly_completed)
+
+
 # 2. Отправить ответы и (возможно) повысить уровень
 @router.post("/node/{module_id}/submit")
 def submit_quiz(
         module_id: int,
         answers: List[AnswerSubmit],  # Юзер шлет список ответов
         db: Session = Depends(deps.get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: CurrentUser = Depends(deps.get_current_user)
 ):
     # Получаем настоящие вопросы из БД
     questions_db = db.query(Question).filter(Question.module_id == module_id).all()
@@ -73,38 +91,7 @@ def submit_quiz(
     is_passed = score_percent >= 70
 
     if is_passed:
-        # 1. Обновляем текущий узел на COMPLETED
-        current_progress = db.query(UserProgress).filter(
-            UserProgress.user_id == current_user.id,
-            UserProgress.module_id == module_id
-        ).first()
-        if current_progress:
-            current_progress.status = "COMPLETED"
-
-        # 2. Ищем СЛЕДУЮЩИЙ узел и делаем его AVAILABLE
-        # Получаем текущий модуль
-        current_module = db.query(Module).get(module_id)
-        
-        all_modules = db.query(Module).filter(Module.career_id == current_module.career_id).all()
-        # Сортируем по ID (предполагаем, что они создавались по порядку)
-        all_modules.sort(key=lambda x: x.id)
-        
-        try:
-            curr_idx = next(i for i, m in enumerate(all_modules) if m.id == module_id)
-            if curr_idx + 1 < len(all_modules):
-                next_module = all_modules[curr_idx + 1]
-                
-                next_progress = db.query(UserProgress).filter(
-                    UserProgress.user_id == current_user.id,
-                    UserProgress.module_id == next_module.id
-                ).first()
-                
-                if next_progress:
-                    next_progress.status = "AVAILABLE"
-        except StopIteration:
-            pass
-
-        db.commit()
+        run_write(db, _complete_module, current_user.id, module_id)
         
         msg = "Great job! Next lesson unlocked."
         if score_percent == 100:
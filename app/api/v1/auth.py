@@ -2,17 +2,22 @@
 from datetime import timedelta
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from app.db.session import SessionLocal
+from app.db.write_queue import run_write
 from app.models.user import User
-from app.models.roadmap import UserProgress, Module
+from app.services.auth_cache import CurrentUser
+from app.models.stats import UserStats
+from app.services.user_stats import badges_for_response, create_user_stats, rebuild_user_stats
 from app.schemas.user import UserCreate, UserResponse
 from app.schemas.token import Token
-from app.core.security import get_password_hash, verify_password, create_access_token
+from app.core.security import password_hasher, create_access_token
 from app.core.config import settings
+from app.core.ratelimit import RateLimiter
 from app.api import deps # Используем общие зависимости
 
 
@@ -33,42 +38,71 @@ class UserProfile(UserResponse):
 
 # --- Endpoints ---
 
-@router.post("/register", response_model=UserResponse)
-def register_user(user_in: UserCreate, db: Session = Depends(deps.get_db)):
-    user = db.query(User).filter(User.email == user_in.email).first()
-    if user:
-        raise HTTPException(
-            status_code=400,
-            detail="Email already registered",
-        )
+def _get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
 
+def _insert_user(db: Session, email: str, hashed_password: str) -> int:
     new_user = User(
-        email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
-        username=user_in.email.split("@")[0]
+        email=email,
+        hashed_password=hashed_password,
+        username=email.split("@")[0]
     )
 
     db.add(new_user)
+    db.flush()
+    # Строка статистики — в той же транзакции, что и пользователь
+    create_user_stats(db, new_user.id)
+    return new_user.id
+
+
+def _create_user(db: Session, email: str, hashed_password: str) -> User:
+    user_id = run_write(db, _insert_user, email, hashed_password)
+    return db.get(User, user_id)
+
+
+def _update_password_hash(db: Session, user: User, new_hash: str):
+    user.hashed_password = new_hash
     db.commit()
-    db.refresh(new_user)
 
-    return new_user
 
+# register/login — async: bcrypt идет в отдельный пул password_hasher,
+# а короткие запросы к БД — в общий threadpool
+@router.post("/register", response_model=UserResponse, dependencies=[Depends(RateLimiter("login"))])
+async def register_user(user_in: UserCreate, db: Session = Depends(deps.get_db)):
+    user = await run_in_threadpool(_get_user_by_email, db, user_in.email)
+    if user:
+        raise HTTPException(
+            status_code=400,
+            detail="Email already registered",
+        )
 
-@router.post("/login", response_model=Token)
-def login_for_access_token(
+    hashed_password = await password_hasher.hash(user_in.password)
+    return await run_in_threadpool(_create_user, db, user_in.email, hashed_password)
+
+
+@router.post("/login", response_model=Token, dependencies=[Depends(RateLimiter("login"))])
+async def login_for_access_token(
         db: Session = Depends(deps.get_db),
         form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await run_in_threadpool(_get_user_by_email, db, form_data.username)
+
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Хеш посчитан со старым PASSWORD_HASH_ROUNDS — сохраняем пересчитанный
+    if new_hash:
+        await run_in_threadpool(_update_password_hash, db, user, new_hash)
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         subject=user.email, expires_delta=access_token_expires
@@ -79,47 +113,24 @@ def login_for_access_token(
 
 @router.get("/me", response_model=UserProfile)
 def read_users_me(
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CurrentUser = Depends(deps.get_current_user),
     db: Session = Depends(deps.get_db)
 ):
-    # 1. Считаем статистику
-    progress_items = db.query(UserProgress).filter(UserProgress.user_id == current_user.id).all()
-
-    completed_count = sum(1 for p in progress_items if p.status == "COMPLETED")
-    total_started = len(progress_items)
-
-    # 2. Геймификация (простая логика)
-    # 1 модуль = 100 XP
-    xp = completed_count * 100
-
-    # Уровень: каждые 500 XP новый уровень (1 -> 5 модулей)
-    level = 1 + (xp // 500)
-
-    # 3. Ачивки (Badges)
-    badges = []
-
-    # Бейдж "Новичок" - за регистрацию (всегда есть)
-    badges.append(Badge(name="Explorer", icon="hiking", description="Started the journey"))
-
-    if completed_count >= 1:
-        badges.append(Badge(name="First Step", icon="flag", description="Completed first module"))
-
-    if completed_count >= 5:
-        badges.append(Badge(name="High Five", icon="sentiment_satisfied_alt", description="Completed 5 modules"))
-
-    if completed_count >= 10:
-        badges.append(Badge(name="Dedicated", icon="local_fire_department", description="Completed 10 modules"))
-
-    if level >= 5:
-        badges.append(Badge(name="Pro", icon="school", description="Reached Level 5"))
+    # Статистика хранится готовой в user_stats — один SELECT по первичному ключу
+    stats = db.get(UserStats, current_user.id)
+    if stats is None:
+        # Строки нет (например, не было бэкфилла) — собираем из прогресса один раз
+        rebuild_user_stats(db, user_ids=[current_user.id])
+        db.commit()
+        stats = db.get(UserStats, current_user.id)
 
     return {
         "id": current_user.id,
         "email": current_user.email,
         "username": current_user.username,
-        "level": level,
-        "xp": xp,
-        "completed_modules": completed_count,
-        "total_modules_started": total_started,
-        "badges": badges
+        "level": stats.level,
+        "xp": stats.xp,
+        "completed_modules": stats.completed_modules,
+        "total_modules_started": stats.modules_started,
+        "badges": badges_for_response(stats.badges_json)
     }
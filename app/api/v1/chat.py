@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.api import deps
-from app.models.user import User
+from app.db.session import SessionLocal
+from app.db.write_queue import run_write, run_write_async
+from app.services.auth_cache import CurrentUser
 from app.models.chat import ChatMessage
 from app.core.config import settings
-from app.core.ratelimit import rate_limiter
-from google import genai
+from app.core.ratelimit import RateLimiter
+from app.core.sse import format_sse, SSE_HEADERS
+from app.core.cache import make_cache_key
+from app.core.singleflight import SingleFlight
+from app.services.llm import llm_client, LLMTimeoutError
+from app.services.chat_context import ChatContext, chat_context, estimate_tokens
+from app.services.answer_cache import CachedAnswer, answer_cache
 
 router = APIRouter()
 
-# Инициализация клиента Gemini
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
+# Одинаковые вопросы (тема + текст), заданные одновременно, ждут один ответ Gemini
+chat_inflight = SingleFlight()
 
 class ChatRequest(BaseModel):
     message: str
@@ -20,32 +31,42 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     reply: str
     message_id: int # ID сообщения AI для лайка
+    cached: bool = False # ответ взят из кэша похожих вопросов, без вызова Gemini
 
-@router.post("/ask", response_model=ChatResponse, dependencies=[Depends(rate_limiter)])
-def ask_ai_mentor(
-    request: ChatRequest,
-    current_user: User = Depends(deps.get_current_user),
-    db: Session = Depends(deps.get_db)
-):
-    """
-    Отвечает на вопросы пользователя в контексте текущей темы обучения.
-    """
-    # 1. Сохраняем вопрос пользователя
-    user_msg = ChatMessage(
-        user_id=current_user.id,
-        role="user",
-        content=request.message,
-        context_topic=request.context_topic
+class ChatHistoryMessage(BaseModel):
+    id: int
+    role: str
+    content: str
+    context_topic: Optional[str] = None
+    created_at: Optional[datetime] = None
+    is_liked: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+def _insert_message(db: Session, user_id: int, role: str, content: str, context_topic: str) -> int:
+    msg = ChatMessage(
+        user_id=user_id,
+        role=role,
+        content=content,
+        context_topic=context_topic
     )
-    db.add(user_msg)
-    db.commit()
+    db.add(msg)
+    db.flush()
+    return msg.id
 
-    try:
-        # 2. Формируем промпт
-        prompt = f"""
-        You are an expert AI Tech Mentor for a student named {current_user.username}.
+
+def _save_message(db: Session, user_id: int, role: str, content: str, context_topic: str) -> int:
+    # С SQLITE_WRITE_QUEUE_ENABLED запись уходит в общий group commit
+    return run_write(db, _insert_message, user_id, role, content, context_topic)
+
+
+def _build_prompt(request: ChatRequest, history: str = "") -> str:
+    history_block = f"\n{history}\n" if history else ""
+    return f"""
+        You are an expert AI Tech Mentor for a student.
         The student is currently studying the topic: "{request.context_topic}".
-        
+        {history_block}
         The student asks: "{request.message}"
         
         Provide a helpful, concise, and encouraging answer. 
@@ -53,26 +74,87 @@ def ask_ai_mentor(
         Keep the tone friendly and professional.
         """
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
+
+def _save_question_with_context(db: Session, user_id: int, request: ChatRequest) -> tuple[str, ChatContext]:
+    """
+    Сохраняет вопрос и собирает промпт с историей темы в пределах CHAT_CONTEXT_TOKEN_BUDGET.
+    """
+    question_id = _save_message(db, user_id, "user", request.message, request.context_topic)
+    context = chat_context.assemble(
+        db, user_id, request.context_topic, before_id=question_id,
+        reserved_tokens=estimate_tokens(_build_prompt(request)),
+    )
+    return _build_prompt(request, context.history), context
+
+
+def _cached_answer(request: ChatRequest, context: ChatContext) -> Optional[CachedAnswer]:
+    # Ответ на уточняющий вопрос зависит от истории — из кэша отдаем только вопросы без нее
+    if answer_cache is None or context.history:
+        return None
+    return answer_cache.lookup(request.context_topic, request.message)
+
+
+def _remember_answer(request: ChatRequest, context: ChatContext, message_id: int, reply: str):
+    if answer_cache is not None and not context.history:
+        answer_cache.add(request.context_topic, request.message, reply, message_id)
+
+
+def _save_cached_reply(db: Session, user_id: int, request: ChatRequest, cached: CachedAnswer) -> int:
+    message_id = _save_message(db, user_id, "ai", cached.reply, request.context_topic)
+    answer_cache.link(message_id, cached.source_id)
+    return message_id
+
+
+@router.post("/ask", response_model=ChatResponse, dependencies=[Depends(RateLimiter("chat"))])
+async def ask_ai_mentor(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: CurrentUser = Depends(deps.get_current_user),
+    db: Session = Depends(deps.get_db)
+):
+    """
+    Отвечает на вопросы пользователя в контексте текущей темы обучения.
+    Эндпоинт асинхронный: ожидание Gemini не держит поток из пула,
+    а короткие операции с БД выполняются в threadpool.
+    """
+    # Читаем поля до commit: после него ORM-объект expired и полез бы в БД из event loop
+    user_id = current_user.id
+
+    # 1. Сохраняем вопрос пользователя и 2. формируем промпт с историей темы
+    prompt, context = await run_in_threadpool(_save_question_with_context, db, user_id, request)
+
+    # Похожий вопрос в этой теме уже получил ответ (и его не дизлайкнули) — Gemini не нужен
+    cached = _cached_answer(request, context)
+    if cached is not None:
+        message_id = await run_in_threadpool(_save_cached_reply, db, user_id, request, cached)
+        return {"reply": cached.reply, "message_id": message_id, "cached": True}
+
+    try:
+        # Одинаковые вопросы с одинаковой историей (в том числе пустой) делят один ответ.
+        # digest контекста в ключе: иначе ответ, учитывающий чужую историю, ушел бы другому
+        key = make_cache_key("chat", {
+            "topic": " ".join(request.context_topic.split()).casefold(),
+            "message": " ".join(request.message.split()).casefold(),
+            "context": context.digest,
+        })
+        reply_text = await chat_inflight.do(
+            key, lambda: llm_client.generate_text(prompt, model=settings.GEMINI_CHAT_MODEL)
         )
-        
-        reply_text = response.text
 
         # 3. Сохраняем ответ AI
-        ai_msg = ChatMessage(
-            user_id=current_user.id,
-            role="ai",
-            content=reply_text,
-            context_topic=request.context_topic
+        message_id = await run_write_async(db, _insert_message, user_id, "ai", reply_text, request.context_topic)
+        _remember_answer(request, context, message_id, reply_text)
+
+        # 4. Уже после ответа: сворачиваем вышедшие из окна реплики в сводку
+        background_tasks.add_task(
+            chat_context.refresh_summary, user_id, request.context_topic, context.window_start_id
         )
-        db.add(ai_msg)
-        db.commit()
-        db.refresh(ai_msg)
-        
-        return {"reply": reply_text, "message_id": ai_msg.id}
 
+        return {"reply": reply_text, "message_id": message_id}
+
+    except LLMTimeoutError as e:
+        print(f"AI Chat Timeout: {e}")
+        raise HTTPException(status_code=504, detail="AI Mentor took too long to answer. Please try again.")
     except Exception as e:
         print(f"AI Chat Error: {e}")
         if "429" in str(e):
@@ -80,17 +162,106 @@ def ask_ai_mentor(
         raise HTTPException(status_code=500, detail="AI Mentor is currently unavailable.")
 
 
+@router.post("/ask/stream", dependencies=[Depends(RateLimiter("chat"))])
+async def ask_ai_mentor_stream(
+    request: ChatRequest,
+    current_user: CurrentUser = Depends(deps.get_current_user),
+    db: Session = Depends(deps.get_db)
+):
+    """
+    То же, что /ask, но ответ идет по SSE кусками по мере генерации:
+    - event: chunk  data: {"text": "..."}
+    - event: done   data: {"message_id": 123}  (после сохранения полного ответа)
+    - event: error  data: {"detail": "..."}
+    Если клиент отключился, стрим к Gemini закрывается и ответ не сохраняется.
+    """
+    user_id = current_user.id
+    prompt, context = await run_in_threadpool(_save_question_with_context, db, user_id, request)
+    cached = _cached_answer(request, context)
+
+    async def cached_stream():
+        # Ответ из кэша уходит одним chunk
+        message_id = await run_in_threadpool(_save_cached_reply, db, user_id, request, cached)
+        yield format_sse("chunk", {"text": cached.reply})
+        yield format_sse("done", {"message_id": message_id, "cached": True})
+
+    async def event_stream():
+        parts = []
+        try:
+            async for text in llm_client.stream_text(prompt, model=settings.GEMINI_CHAT_MODEL):
+                parts.append(text)
+                yield format_sse("chunk", {"text": text})
+        except LLMTimeoutError as e:
+            print(f"AI Chat Timeout: {e}")
+            yield format_sse("error", {"detail": "AI Mentor took too long to answer. Please try again."})
+            return
+        except Exception as e:
+            print(f"AI Chat Error: {e}")
+            detail = "AI Service is busy. Please try again later." if "429" in str(e) else "AI Mentor is currently unavailable."
+            yield format_sse("error", {"detail": detail})
+            return
+
+        # Своя сессия: стрим живет дольше обычного запроса
+        def save_reply() -> int:
+            with SessionLocal() as session:
+                return _save_message(session, user_id, "ai", "".join(parts), request.context_topic)
+
+        message_id = await run_in_threadpool(save_reply)
+        _remember_answer(request, context, message_id, "".join(parts))
+        yield format_sse("done", {"message_id": message_id})
+        # Клиент уже получил done — сворачиваем старые реплики, пока соединение закрывается
+        await chat_context.refresh_summary(user_id, request.context_topic, context.window_start_id)
+
+    return StreamingResponse(
+        cached_stream() if cached is not None else event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@router.get("/history", response_model=List[ChatHistoryMessage])
+def get_chat_history(
+    response: Response,
+    context_topic: Optional[str] = None,
+    cursor: Optional[int] = Query(None, description="id самого старого сообщения предыдущей страницы"),
+    limit: int = Query(settings.CHAT_HISTORY_PAGE_LIMIT, ge=1, le=200),
+    current_user: CurrentUser = Depends(deps.get_current_user),
+    db: Session = Depends(deps.get_db)
+):
+    """
+    История чата от новых к старым, keyset по id (как GET /roadmaps/):
+    следующая страница — ?cursor=<id последнего сообщения>, он же в X-Next-Cursor.
+    """
+    query = db.query(ChatMessage).filter(ChatMessage.user_id == current_user.id)
+    if context_topic is not None:
+        query = query.filter(ChatMessage.context_topic == context_topic)
+    if cursor is not None:
+        query = query.filter(ChatMessage.id < cursor)
+    messages = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+
+    if len(messages) > limit:
+        messages = messages[:limit]
+        response.headers["X-Next-Cursor"] = str(messages[-1].id)
+    return messages
+
+
+def _set_liked(db: Session, message_id: int, user_id: int, is_liked: bool) -> int:
+    return db.query(ChatMessage).filter(
+        ChatMessage.id == message_id, ChatMessage.user_id == user_id
+    ).update({ChatMessage.is_liked: is_liked}, synchronize_session=False)
+
+
 @router.post("/{message_id}/like")
 def like_message(
     message_id: int,
     is_liked: bool = True,
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CurrentUser = Depends(deps.get_current_user),
     db: Session = Depends(deps.get_db)
 ):
-    msg = db.query(ChatMessage).filter(ChatMessage.id == message_id, ChatMessage.user_id == current_user.id).first()
-    if not msg:
+    updated = run_write(db, _set_liked, message_id, current_user.id, is_liked)
+    if not updated:
         raise HTTPException(status_code=404, detail="Message not found")
-    
-    msg.is_liked = is_liked
-    db.commit()
+    # Дизлайкнутый ответ больше не отдается из кэша, лайкнутый — в приоритете
+    if answer_cache is not None:
+        answer_cache.feedback(message_id, is_liked)
     return {"status": "ok"}
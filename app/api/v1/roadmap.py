@@ -1,41 +1,72 @@
 # app/api/v1/roadmap.py
-import json
-import re
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from sqlalchemy.orm import Session, subqueryload
+from sqlalchemy import and_, case, func, insert, or_
+from sqlalchemy.exc import IntegrityError
 from typing import List
 
 from app.db.session import SessionLocal
-from app.models.roadmap import Career, UserProgress, Module, Question, Resource
-from app.models.user import User
-from app.schemas.roadmap import CareerResponse, RoadmapGenerateRequest
+from app.db.write_queue import run_write
+from app.models.roadmap import Career, UserProgress, Module, Resource
+from app.services.auth_cache import CurrentUser
+from app.schemas.roadmap import CareerListItem, CareerResponse, RoadmapGenerateRequest
 from app.services.ai_roadmap import ai_service
+from app.services.roadmap_persistence import roadmap_graph_v1, write_roadmap
+from app.services.progression import progression
+from app.services.roadmap_snapshots import (
+    STATUS_PLACEHOLDER, RoadmapSnapshot, gzip_etag, roadmap_etag, roadmap_snapshots
+)
+from app.services.user_stats import record_progress
 from app.api import deps
+from app.core.config import settings
+from app.core.ratelimit import RateLimiter
+from app.core.serialization import JSONBytesResponse, ResponseSerializer, etag_match
 
 router = APIRouter()
 
+# Тяжелые ответы сериализуем сами (одна валидация + байты), см. app/core/serialization.py
+career_serializer = ResponseSerializer(CareerResponse)
+career_list_serializer = ResponseSerializer(List[CareerListItem])
 
-def _module_order_key(module: Module) -> int:
-    if module.module_id_str:
-        match = re.search(r"\d+", module.module_id_str)
-        if match:
-            return int(match.group())
-    return module.id or 0
+
+def _graph_to_response(graph: dict) -> dict:
+    """
+    Ответ для только что сгенерированного роадмапа — из графа в памяти, без запросов в БД.
+    """
+    nodes = []
+    for module in sorted(graph["modules"], key=lambda m: m["module"]["order_index"]):
+        row = module["module"]
+        nodes.append({
+            "id": row["id"],
+            "title": row["topic"] or (row["module_id_str"] or ""),
+            "description_content": row["goal"],
+            "summary": row["summary"],
+            "order_index": row["order_index"],
+            "status": "LOCKED",
+            "resources": module["resources"],
+        })
+
+    career = graph["career"]
+    return {
+        "id": career["id"],
+        "title": career["title"],
+        "description": career["description"],
+        "nodes": nodes,
+    }
 
 
 def _career_to_response(career: Career, progress_map: dict[int, str] | None = None) -> dict:
-    modules = sorted(career.modules or [], key=_module_order_key)
     progress_map = progress_map or {}
 
+    # career.modules уже отсортированы по order_index (order_by в relationship)
     nodes = []
-    for module in modules:
+    for module in career.modules or []:
         nodes.append({
             "id": module.id,
             "title": module.topic or (module.module_id_str or ""),
             "description_content": module.goal,
             "summary": module.summary, # <-- Добавили summary
-            "order_index": _module_order_key(module),
+            "order_index": module.order_index,
             "status": progress_map.get(module.id, "LOCKED"),
             "resources": module.resources or [],
         })
@@ -48,40 +79,174 @@ def _career_to_response(career: Career, progress_map: dict[int, str] | None = No
     }
 
 
-@router.get("/", response_model=List[CareerResponse])
+def _career_read_options():
+    # План загрузки для чтения роадмапов: модули и их ресурсы подтягиваются
+    # ровно двумя запросами на всю выборку, а не по запросу на каждую карьеру/модуль.
+    # subqueryload, а не selectinload: тот режет IN по 500 id, и число запросов растет с данными
+    return (subqueryload(Career.modules).subqueryload(Module.resources),)
+
+
+def _visible_careers_filter(user_id: int):
+    return or_(
+        Career.user_id == None,  # Общие
+        Career.user_id == user_id  # Личные
+    )
+
+
+def _load_progress_map(db: Session, user_id: int, career_condition) -> dict[int, str]:
+    """
+    {module_id: status} только по модулям нужных карьер,
+    а не весь прогресс пользователя по всем карьерам.
+    """
+    rows = db.query(UserProgress.module_id, UserProgress.status).join(
+        Module, Module.id == UserProgress.module_id
+    ).filter(
+        UserProgress.user_id == user_id,
+        career_condition
+    ).all()
+    return {module_id: status for module_id, status in rows}
+
+
+LIST_FIELDS = ("id", "title", "description", "progress")
+LIST_INCLUDES = ("nodes", "resources")
+
+
+def _parse_csv(value: str | None, allowed: tuple[str, ...], default: tuple[str, ...], param: str) -> set[str]:
+    if value is None:
+        return set(default)
+    items = {item.strip() for item in value.split(",") if item.strip()}
+    unknown = items - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {param}: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}",
+        )
+    return items
+
+
+def _load_progress_counts(db: Session, user_id: int, career_ids: list[int]) -> dict[int, dict]:
+    # Счетчики одним GROUP BY вместо загрузки модулей
+    rows = db.query(
+        Module.career_id,
+        func.count(Module.id),
+        func.coalesce(func.sum(case((UserProgress.status == "COMPLETED", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((UserProgress.status == "AVAILABLE", 1), else_=0)), 0),
+    ).outerjoin(
+        UserProgress, and_(UserProgress.module_id == Module.id, UserProgress.user_id == user_id)
+    ).filter(
+        Module.career_id.in_(career_ids)
+    ).group_by(Module.career_id).all()
+    counts = {career_id: {"total": 0, "completed": 0, "available": 0} for career_id in career_ids}
+    for career_id, total, completed, available in rows:
+        counts[career_id] = {"total": total, "completed": completed, "available": available}
+    return counts
+
+
+def _load_nodes(db: Session, user_id: int, career_ids: list[int], with_resources: bool) -> dict[int, list[dict]]:
+    # Только колонки, которые попадают в ответ (goal — это description_content; без estimated_hours и прочего контента v2)
+    modules = db.query(
+        Module.id, Module.career_id, Module.topic, Module.module_id_str,
+        Module.goal, Module.summary, Module.order_index,
+    ).filter(Module.career_id.in_(career_ids)).order_by(Module.career_id, Module.order_index).all()
+    progress_map = _load_progress_map(db, user_id, Module.career_id.in_(career_ids))
+
+    resources: dict[int, list[dict]] = {}
+    if with_resources:
+        rows = db.query(
+            Resource.module_id, Resource.title, Resource.type, Resource.url, Resource.level, Resource.why_this
+        ).join(Module, Module.id == Resource.module_id).filter(
+            Module.career_id.in_(career_ids)
+        ).order_by(Resource.id).all()
+        for row in rows:
+            resources.setdefault(row.module_id, []).append({
+                "title": row.title, "type": row.type, "url": row.url, "level": row.level, "why_this": row.why_this,
+            })
+
+    nodes: dict[int, list[dict]] = {career_id: [] for career_id in career_ids}
+    for module in modules:
+        nodes[module.career_id].append({
+            "id": module.id,
+            "title": module.topic or (module.module_id_str or ""),
+            "description_content": module.goal,
+            "summary": module.summary,
+            "order_index": module.order_index,
+            "status": progress_map.get(module.id, "LOCKED"),
+            "resources": resources.get(module.id, []),
+        })
+    return nodes
+
+
+@router.get("/", response_model=List[CareerListItem])
 def get_all_careers(
+        request: Request,
+        cursor: int | None = Query(None, description="id последней карьеры предыдущей страницы"),
+        limit: int = Query(settings.ROADMAP_LIST_DEFAULT_LIMIT, ge=1, le=settings.ROADMAP_LIST_MAX_LIMIT),
+        fields: str | None = Query(None, description="id,title,description,progress"),
+        include: str | None = Query(None, description="nodes,resources; пусто — без узлов"),
         db: Session = Depends(deps.get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: CurrentUser = Depends(deps.get_current_user)
 ):
     """
     Показывает:
     1. Общие шаблоны (user_id IS NULL)
     2. Личные роадмапы этого пользователя (user_id == current_user.id)
-    """
-    careers = db.query(Career).filter(
-        or_(
-            Career.user_id == None,  # Общие
-            Career.user_id == current_user.id  # Личные
-        )
-    ).all()
-
-    user_progress_records = db.query(UserProgress).filter(
-        UserProgress.user_id == current_user.id
-    ).all()
-    progress_map = {p.module_id: p.status for p in user_progress_records}
 
-    return [_career_to_response(career, progress_map) for career in careers]
+    Keyset-пагинация по id: следующая страница — ?cursor=<id последнего элемента>,
+    он же в заголовке X-Next-Cursor (и Link rel="next"), пока страницы не кончились.
+    fields — поля карьеры (progress — счетчики модулей), include — вложенные
+    узлы и ресурсы (по умолчанию оба, как раньше). Для списка на дашборде:
+    ?fields=id,title,description&include=
+    """
+    selected = _parse_csv(fields, LIST_FIELDS, ("id", "title", "description"), "fields")
+    includes = _parse_csv(include, LIST_INCLUDES, LIST_INCLUDES, "include")
+
+    columns = [Career.id] + [getattr(Career, name) for name in ("title", "description") if name in selected]
+    query = db.query(*columns).filter(_visible_careers_filter(current_user.id))
+    if cursor is not None:
+        query = query.filter(Career.id > cursor)
+    rows = query.order_by(Career.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    career_ids = [row.id for row in rows]
+
+    items = [row._asdict() for row in rows]
+    if career_ids and "progress" in selected:
+        counts = _load_progress_counts(db, current_user.id, career_ids)
+        for item in items:
+            item["progress"] = counts[item["id"]]
+    if career_ids and includes:
+        nodes = _load_nodes(db, current_user.id, career_ids, with_resources="resources" in includes)
+        for item in items:
+            item["nodes"] = nodes[item["id"]]
+
+    headers = {}
+    if has_more:
+        next_cursor = str(career_ids[-1])
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return career_list_serializer.response(items, headers=headers, exclude_unset=True)
+
+
+def _insert_progress(db: Session, user_id: int, statuses: dict[int, str]):
+    # 3. Создаем записи прогресса для ВСЕХ узлов этой карьеры — одним executemany
+    db.execute(insert(UserProgress), [
+        {"user_id": user_id, "module_id": module_id, "status": status}
+        for module_id, status in statuses.items()
+    ])
+    # Статистика профиля — в той же транзакции, что и прогресс
+    record_progress(db, user_id, started_delta=len(statuses))
 
 
 @router.post("/{career_id}/start", status_code=201)
 def start_career(
         career_id: int,
         db: Session = Depends(deps.get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: CurrentUser = Depends(deps.get_current_user)
 ):
     """
     Начать обучение: создает записи прогресса для юзера.
-    Первый узел становится AVAILABLE, остальные LOCKED.
+    Модули без зависимостей (по depends_on) становятся AVAILABLE, остальные LOCKED.
     """
     # 1. Проверяем, существует ли карьера
     career = db.query(Career).filter(Career.id == career_id).first()
@@ -89,64 +254,94 @@ def start_career(
         raise HTTPException(status_code=404, detail="Career not found")
 
     # 2. Проверяем, не начал ли он уже (чтобы не сбросить прогресс)
-    modules = sorted(career.modules or [], key=_module_order_key)
-    if not modules:
+    statuses = progression.initial_statuses(db, career_id)
+    if not statuses:
         raise HTTPException(status_code=400, detail="Career has no modules")
 
-    existing_progress = db.query(UserProgress).filter(
+    existing_progress = db.query(UserProgress.id).filter(
         UserProgress.user_id == current_user.id,
-        UserProgress.module_id == modules[0].id  # Проверяем по первому модулю
+        UserProgress.module_id.in_(list(statuses))
     ).first()
 
     if existing_progress:
         return {"message": "Career already started"}
 
-    # 3. Создаем записи прогресса для ВСЕХ узлов этой карьеры
-    progress_list = []
-    for idx, module in enumerate(modules):
-        # Первый модуль -> AVAILABLE, остальные -> LOCKED
-        initial_status = "AVAILABLE" if idx == 0 else "LOCKED"
+    try:
+        run_write(db, _insert_progress, current_user.id, statuses)
+    except IntegrityError:
+        # Параллельный запрос успел создать прогресс первым (уникальный индекс user_id+module_id)
+        return {"message": "Career already started"}
+    return {"message": "Career started successfully"}
 
-        new_progress = UserProgress(
-            user_id=current_user.id,
-            module_id=module.id,
-            status=initial_status
-        )
-        db.add(new_progress)
 
-    db.commit()
-    return {"message": "Career started successfully"}
+def _build_snapshot(db: Session, career_id: int) -> RoadmapSnapshot | None:
+    career = db.query(Career).options(*_career_read_options()).filter(Career.id == career_id).first()
+    if not career:
+        return None
+    module_ids = [module.id for module in career.modules or []]
+    data = _career_to_response(career, dict.fromkeys(module_ids, STATUS_PLACEHOLDER))
+    return RoadmapSnapshot.from_body(career.id, career.content_version, module_ids, career_serializer.dump(data))
 
 
 @router.get("/{career_id}", response_model=CareerResponse)
 def get_career_details(
         career_id: int,
         db: Session = Depends(deps.get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: CurrentUser = Depends(deps.get_current_user),
+        if_none_match: str | None = Header(None),
+        accept_encoding: str | None = Header(None),
 ):
     """
     Получить роадмап с ПЕРСОНАЛЬНЫМИ статусами (Locked/Available/Completed).
+
+    Контент карьеры берется из готового снимка (по content_version), статусы
+    пользователя подставляются в него поверх. ETag зависит от версии и статусов:
+    повторная загрузка с If-None-Match стоит два маленьких запроса и 304.
     """
-    career = db.query(Career).filter(Career.id == career_id).first()
-    if not career:
+    version = db.query(Career.content_version).filter(Career.id == career_id).scalar()
+    if version is None:
         raise HTTPException(status_code=404, detail="Career not found")
 
-    # 1. Получаем прогресс юзера из БД
+    # 1. Получаем прогресс юзера по модулям ЭТОЙ карьеры
     # Делаем словарь: {node_id: "STATUS"} для быстрого поиска
-    user_progress_records = db.query(UserProgress).filter(
-        UserProgress.user_id == current_user.id
-    ).all()
-
-    progress_map = {p.module_id: p.status for p in user_progress_records}
-
-    return _career_to_response(career, progress_map)
+    progress_map = _load_progress_map(db, current_user.id, Module.career_id == career_id)
+
+    etag = roadmap_etag(career_id, version, progress_map)
+    use_gzip = "gzip" in (accept_encoding or "")
+    headers = {
+        "ETag": etag,
+        # Статусы личные: браузер может хранить, но каждый раз перепроверяет по ETag
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding, Authorization",
+    }
+    matched = etag_match(if_none_match, etag, gzip_etag(etag))
+    if matched:
+        headers["ETag"] = matched
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
+    snapshot = roadmap_snapshots.get(career_id, version, lambda: _build_snapshot(db, career_id))
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Career not found")
 
-@router.post("/generate", response_model=CareerResponse, deprecated=True)
+    body = snapshot.render(progress_map)
+    compressed = roadmap_snapshots.compress(etag, body) if use_gzip else None
+    if compressed is not None:
+        body = compressed
+        headers["ETag"] = gzip_etag(etag)
+        headers["Content-Encoding"] = "gzip"
+    return JSONBytesResponse(content=body, headers=headers)
+
+
+@router.post(
+    "/generate",
+    response_model=CareerResponse,
+    deprecated=True,
+    dependencies=[Depends(RateLimiter("roadmap_generate"))],
+)
 def generate_custom_roadmap(
         request: RoadmapGenerateRequest,
         db: Session = Depends(deps.get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: CurrentUser = Depends(deps.get_current_user)
 ):
     """
     Принимает анкету, генерирует роадмап через AI (или Mock),
@@ -160,60 +355,6 @@ def generate_custom_roadmap(
         hours=request.hours_per_week
     )
 
-    # 2. Создаем новую карьеру в БД (привязанную к user_id)
-    new_career = Career(
-        user_id=current_user.id,  # ПРИВЯЗКА К ЮЗЕРУ!
-        title=ai_data["title"],
-        description=ai_data["description"]
-    )
-    db.add(new_career)
-    db.commit()
-    db.refresh(new_career)
-
-    # 3. Сохраняем узлы и тесты
-    for idx, node_data in enumerate(ai_data["nodes"]):
-        module_id_str = f"M{idx + 1}"
-        depends_on = [f"M{idx}"] if idx > 0 else []
-        new_module = Module(
-            career_id=new_career.id,
-            module_id_str=module_id_str,
-            depends_on_json=json.dumps(depends_on),
-            topic=node_data.get("title"),
-            goal=node_data.get("desc"),
-            summary=node_data.get("summary"), # <-- Сохраняем summary
-            estimated_hours=node_data.get("estimated_hours", 0)
-        )
-        db.add(new_module)
-        db.commit()
-        db.refresh(new_module)
-
-        if "resources" in node_data:
-            for res in node_data["resources"]:
-                new_res = Resource(
-                    module_id=new_module.id,
-                    title=res["title"],
-                    type=res["type"],
-                    url=res["url"],
-                    level=res.get("level", "beginner"),
-                    why_this=res.get("why_this", ""),
-                    time_estimate_hours=res.get("time_estimate_hours", 0)
-                )
-                db.add(new_res)
-
-        # Сохраняем тест
-        if "quiz" in node_data and isinstance(node_data["quiz"], list):
-            for q in node_data["quiz"]:
-                new_question = Question(
-                    module_id=new_module.id,
-                    question_text=q["text"],
-                    options_json=json.dumps(q["options"]),
-                    correct_index=q["correct"],
-                    explanation=q.get("explanation", "")
-                )
-                db.add(new_question)
-
-        db.commit()
-
-
-    db.refresh(new_career)
-    return _career_to_response(new_career, {})
+    # 2. Сохраняем карьеру, узлы, ресурсы и тесты одной транзакцией
+    graph = write_roadmap(db, roadmap_graph_v1(current_user.id, ai_data))
+    return career_serializer.response(_graph_to_response(graph))
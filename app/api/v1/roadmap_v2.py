@@ -1,32 +1,72 @@
 # app/api/v1/roadmap_v2.py
-import json
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 
 # Импортируем все наши новые модели
-from app.models.user import User
-from app.models.roadmap import (
-    Career, Module, Milestone, Resource, PracticeTask, Checkpoint, Question
-)
+from app.services.auth_cache import CurrentUser
+from app.models.roadmap import Career
+from app.models.job import RoadmapJob
+from app.core.config import settings
+from app.core.sse import format_sse, SSE_HEADERS
+from app.core.ratelimit import RateLimiter
+from app.core.serialization import ResponseSerializer
+from app.db.session import SessionLocal
 # Импортируем новые схемы
 from app.schemas.roadmap_v2 import (
     RoadmapGenerateRequestV2, CareerResponseV2, RoadmapMetaResponse,
-    ModuleResponse, MilestoneResponse
+    ModuleResponse, RoadmapJobResponse
 )
 from app.api import deps
-from app.services.ai_roadmap_v2 import ai_service  # Мы создадим этот сервис в след. шаге
+from app.services.ai_roadmap_v2 import ai_service
+from app.services.roadmap_persistence import (
+    save_roadmap_v2, career_row_v2, milestone_rows_v2, module_graph_v2,
+    write_roadmap_meta, write_modules
+)
+from app.services.progression import progression
+from app.services.roadmap_jobs import roadmap_jobs, job_to_response, TERMINAL_STATUSES
 
 router = APIRouter()
 
+career_v2_serializer = ResponseSerializer(CareerResponseV2)
+module_serializer = ResponseSerializer(ModuleResponse)
+
 
-@router.post("/generate", response_model=CareerResponseV2)
-def generate_custom_roadmap_v2(
+@router.post(
+    "/generate",
+    response_model=CareerResponseV2,
+    responses={202: {"model": RoadmapJobResponse, "description": "Job queued (background=true)"}},
+    dependencies=[Depends(RateLimiter("roadmap_generate"))],
+)
+async def generate_custom_roadmap_v2(
         request: RoadmapGenerateRequestV2,
+        background: bool = False,
         db: Session = Depends(deps.get_db),
-        current_user: User = Depends(deps.get_current_user)
+        current_user: CurrentUser = Depends(deps.get_current_user)
 ):
+    """
+    Генерация асинхронная: пока Gemini думает (5-30 сек), поток из пула свободен.
+    Сохранение в БД синхронное, поэтому уходит в threadpool.
+
+    С ?background=true сразу отвечает 202 с job_id, а генерацию и сохранение
+    делает пул фоновых воркеров. Статус: GET /jobs/{job_id} или SSE /jobs/{job_id}/events.
+    """
+    user_id = current_user.id
+
+    if background:
+        job = await run_in_threadpool(roadmap_jobs.create_job, db, user_id, request)
+        roadmap_jobs.enqueue(job.id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(job_to_response(job)),
+            headers={"Location": f"/api/v2/roadmaps/jobs/{job.id}"},
+        )
+
     try:
-        ai_data = ai_service.generate_roadmap(
+        ai_data = await ai_service.agenerate_roadmap(
             role=request.role, current_stack=request.current_stack, goal=request.goal,
             hours=request.hours_per_week, learning_style=request.learning_style,
             focus=request.focus, constraints=request.constraints
@@ -34,77 +74,178 @@ def generate_custom_roadmap_v2(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation failed: {e}")
 
-    # ШАГ 1: Создаем главный объект Career
-    meta = ai_data.get("roadmap_meta", {})
-    new_career = Career(
-        user_id=current_user.id, title=meta.get("title", "Untitled Roadmap"),
-        description=meta.get("description", ""), difficulty=meta.get("difficulty", "Intermediate"),
-        total_estimated_hours=meta.get("total_estimated_hours", 0),
-        total_weeks=meta.get("total_weeks", 0), focus=meta.get("focus", "job-ready"),
-        assumptions_json=json.dumps(meta.get("assumptions", []))
+    return await run_in_threadpool(_save_and_respond, db, user_id, ai_data)
+
+
+@router.post("/generate/stream", dependencies=[Depends(RateLimiter("roadmap_generate"))])
+async def generate_custom_roadmap_v2_stream(
+        request: RoadmapGenerateRequestV2,
+        current_user: CurrentUser = Depends(deps.get_current_user)
+):
+    """
+    Потоковая генерация по SSE. Модули сохраняются и отправляются по одному,
+    как только модель дописала очередной объект:
+    - event: roadmap_meta  data: {"career_id": ..., <RoadmapMetaResponse>}
+    - event: module        data: <ModuleResponse>
+    - event: done          data: {"career_id": ...}
+    - event: error         data: {"detail": "..."}
+    Если генерация оборвалась (ошибка или клиент ушел), недописанный роадмап удаляется.
+    """
+    user_id = current_user.id
+
+    async def event_stream():
+        career_id = None
+        modules_saved = 0
+        completed = False
+        try:
+            async for event, payload in ai_service.astream_roadmap(
+                role=request.role, current_stack=request.current_stack, goal=request.goal,
+                hours=request.hours_per_week, learning_style=request.learning_style,
+                focus=request.focus, constraints=request.constraints
+            ):
+                if event == "roadmap_meta":
+                    meta_response = await run_in_threadpool(_stream_save_meta, user_id, career_id, payload)
+                    career_id = meta_response["career_id"]
+                    yield format_sse("roadmap_meta", meta_response)
+                elif event == "module":
+                    if career_id is None:
+                        # Модуль пришел раньше меты: создаем Career с дефолтами, мету допишем позже
+                        career_id = (await run_in_threadpool(_stream_save_meta, user_id, None, {}))["career_id"]
+                    module_response = await run_in_threadpool(
+                        _stream_save_module, career_id, payload, modules_saved
+                    )
+                    modules_saved += 1
+                    yield format_sse("module", module_response)
+
+            if career_id is None:
+                raise ValueError("AI returned an empty roadmap")
+            # Модули писались в порядке прихода — выставляем топологический order_index
+            await run_in_threadpool(_stream_finalize, career_id)
+            completed = True
+            yield format_sse("done", {"career_id": career_id})
+
+        except Exception as e:
+            print(f"Error streaming AI roadmap: {e}")
+            yield format_sse("error", {"detail": f"AI generation failed: {e}"})
+
+        finally:
+            if not completed and career_id is not None:
+                # shield: удаление должно дойти до конца, даже если нас отменили
+                await asyncio.shield(run_in_threadpool(_delete_career, career_id))
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def _stream_save_meta(user_id: int, career_id: int | None, meta: dict) -> dict:
+    career_row = career_row_v2(user_id, meta)
+    with SessionLocal() as db:
+        career_id = write_roadmap_meta(db, career_id, career_row, milestone_rows_v2(meta))
+        db.commit()
+    return {"career_id": career_id, **RoadmapMetaResponse.model_validate(career_row).model_dump()}
+
+
+def _stream_save_module(career_id: int, module_data: dict, position: int) -> dict:
+    module = module_graph_v2(module_data)
+    with SessionLocal() as db:
+        write_modules(db, career_id, [module], start_index=position)
+        db.commit()
+    return module_serializer.dump_python(_module_graph_to_response(module))
+
+
+def _stream_finalize(career_id: int):
+    with SessionLocal() as db:
+        progression.reorder_career(db, career_id)
+        db.commit()
+
+
+def _delete_career(career_id: int):
+    with SessionLocal() as db:
+        career = db.get(Career, career_id)
+        if career:
+            db.delete(career)
+            db.commit()
+    progression.invalidate(career_id)
+
+
+@router.get("/jobs/{job_id}", response_model=RoadmapJobResponse)
+def get_generation_job(
+        job_id: str,
+        db: Session = Depends(deps.get_db),
+        current_user: CurrentUser = Depends(deps.get_current_user)
+):
+    job = db.query(RoadmapJob).filter(RoadmapJob.id == job_id, RoadmapJob.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_response(job)
+
+
+def _load_job_state(job_id: str) -> dict | None:
+    db = SessionLocal()
+    try:
+        job = db.get(RoadmapJob, job_id)
+        if job is None:
+            return None
+        return {**jsonable_encoder(job_to_response(job)), "user_id": job.user_id}
+    finally:
+        db.close()
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_generation_job(
+        job_id: str,
+        http_request: Request,
+        current_user: CurrentUser = Depends(deps.get_current_user)
+):
+    """
+    SSE-поток статуса задачи: событие на каждую смену статуса, поток
+    закрывается после DONE/FAILED. Опрашиваем БД, а не память процесса,
+    потому что задачу может выполнять другой воркер uvicorn.
+    """
+    user_id = current_user.id
+    first_state = await run_in_threadpool(_load_job_state, job_id)
+    if first_state is None or first_state["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        state, last_status = first_state, None
+        while True:
+            if state and state["status"] != last_status:
+                last_status = state["status"]
+                state.pop("user_id", None)
+                yield format_sse("status", state)
+                if last_status in TERMINAL_STATUSES:
+                    return
+            if await http_request.is_disconnected():
+                return
+            await asyncio.sleep(settings.ROADMAP_JOB_POLL_SECONDS)
+            state = await run_in_threadpool(_load_job_state, job_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
     )
-    db.add(new_career)
-    db.commit()
-    db.refresh(new_career)
-
-    # ШАГ 2: Сохраняем все вложенные данные (Milestones, Modules и т.д.)
-    if "milestones" in meta:
-        for ms_data in meta["milestones"]:
-            db.add(Milestone(
-                career_id=new_career.id, name=ms_data.get("name"),
-                modules_json=json.dumps(ms_data.get("modules", [])), outcome=ms_data.get("outcome")
-            ))
-
-    if "modules" in ai_data:
-        for module_data in ai_data["modules"]:
-            new_module = Module(
-                career_id=new_career.id, module_id_str=module_data.get("module_id"),
-                depends_on_json=json.dumps(module_data.get("depends_on", [])),
-                topic=module_data.get("topic"), goal=module_data.get("goal"),
-                estimated_hours=module_data.get("estimated_hours", 0)
-            )
-            db.add(new_module)
-            db.commit()  # Коммитим модуль, чтобы получить его ID для связей
-            db.refresh(new_module)
-
-            for res_data in module_data.get("resources", []):
-                db.add(Resource(module_id=new_module.id, **res_data))
-
-            pt_data = module_data.get("practice_task")
-            if pt_data:
-                db.add(PracticeTask(
-                    module_id=new_module.id, title=pt_data.get("title"), description=pt_data.get("description"),
-                    deliverables_json=json.dumps(pt_data.get("deliverables", [])),
-                    acceptance_criteria_json=json.dumps(pt_data.get("acceptance_criteria", []))
-                ))
-
-            cp_data = module_data.get("checkpoint")
-            if cp_data:
-                db.add(Checkpoint(
-                    module_id=new_module.id, what_to_show=cp_data.get("what_to_show"),
-                    how_to_self_check=cp_data.get("how_to_self_check"),
-                    rubric_json=json.dumps(cp_data.get("rubric", []))
-                ))
-
-            for q_data in module_data.get("quiz", []):
-                db.add(Question(
-                    module_id=new_module.id, question_text=q_data.get("question"),
-                    options_json=json.dumps(q_data.get("options", [])),
-                    correct_index=q_data.get("correct_index"), explanation=q_data.get("explanation")
-                ))
-
-    db.commit()  # Сохраняем все добавленные ресурсы, вопросы и т.д.
-
-    # ШАГ 3: Теперь, когда ВСЕ данные в базе, собираем ответ
-    db.refresh(new_career)  # Обновляем new_career, чтобы SQLAlchemy подтянул все связи
-
-    meta_response = RoadmapMetaResponse.from_orm(new_career)
-    modules_response = [ModuleResponse.from_orm(m) for m in new_career.modules]
-    milestones_response = [MilestoneResponse.from_orm(m) for m in new_career.milestones]
-
-    # ШАГ 4: Возвращаем ПРАВИЛЬНЫЙ объект, который соответствует схеме
-    return CareerResponseV2(
-        roadmap_meta=meta_response,
-        modules=modules_response,
-        milestones=milestones_response
-    )
\ No newline at end of file
+
+
+def _save_and_respond(db: Session, user_id: int, ai_data: dict) -> Response:
+    return career_v2_serializer.response(_graph_to_response_v2(save_roadmap_v2(db, user_id, ai_data)))
+
+
+def _module_graph_to_response(module: dict) -> dict:
+    return {
+        **module["module"],
+        "resources": module["resources"],
+        "practice_task": module["practice_task"],
+        "checkpoint": module["checkpoint"],
+        "questions": module["questions"],
+    }
+
+
+def _graph_to_response_v2(graph: dict) -> dict:
+    # Собираем ответ из только что записанного графа — без refresh и ленивых загрузок.
+    # Валидируется один раз целиком в career_v2_serializer, а не по модулю
+    return {
+        "roadmap_meta": graph["career"],
+        "modules": [_module_graph_to_response(m) for m in graph["modules"]],
+        "milestones": graph["milestones"],
+    }
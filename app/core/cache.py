@@ -0,0 +1,158 @@
+# app/core/cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+def make_cache_key(namespace: str, payload: dict) -> str:
+    """
+    Стабильный ключ: sha256 от канонического JSON (сортированные ключи).
+    """
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class TTLCache:
+    """
+    In-process LRU + TTL. Значения отдаются как есть (без копии) — не мутируйте их.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Персистентный tier: переживает рестарт и общий для всех воркеров на одной машине.
+    Значения хранятся как JSON. Просроченные строки get не отдает, а удаляются
+    они при открытии и каждые purge_every записей — иначе файл растет бесконечно.
+    """
+
+    def __init__(self, path: str, ttl: float, purge_every: int = 100):
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND created_at > ?",
+                (key, time.time() - self.ttl),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM cache_entries WHERE created_at <= ?", (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+
+class TieredCache:
+    """
+    Память -> SQLite. Попадание в SQLite прогревает память.
+    Счетчики hit/miss нужны, чтобы подбирать TTL.
+    """
+
+    def __init__(self, memory: TTLCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "memory_size": len(self.memory),
+            "memory_maxsize": self.memory.maxsize,
+            "ttl_seconds": self.memory.ttl,
+        }
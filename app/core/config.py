@@ -1,5 +1,7 @@
 # app/core/config.py
 import os
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -11,12 +13,130 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     DATABASE_URL: str = "sqlite:///./smartpath.db"
 
+    # SQL: echo пишет каждый запрос в stdout (медленно, только для отладки).
+    # SQL_PROFILING — счетчики/время на HTTP-запрос и топ медленных запросов;
+    # SQL_PROFILING_DEBUG — еще и заголовки Server-Timing/X-DB-Statements + лог на каждый запрос
+    SQL_ECHO: bool = False
+    SQL_PROFILING: bool = False
+    SQL_PROFILING_DEBUG: bool = False
+
+    # Только SQLite: все записи идут через один поток-писатель, который коммитит их
+    # пачками (group commit) — один fsync и одна блокировка БД на пачку вместо
+    # транзакции на каждый запрос. Пачка закрывается по размеру или по MAX_DELAY_MS
+    SQLITE_WRITE_QUEUE_ENABLED: bool = False
+    SQLITE_WRITE_QUEUE_MAX_BATCH: int = 64
+    SQLITE_WRITE_QUEUE_MAX_DELAY_MS: float = 2.0
+    SQLITE_WRITE_QUEUE_MAX_PENDING: int = 1000  # больше — отвечаем 503
+
+    # /metrics в формате Prometheus. При нескольких воркерах uvicorn укажите общий
+    # METRICS_MULTIPROC_DIR (очищать при деплое) — /metrics суммирует снимки всех процессов
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROC_DIR: str = ""
+    METRICS_FLUSH_SECONDS: float = 5.0
+
+    # Email'ы с доступом к /api/v1/admin/*
+    ADMIN_EMAILS: list[str] = []
+
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
-    GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
+    # Кэш проверенных токенов и пользователей в get_current_user
+    AUTH_CACHE_MAXSIZE: int = 10_000
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 300
+    AUTH_USER_CACHE_TTL_SECONDS: int = 60
+
+    # bcrypt в отдельном пуле: емкость логина задается отдельно от емкости API
+    PASSWORD_HASH_ROUNDS: int = 12  # при смене старые хеши перехешируются при логине
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_USE_PROCESSES: bool = False  # True — ProcessPoolExecutor
+    PASSWORD_HASH_MAX_PENDING: int = 32  # больше задач в очереди — отвечаем 503
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 1
+
+    GEMINI_API_KEY: Optional[str] = os.getenv("GEMINI_API_KEY")  # нужен только для gemini/record
+    GEMINI_CHAT_MODEL: str = "gemini-2.0-flash"
+    GEMINI_ROADMAP_MODEL: str = "gemini-2.5-flash"
+
+    # Общий пул соединений и таймауты для вызовов LLM
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+
+    # Кто отвечает на промпты: gemini — настоящий API; fake — детерминированные
+    # ответы без сети (валидный JSON роадмапов) для нагрузочных тестов;
+    # record — Gemini + запись ответов в LLM_CASSETTE_DIR; replay — только записанные ответы
+    LLM_PROVIDER: str = "gemini"
+    LLM_CASSETTE_DIR: str = "./llm_cassettes"
+    LLM_REPLAY_REALTIME: bool = True  # replay с записанными задержками
+    LLM_FAKE_LATENCY_MS: float = 800.0  # медиана задержки до первого токена
+    LLM_FAKE_LATENCY_SIGMA: float = 0.4  # разброс (логнормальное распределение)
+    LLM_FAKE_TOKENS_PER_SECOND: float = 80.0  # 0 — весь ответ сразу
+    LLM_FAKE_ERROR_RATE: float = 0.0  # доля вызовов, падающих с 429
+    LLM_FAKE_TIMEOUT_RATE: float = 0.0  # доля вызовов, упирающихся в LLM_TIMEOUT_SECONDS
+    LLM_FAKE_SEED: int = 42
+    LLM_FAKE_ROADMAP_MODULES: int = 6
+    LLM_FAKE_REPLY_TOKENS: int = 120
+
+    # Контекст AI-ментора: весь промпт (инструкции + сводка + последние сообщения + вопрос)
+    # укладывается в CHAT_CONTEXT_TOKEN_BUDGET; старые реплики сворачиваются в сводку
+    CHAT_CONTEXT_TOKEN_BUDGET: int = 2000
+    CHAT_CONTEXT_RECENT_MESSAGES: int = 12
+    CHAT_CONTEXT_MESSAGE_MAX_TOKENS: int = 400  # длинные вставки кода обрезаются
+    CHAT_SUMMARY_MAX_TOKENS: int = 300
+    CHAT_SUMMARY_MIN_BATCH: int = 4  # свертка — отдельный вызов LLM, не чаще чем раз в 2 реплики
+    CHAT_SUMMARY_MAX_BATCH: int = 40
+    CHAT_HISTORY_PAGE_LIMIT: int = 50
+
+    # Локальный кэш ответов ментора по похожести вопроса.
+    # Память: примерно DIM * 4 байта на ответ, не больше MAX_ENTRIES ответов на процесс
+    CHAT_ANSWER_CACHE_ENABLED: bool = True
+    CHAT_ANSWER_CACHE_THRESHOLD: float = 0.75  # cosine, выше — отдаем сохраненный ответ
+    CHAT_ANSWER_CACHE_DIM: int = 1024
+    CHAT_ANSWER_CACHE_MAX_ENTRIES: int = 5000
+    CHAT_ANSWER_CACHE_MAX_PER_TOPIC: int = 1000
+    CHAT_ANSWER_CACHE_WARM_LIMIT: int = 2000  # сколько последних ответов загрузить при старте
+
+    # Кэш результатов генерации роадмапов (память + SQLite)
+    ROADMAP_CACHE_ENABLED: bool = True
+    ROADMAP_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    ROADMAP_CACHE_MAXSIZE: int = 256
+    ROADMAP_CACHE_PATH: str = "./roadmap_cache.db"
+
+    # Фоновые задачи генерации роадмапов
+    ROADMAP_JOB_WORKERS: int = 4
+    ROADMAP_JOB_MAX_ATTEMPTS: int = 3
+    ROADMAP_JOB_STALE_SECONDS: int = 600  # RUNNING дольше этого считаем брошенной (воркер упал)
+    ROADMAP_JOB_SWEEP_SECONDS: int = 30
+    ROADMAP_JOB_POLL_SECONDS: float = 1.0  # частота опроса статуса в SSE
+
+    # Пагинация GET /roadmaps/ (keyset по id карьеры)
+    ROADMAP_LIST_DEFAULT_LIMIT: int = 50
+    ROADMAP_LIST_MAX_LIMIT: int = 200
+
+    # Готовые снимки GET /roadmaps/{id} (JSON без статусов + gzip-тела по ETag)
+    ROADMAP_SNAPSHOT_CACHE_MAXSIZE: int = 512
+    ROADMAP_SNAPSHOT_TTL_SECONDS: int = 3600
+    ROADMAP_SNAPSHOT_GZIP_MIN_BYTES: int = 1024
+
+    # Кэш графов зависимостей модулей (порядок + обратный индекс) для разблокировки
+    PROGRESSION_CACHE_MAXSIZE: int = 1024
+    PROGRESSION_CACHE_TTL_SECONDS: int = 3600
 
+    # Rate limiting. memory — только для одного процесса; sqlite — общий для воркеров
+    # на одной машине; redis — для нескольких машин (нужен пакет redis)
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_SQLITE_PATH: str = "./ratelimit.db"
+    RATE_LIMIT_REDIS_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # Адреса/подсети прокси, которым доверяем X-Forwarded-For, например ["127.0.0.1", "10.0.0.0/8"]
+    RATE_LIMIT_TRUSTED_PROXIES: list[str] = []
+    # Лимиты по scope: "<кол-во>/<second|minute|hour|day|Ns>"
+    RATE_LIMITS: dict[str, str] = {
+        "default": "60/minute",
+        "chat": "5/minute",
+        "roadmap_generate": "5/minute",
+        "login": "10/minute",
+    }
 
     class Config:
         case_sensitive = True
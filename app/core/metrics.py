@@ -0,0 +1,349 @@
+# app/core/metrics.py
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+from app.core.config import settings
+
+# Небольшой in-process реестр метрик с выдачей в текстовом формате Prometheus.
+#
+# Мультипроцессность: каждый воркер uvicorn держит свои значения в памяти и
+# периодически (и при остановке) сбрасывает снимок в METRICS_MULTIPROC_DIR/metrics_<pid>.json.
+# /metrics суммирует снимки всех процессов: counter/histogram — по всем файлам
+# (в т.ч. завершившихся воркеров, чтобы счетчики не "откатывались"),
+# gauge — только по живым процессам.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = [[list(k), v if not isinstance(v, list) else list(v)] for k, v in self._values.items()]
+        return {
+            "type": self.type, "help": self.documentation,
+            "labelnames": list(self.labelnames), "samples": samples,
+        }
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        # Для зеркалирования счетчиков, которые уже ведутся в другом месте (кэши)
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # [счетчики по бакетам (не накопительные)..., +Inf, sum, count]
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, fn: Callable[[], None]):
+        """fn вызывается перед каждым снимком и обновляет gauge/counter из внешних источников."""
+        self._collectors.append(fn)
+        return fn
+
+    def snapshot(self) -> dict:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Metrics collector {getattr(fn, '__name__', fn)} failed: {e}")
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    # --- Мультипроцессный режим ---
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(settings.METRICS_MULTIPROC_DIR, f"metrics_{pid}.json")
+
+    def flush(self):
+        """Сбрасывает снимок текущего процесса на диск (атомарно через rename)."""
+        if not settings.METRICS_MULTIPROC_DIR:
+            return
+        os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+        path = self._path(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _load_snapshots(self) -> list[tuple[bool, dict]]:
+        if not settings.METRICS_MULTIPROC_DIR:
+            return [(True, self.snapshot())]
+
+        self.flush()
+        own_pid = os.getpid()
+        result = []
+        for filename in os.listdir(settings.METRICS_MULTIPROC_DIR):
+            if not (filename.startswith("metrics_") and filename.endswith(".json")):
+                continue
+            pid = int(filename[len("metrics_"):-len(".json")])
+            try:
+                with open(os.path.join(settings.METRICS_MULTIPROC_DIR, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # файл пишется прямо сейчас или битый — пропустим до следующего скрейпа
+            result.append((pid == own_pid or _pid_alive(pid), data))
+        return result
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus 0.0.4, агрегированный по всем процессам."""
+        merged: dict[str, dict] = {}
+        for alive, snapshot in self._load_snapshots():
+            for name, data in snapshot.items():
+                if data["type"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, {**data, "values": {}})
+                values = target["values"]
+                for labels, value in data["samples"]:
+                    key = tuple(labels)
+                    if isinstance(value, list):
+                        current = values.get(key)
+                        values[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        values[key] = values.get(key, 0) + value
+
+        lines = []
+        for name, data in merged.items():
+            lines.append(f"# HELP {name} {data['help']}")
+            lines.append(f"# TYPE {name} {data['type']}")
+            labelnames = data["labelnames"]
+            for key, value in sorted(data["values"].items()):
+                pairs = list(zip(labelnames, key))
+                if data["type"] == "histogram":
+                    cumulative = 0
+                    for upper, count in zip([*data["buckets"], "+Inf"], value[:-2]):
+                        cumulative += count
+                        le = upper if upper == "+Inf" else _format_value(upper)
+                        lines.append(f"{name}_bucket{_format_labels(pairs + [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(value[-2])}")
+                    lines.append(f"{name}_count{_format_labels(pairs)} {value[-1]}")
+                else:
+                    lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: list[tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+registry = Registry()
+
+
+# --- Инструменты приложения ---
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being processed.", ("method",))
+
+db_pool_checkout_wait_seconds = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a DB connection from the pool.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+db_pool_connections = registry.gauge(
+    "db_pool_connections", "DB pool connections by state.", ("state",))
+db_write_queue_wait_seconds = registry.histogram(
+    "db_write_queue_wait_seconds", "Time from enqueueing a write unit to its group commit.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0))
+db_write_batch_size = registry.histogram(
+    "db_write_batch_size", "Write units per group commit.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+llm_request_duration_seconds = registry.histogram(
+    "llm_request_duration_seconds", "LLM call latency.", ("model", "operation"),
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0))
+llm_requests_total = registry.counter(
+    "llm_requests_total", "LLM calls by outcome (ok or error class).", ("model", "operation", "outcome"))
+llm_tokens_total = registry.counter(
+    "llm_tokens_total", "LLM tokens from usage_metadata.", ("model", "kind"))
+
+cache_requests_total = registry.counter(
+    "cache_requests_total", "Cache lookups by result. Hit ratio = hit / sum.", ("cache", "result"))
+rate_limit_rejections_total = registry.counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("scope",))
+
+
+def observe_llm_usage(model: str, usage) -> None:
+    """Токены из usage_metadata ответа Gemini (если SDK их вернул)."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_token_count", None)
+    candidates = getattr(usage, "candidates_token_count", None)
+    if prompt:
+        llm_tokens_total.inc(prompt, model=model, kind="prompt")
+    if candidates:
+        llm_tokens_total.inc(candidates, model=model, kind="candidates")
+
+
+class LLMCallTimer:
+    """
+    with LLMCallTimer(model, "generate") as call: ...; call.usage = response.usage_metadata
+    Пишет латентность, исход (ok / имя класса исключения) и токены.
+    """
+
+    def __init__(self, model: str, operation: str):
+        self.model = model
+        self.operation = operation
+        self.usage = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = "ok" if exc_type is None else exc_type.__name__
+        llm_request_duration_seconds.observe(time.perf_counter() - self._start, model=self.model, operation=self.operation)
+        llm_requests_total.inc(model=self.model, operation=self.operation, outcome=outcome)
+        observe_llm_usage(self.model, self.usage)
+        return False
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: латентность и счетчики по шаблону маршрута
+    (/api/v1/roadmaps/{career_id}, а не конкретный id — иначе кардинальность взорвется).
+    Шаблон известен только после роутинга (роутер кладет scope["route"]),
+    поэтому in-flight считаем по методу, а латентность — по маршруту.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _route_template(scope) -> str:
+        route = scope.get("route")
+        template = getattr(route, "path", None)
+        if template is None:
+            return "<unmatched>"
+        # У роутов из include_router path может быть относительным ("/{career_id}") —
+        # восстанавливаем префикс: отрезаем от фактического пути хвост, который матчит роут
+        path = scope["path"]
+        regex = getattr(route, "path_regex", None)
+        if regex is not None and not regex.fullmatch(path):
+            for i, ch in enumerate(path):
+                if ch == "/" and regex.fullmatch(path[i:]):
+                    return path[:i] + template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec(method=method)
+            route = self._route_template(scope)
+            http_request_duration_seconds.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests_total.inc(method=method, route=route, status=status_holder["status"])
@@ -1,29 +1,260 @@
+# app/core/ratelimit.py
+import ipaddress
+import math
+import sqlite3
+import threading
 import time
+from collections import OrderedDict
+from typing import Optional
+
 from fastapi import Request, HTTPException
+from jose import jwt, JWTError
 from starlette.status import HTTP_429_TOO_MANY_REQUESTS
 
-# Простой in-memory ограничитель
-# IP -> [timestamp1, timestamp2, ...]
-_requests = {}
-
-def rate_limiter(request: Request):
-    """
-    Ограничивает запросы: не более 5 запросов в минуту с одного IP.
-    """
-    client_ip = request.client.host
-    now = time.time()
-    
-    # Очистка старых записей
-    if client_ip not in _requests:
-        _requests[client_ip] = []
-    
-    # Оставляем только запросы за последние 60 секунд
-    _requests[client_ip] = [t for t in _requests[client_ip] if now - t < 60]
-    
-    if len(_requests[client_ip]) >= 5:
-        raise HTTPException(
-            status_code=HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded. Please wait a moment."
+from app.core.config import settings
+from app.core.metrics import rate_limit_rejections_total
+
+# Ограничитель по алгоритму sliding window counter:
+# на ключ храним только (начало текущего окна, счетчик текущего окна, счетчик прошлого окна),
+# а оценка = prev * (доля прошлого окна, попадающая в скользящее окно) + cur.
+# O(1) памяти и времени на ключ вместо списка таймстемпов.
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_limit(value: str) -> tuple[int, int]:
+    """
+    "5/minute" -> (5, 60), "100/hour" -> (100, 3600), "10/30s" -> (10, 30)
+    """
+    count, _, period = value.partition("/")
+    period = period.strip().lower()
+    if period.endswith("s") and period[:-1].isdigit():
+        return int(count), int(period[:-1])
+    period = period.removesuffix("s")
+    if period in _PERIODS:
+        return int(count), _PERIODS[period]
+    raise ValueError(f"Invalid rate limit: {value!r}")
+
+
+def sliding_window(state: Optional[tuple[float, int, int]], limit: int, window: int, now: float):
+    """
+    Чистая функция над состоянием (window_start, cur, prev).
+    Возвращает (allowed, retry_after_seconds, new_state).
+    """
+    window_start = math.floor(now / window) * window
+    cur = prev = 0
+    if state is not None:
+        stored_start, stored_cur, stored_prev = state
+        if stored_start == window_start:
+            cur, prev = stored_cur, stored_prev
+        elif stored_start == window_start - window:
+            prev = stored_cur
+
+    elapsed = now - window_start
+    weight = (window - elapsed) / window
+    if prev * weight + cur + 1 > limit:
+        if cur + 1 > limit or prev == 0:
+            retry_after = window - elapsed
+        else:
+            # Ждем, пока вклад прошлого окна упадет до (limit - cur - 1)
+            needed_weight = (limit - cur - 1) / prev
+            retry_after = max(window * (1 - needed_weight) - elapsed, 0)
+        return False, max(1, math.ceil(retry_after)), (window_start, cur, prev)
+
+    return True, 0, (window_start, cur + 1, prev)
+
+
+class MemoryBackend:
+    """
+    Состояние в памяти процесса. LRU с вытеснением ключей, не активных дольше
+    двух окон, и жестким потолком max_keys — память ограничена.
+    Не видно другим воркерам: для нескольких процессов берите sqlite/redis.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._data: OrderedDict[str, tuple[float, tuple[float, int, int], int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> tuple[bool, int]:
+        with self._lock:
+            item = self._data.get(key)
+            allowed, retry_after, state = sliding_window(item[1] if item else None, limit, window, now)
+            self._data[key] = (now, state, window)
+            self._data.move_to_end(key)
+            self._evict(now)
+        return allowed, retry_after
+
+    def _evict(self, now: float):
+        while self._data:
+            key, (last_seen, _, window) = next(iter(self._data.items()))
+            if len(self._data) > self.max_keys or now - last_seen > 2 * window:
+                self._data.popitem(last=False)
+            else:
+                break
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    Общее состояние для всех воркеров uvicorn на одной машине.
+    Атомарность чтение-изменение-запись дает BEGIN IMMEDIATE.
+    Данные не критичны, поэтому synchronous=OFF — без fsync на каждый запрос.
+    """
+
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "key TEXT PRIMARY KEY, window_start REAL, cur INTEGER, prev INTEGER, expires_at REAL)"
         )
-    
-    _requests[client_ip].append(now)
\ No newline at end of file
+        self._hits = 0
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> tuple[bool, int]:
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT window_start, cur, prev FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                allowed, retry_after, state = sliding_window(row, limit, window, now)
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, window_start, cur, prev, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, *state, now + 2 * window),
+                )
+                self._hits += 1
+                if self._hits % self.CLEANUP_EVERY == 0:
+                    # Вытесняем неактивные ключи, чтобы таблица не росла бесконечно
+                    conn.execute("DELETE FROM rate_limits WHERE expires_at < ?", (now,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return allowed, retry_after
+
+
+class RedisBackend:
+    """
+    Общее состояние для воркеров на разных машинах (любой Redis-совместимый сервер).
+    Требует пакет redis (необязательная зависимость). Два счетчика на ключ —
+    текущее и прошлое окно — с TTL в два окна, так что память освобождается сама.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self._redis = redis.Redis.from_url(url)
+
+    def hit(self, key: str, limit: int, window: int, now: float) -> tuple[bool, int]:
+        window_start = int(math.floor(now / window) * window)
+        cur_key = f"rl:{key}:{window_start}"
+        prev_key = f"rl:{key}:{window_start - window}"
+
+        pipe = self._redis.pipeline()
+        pipe.incr(cur_key)
+        pipe.expire(cur_key, 2 * window)
+        pipe.get(prev_key)
+        cur, _, prev = pipe.execute()
+        prev = int(prev or 0)
+
+        # Сначала INCR (атомарно), затем проверка; отказ откатываем DECR
+        allowed, retry_after, _ = sliding_window((window_start, cur - 1, prev), limit, window, now)
+        if not allowed:
+            self._redis.decr(cur_key)
+        return allowed, retry_after
+
+
+def _build_backend():
+    backend = settings.RATE_LIMIT_BACKEND.lower()
+    if backend == "sqlite":
+        return SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
+    if backend == "redis":
+        return RedisBackend(settings.RATE_LIMIT_REDIS_URL)
+    return MemoryBackend(settings.RATE_LIMIT_MAX_KEYS)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _build_backend()
+    return _backend
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(ip in ipaddress.ip_network(net, strict=False) for net in settings.RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """
+    IP клиента. X-Forwarded-For учитываем только если запрос пришел от доверенного
+    прокси (RATE_LIMIT_TRUSTED_PROXIES), иначе заголовок легко подделать.
+    Идем справа налево и берем первый адрес, который не является нашим прокси.
+    """
+    host = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(host):
+        return host
+    forwarded = request.headers.get("x-forwarded-for", "")
+    for part in reversed([p.strip() for p in forwarded.split(",") if p.strip()]):
+        if not _is_trusted_proxy(part):
+            return part
+    return host
+
+
+def rate_limit_key(request: Request) -> str:
+    """
+    Авторизованных считаем по пользователю (sub из JWT — только проверка подписи,
+    без похода в БД), остальных — по IP.
+    """
+    auth = request.headers.get("authorization", "")
+    if auth.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(auth[7:], settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            if payload.get("sub"):
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    return f"ip:{client_ip(request)}"
+
+
+class RateLimiter:
+    """
+    FastAPI-зависимость с лимитом из Settings.RATE_LIMITS[scope], например
+    dependencies=[Depends(RateLimiter("chat"))].
+    """
+
+    def __init__(self, scope: str):
+        self.scope = scope
+
+    def __call__(self, request: Request):
+        limit, window = parse_limit(settings.RATE_LIMITS.get(self.scope, settings.RATE_LIMITS["default"]))
+        key = f"{self.scope}:{rate_limit_key(request)}"
+        allowed, retry_after = get_backend().hit(key, limit, window, time.time())
+        if not allowed:
+            rate_limit_rejections_total.inc(scope=self.scope)
+            raise HTTPException(
+                status_code=HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Please wait a moment.",
+                headers={"Retry-After": str(retry_after)},
+            )
+
@@ -1,11 +1,17 @@
 # app/core/security.py
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Optional, Union
+from fastapi import HTTPException, status
 from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# deprecated="auto" + явный rounds: хеши со старым work factor считаются устаревшими,
+# и verify_and_update вернет новый хеш — так пароли перехешируются при логине
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_HASH_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,6 +21,118 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# Функции верхнего уровня — чтобы их можно было отправить в ProcessPoolExecutor.
+# Возвращают время старта, чтобы посчитать ожидание в очереди (monotonic общий для процессов на Linux).
+def _timed_hash(password: str) -> tuple[float, str]:
+    return time.monotonic(), pwd_context.hash(password)
+
+
+def _timed_verify_and_update(password: str, hashed_password: str) -> tuple[float, tuple[bool, Optional[str]]]:
+    return time.monotonic(), pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Отдельный ограниченный пул для bcrypt.
+
+    bcrypt — это ~0.2-0.3 с CPU на вызов. В общем пуле AnyIO шторм логинов
+    занимал бы потоки, нужные всем sync-эндпоинтам. Здесь своя емкость
+    (workers) и своя очередь: когда в ней больше max_pending задач, сразу
+    отвечаем 503 + Retry-After, а не копим запросы до таймаута клиента.
+    """
+
+    def __init__(self, workers: int, max_pending: int, use_processes: bool, retry_after: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self.retry_after = retry_after
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _submit(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy. Please retry shortly.",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        self.pending += 1
+        submitted_at = time.monotonic()
+        try:
+            started_at, result = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+        finished_at = time.monotonic()
+        wait, took = max(started_at - submitted_at, 0.0), finished_at - started_at
+        self.completed += 1
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        self.hash_seconds_total += took
+        self.hash_seconds_max = max(self.hash_seconds_max, took)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_timed_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """
+        (пароль верный?, новый хеш или None). Новый хеш приходит, если
+        сохраненный посчитан со старым work factor — его нужно записать в БД.
+        """
+        ok, new_hash = await self._submit(_timed_verify_and_update, password, hashed_password)
+        if new_hash:
+            self.rehashed += 1
+        return ok, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "workers": self.workers,
+            "use_processes": self.use_processes,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "hash_seconds_avg": round(self.hash_seconds_total / done, 4),
+            "hash_seconds_max": round(self.hash_seconds_max, 4),
+            "wait_seconds_avg": round(self.wait_seconds_total / done, 4),
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    use_processes=settings.PASSWORD_HASH_USE_PROCESSES,
+    retry_after=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS,
+)
+
+
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -23,4 +141,4 @@ def create_access_token(subject: Union[str, Any], expires_delta: timedelta = Non
 
     to_encode = {"exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
@@ -0,0 +1,52 @@
+# app/core/serialization.py
+from typing import Any, Generic, Optional, TypeVar
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+T = TypeVar("T")
+
+
+class JSONBytesResponse(Response):
+    """Ответ из уже готовых JSON-байт — без повторной сериализации."""
+    media_type = "application/json"
+
+
+class ResponseSerializer(Generic[T]):
+    """
+    Быстрый путь для тяжелых ответов: одна валидация через заранее собранный
+    TypeAdapter и сразу байты из pydantic-core (Rust), минуя jsonable_encoder
+    и json.dumps. Эндпоинт возвращает готовый Response, поэтому FastAPI не
+    валидирует его второй раз по response_model (он остается для OpenAPI).
+    """
+
+    def __init__(self, type_: Any):
+        self.adapter: TypeAdapter[T] = TypeAdapter(type_)
+
+    def validate(self, data: Any) -> T:
+        # from_attributes: в данных могут быть ORM-объекты (например, Resource)
+        return self.adapter.validate_python(data, from_attributes=True)
+
+    def dump(self, data: Any, **dump_options) -> bytes:
+        # dump_options — как у TypeAdapter.dump_json (например, exclude_unset=True)
+        return self.adapter.dump_json(self.validate(data), **dump_options)
+
+    def dump_python(self, data: Any) -> Any:
+        """JSON-совместимые Python-объекты (для SSE и кэшей)."""
+        return self.adapter.dump_python(self.validate(data), mode="json")
+
+    def response(self, data: Any, status_code: int = 200, headers: Optional[dict] = None,
+                 **dump_options) -> JSONBytesResponse:
+        return JSONBytesResponse(content=self.dump(data, **dump_options), status_code=status_code, headers=headers)
+
+
+def etag_match(if_none_match: Optional[str], *etags: str) -> Optional[str]:
+    """
+    Какой из ETag совпал с If-None-Match (слабое сравнение, как требует RFC 9110), или None.
+    """
+    if not if_none_match:
+        return None
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates:
+        return etags[0]
+    return next((etag for etag in etags if etag in candidates), None)
@@ -0,0 +1,47 @@
+# app/core/singleflight.py
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Схлопывает одновременные одинаковые вызовы в один.
+
+    Первый запрос с ключом запускает fn() как отдельную задачу, остальные
+    с тем же ключом ждут ее результат (или ее исключение). Задача защищена
+    shield'ом: если "лидер" отвалился (клиент закрыл соединение), остальные
+    все равно получат ответ.
+    Работает в пределах одного event loop (одного воркера uvicorn).
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.leaders += 1
+        task = asyncio.get_running_loop().create_task(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Забираем исключение, чтобы asyncio не ругался "exception was never retrieved",
+        # если все ожидающие уже отменены
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,9 @@
+# app/core/sse.py
+import json
+
+# Заголовки для SSE: без кэша и без буферизации в nginx
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
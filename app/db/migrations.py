@@ -0,0 +1,17 @@
+# app/db/migrations.py
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+def upgrade_db(revision: str = "head"):
+    """
+    То же, что `alembic upgrade head`, но из Python (скрипты, бенчмарки).
+    Приложение при старте схему не трогает — миграции запускаются отдельным шагом деплоя.
+    """
+    config = Config(str(ALEMBIC_INI))
+    config.attributes["configure_logger"] = False  # не перенастраивать логирование вызывающего
+    command.upgrade(config, revision)
@@ -0,0 +1,178 @@
+# app/db/profiling.py
+import heapq
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("app.sql")
+
+# Нормализация SQL: литералы -> ?, списки плейсхолдеров (?, ?, ...) -> (...), пробелы схлопываем.
+# Так одинаковые по форме запросы попадают в одну строку таблицы медленных запросов.
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*(?:\?|__\[POSTCOMPILE_\w+\])(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    sql = _STRING.sub("?", statement)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+class RequestSQLStats:
+    """Статистика SQL одного HTTP-запроса."""
+
+    SLOWEST_KEEP = 5
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self._slowest: list[tuple[float, str]] = []  # min-heap из SLOWEST_KEEP самых долгих
+
+    def add(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        item = (elapsed_ms, statement)
+        if len(self._slowest) < self.SLOWEST_KEEP:
+            heapq.heappush(self._slowest, item)
+        elif elapsed_ms > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def slowest(self) -> list[dict]:
+        return [
+            {"ms": round(ms, 3), "sql": normalize_sql(sql)}
+            for ms, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+class SlowQueryLog:
+    """
+    Агрегаты по нормализованным запросам за время жизни процесса:
+    count / total / max. Хранит не больше maxsize разных запросов — при
+    переполнении выкидывает самый "дешевый" по суммарному времени.
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._data: dict[str, list] = {}  # sql -> [count, total_ms, max_ms]
+        self._lock = threading.Lock()
+
+    def add(self, statement: str, elapsed_ms: float):
+        sql = normalize_sql(statement)
+        with self._lock:
+            row = self._data.get(sql)
+            if row is None:
+                if len(self._data) >= self.maxsize:
+                    cheapest = min(self._data, key=lambda k: self._data[k][1])
+                    del self._data[cheapest]
+                self._data[sql] = [1, elapsed_ms, elapsed_ms]
+            else:
+                row[0] += 1
+                row[1] += elapsed_ms
+                row[2] = max(row[2], elapsed_ms)
+
+    def top(self, n: int, order_by: str = "max_ms") -> list[dict]:
+        index = {"count": 0, "total_ms": 1, "max_ms": 2}[order_by]
+        with self._lock:
+            rows = heapq.nlargest(n, self._data.items(), key=lambda kv: kv[1][index])
+        return [
+            {
+                "sql": sql,
+                "count": count,
+                "total_ms": round(total, 3),
+                "avg_ms": round(total / count, 3),
+                "max_ms": round(max_ms, 3),
+            }
+            for sql, (count, total, max_ms) in rows
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+_current: ContextVar[Optional[RequestSQLStats]] = ContextVar("sql_request_stats", default=None)
+slow_queries = SlowQueryLog()
+
+
+def current_request_stats() -> Optional[RequestSQLStats]:
+    return _current.get()
+
+
+def install_sql_profiler(engine: Engine):
+    """
+    Вешает таймеры на before/after_cursor_execute. Время пишется в статистику
+    текущего HTTP-запроса (если есть — contextvar переживает run_in_threadpool)
+    и в общую таблицу медленных запросов.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        stats = _current.get()
+        if stats is not None:
+            stats.add(statement, elapsed_ms)
+        slow_queries.add(statement, elapsed_ms)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        # Упавший запрос не доходит до after_cursor_execute — снимаем его таймер
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class SQLProfilerMiddleware:
+    """
+    ASGI-middleware: заводит RequestSQLStats на каждый HTTP-запрос.
+    В debug-режиме добавляет заголовки Server-Timing / X-DB-Statements
+    и пишет лог-запись с самыми медленными запросами.
+    """
+
+    def __init__(self, app, debug: bool = False):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestSQLStats()
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if self.debug and message["type"] == "http.response.start":
+                # Для стриминговых ответов здесь только запросы до первого байта
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-statements", str(stats.count).encode()))
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={stats.total_ms:.2f};desc="{stats.count} statements"'.encode(),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if self.debug and stats.count:
+                slowest = stats.slowest()
+                logger.info(
+                    "%s %s: %d statements, %.2f ms in DB, slowest: %s",
+                    scope["method"], scope["path"], stats.count, stats.total_ms, slowest,
+                    extra={"sql_count": stats.count, "sql_total_ms": stats.total_ms, "sql_slowest": slowest},
+                )
@@ -1,15 +1,53 @@
 # app/db/session.py
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.core.config import settings
+from app.core.metrics import registry, db_pool_checkout_wait_seconds, db_pool_connections
+from app.db.profiling import install_sql_profiler
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который меряет, сколько запрос ждал свободное соединение."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - start)
+
 
 # Для SQLite нужен специальный аргумент check_same_thread
 connect_args = {"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 
+# In-memory SQLite живет в одном соединении (SingletonThreadPool) — пул не подменяем
+_url = make_url(settings.DATABASE_URL)
+pool_args = {} if _url.get_backend_name() == "sqlite" and _url.database in (None, "", ":memory:") else {
+    "poolclass": InstrumentedQueuePool
+}
+
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args=connect_args,
-    echo=True # Покажет SQL-запросы в консоли (удобно для отладки)
+    echo=settings.SQL_ECHO,  # Печать каждого запроса — только для локальной отладки
+    **pool_args
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+# Профилирование SQL (счетчики на запрос + таблица медленных запросов) — по флагу
+if settings.SQL_PROFILING:
+    install_sql_profiler(engine)
+
+
+@registry.add_collector
+def _collect_pool_stats():
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        db_pool_connections.set(pool.checkedout(), state="checked_out")
+        db_pool_connections.set(pool.checkedin(), state="idle")
+        db_pool_connections.set(max(pool.overflow(), 0), state="overflow")
+
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,236 @@
+# app/db/write_queue.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.core.metrics import db_write_batch_size, db_write_queue_wait_seconds
+
+# Единица записи: fn(session, *args) -> результат. Делает INSERT/UPDATE в переданной
+# сессии, НЕ коммитит и возвращает простые значения (id, rowcount) — ORM-объекты
+# сессии писателя после коммита вызывающему не нужны
+WriteUnit = Callable[..., Any]
+
+
+@dataclass
+class _Pending:
+    fn: WriteUnit
+    args: tuple
+    future: Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+def _writer_engine(url: str):
+    """
+    Отдельное соединение писателя. pysqlite сам решает, когда открыть транзакцию,
+    и RELEASE первого SAVEPOINT у него коммитит всю пачку — поэтому транзакцию
+    открываем явно (BEGIN IMMEDIATE: блокировка на запись берется сразу).
+    """
+    engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+class SQLiteWriteQueue:
+    """
+    Один поток-писатель для SQLite (group commit).
+
+    Запросы кладут единицы записи в очередь и ждут Future. Писатель берет первую
+    единицу, добирает еще до max_batch или пока не пройдет max_delay, выполняет
+    каждую в своем SAVEPOINT и делает один COMMIT на всю пачку. Ошибка единицы
+    (например IntegrityError) откатывает только ее SAVEPOINT и уходит в ее Future;
+    ошибка самого COMMIT — во все Future пачки.
+
+    Так нет гонки за блокировку БД между запросами ("database is locked") и
+    fsync на каждый запрос. Задержка ответа растет не больше чем на max_delay.
+    """
+
+    def __init__(self, database_url: str, enabled: bool, max_batch: int, max_delay: float, max_pending: int):
+        url = make_url(database_url)
+        self.enabled = enabled and url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+        if enabled and not self.enabled:
+            print("SQLITE_WRITE_QUEUE_ENABLED is ignored: it needs a file-based SQLite DATABASE_URL")
+        self.database_url = database_url
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory: Optional[sessionmaker] = None
+        self.units = 0
+        self.failed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.max_batch_seen = 0
+        self.wait_seconds_max = 0.0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._session_factory = sessionmaker(bind=_writer_engine(self.database_url), autoflush=False)
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        # None — сигнал остановки: все, что в очереди до него, будет записано
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, fn: WriteUnit, *args) -> Future:
+        if self._thread is None:
+            self.start()
+        if self._queue.qsize() >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database is busy. Please retry shortly.",
+                headers={"Retry-After": "1"},
+            )
+        future = Future()
+        self._queue.put(_Pending(fn, args, future))
+        return future
+
+    def _collect(self, first: _Pending) -> tuple[list[_Pending], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                # Сначала забираем все, что уже накопилось, потом ждем до дедлайна
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: list[_Pending]):
+        results = []
+        with self._session_factory() as session:
+            try:
+                for item in batch:
+                    if not item.future.set_running_or_notify_cancel():
+                        continue
+                    savepoint = session.begin_nested()
+                    try:
+                        result = item.fn(session, *item.args)
+                        session.flush()
+                        savepoint.commit()
+                    except Exception as e:
+                        savepoint.rollback()
+                        self.failed += 1
+                        item.future.set_exception(e)
+                    else:
+                        results.append((item, result))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                for item, _ in results:
+                    item.future.set_exception(e)
+                self.failed += len(results)
+                results = []
+
+        now = time.monotonic()
+        self.batches += 1
+        self.units += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        db_write_batch_size.observe(len(batch))
+        for item, result in results:
+            wait = now - item.enqueued_at
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            db_write_queue_wait_seconds.observe(wait)
+            item.future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": self._queue.qsize(),
+            "units": self.units,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch": round(self.units / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
+
+
+write_queue = SQLiteWriteQueue(
+    settings.DATABASE_URL,
+    enabled=settings.SQLITE_WRITE_QUEUE_ENABLED,
+    max_batch=settings.SQLITE_WRITE_QUEUE_MAX_BATCH,
+    max_delay=settings.SQLITE_WRITE_QUEUE_MAX_DELAY_MS / 1000,
+    max_pending=settings.SQLITE_WRITE_QUEUE_MAX_PENDING,
+)
+
+
+def _release_connection(db: Session):
+    # Как и commit в обычном пути: сессия запроса отдает соединение в пул, пока
+    # ждет писателя. Иначе запросы, ждущие LLM или фоновые задачи с SessionLocal,
+    # держат весь QueuePool и упираются в его таймаут
+    if db.in_transaction():
+        db.commit()
+
+
+def run_write(db: Session, fn: WriteUnit, *args):
+    """
+    Выполнить единицу записи и закоммитить. С очередью — через поток-писатель
+    (ждем свою пачку), без нее — как раньше, в сессии запроса.
+    Для sync-кода (эндпоинты def и функции, уходящие в threadpool).
+    """
+    if write_queue.enabled:
+        _release_connection(db)
+        return write_queue.submit(fn, *args).result()
+    try:
+        result = fn(db, *args)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
+
+async def run_write_async(db: Session, fn: WriteUnit, *args):
+    """То же для async-эндпоинтов: ожидание пачки не занимает поток из пула."""
+    if write_queue.enabled:
+        # commit — блокирующий I/O, в event loop его не выполняем
+        if db.in_transaction():
+            await run_in_threadpool(_release_connection, db)
+        return await asyncio.wrap_future(write_queue.submit(fn, *args))
+    return await run_in_threadpool(run_write, db, fn, *args)
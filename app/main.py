@@ -1,15 +1,66 @@
 # app/main.py
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.db.session import engine
-from app.db.base import Base
-from app.api.v1 import auth, roadmap, assessment, roadmap_v2, chat
+from app.core.metrics import registry, MetricsMiddleware
+from app.db.profiling import SQLProfilerMiddleware
+from app.api.v1 import auth, roadmap, assessment, roadmap_v2, chat, admin
+from app.core.security import password_hasher
+from app.services.llm import llm_client
+from app.services.roadmap_jobs import roadmap_jobs
+from app.services.answer_cache import answer_cache
+from app.db.session import SessionLocal
+from app.db.write_queue import write_queue
 
-# Создаем таблицы в БД автоматически (для MVP это ок, вместо миграций пока)
-Base.metadata.create_all(bind=engine)
+# Схемой управляет Alembic: `alembic upgrade head` перед запуском (см. README).
+# При старте воркера DDL больше не выполняем.
 
-app = FastAPI(title=settings.PROJECT_NAME)
+
+async def _flush_metrics_periodically():
+    # Снимок метрик этого воркера для /metrics в других процессах
+    while True:
+        await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+        try:
+            await run_in_threadpool(registry.flush)
+        except Exception as e:
+            print(f"Metrics flush error: {e}")
+
+
+def _warm_answer_cache():
+    # Кэш ответов чата живет в памяти процесса — наполняем его из истории
+    try:
+        with SessionLocal() as db:
+            answer_cache.warm(db, settings.CHAT_ANSWER_CACHE_WARM_LIMIT)
+    except Exception as e:
+        print(f"Answer cache warm-up error: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Поток-писатель SQLite (если SQLITE_WRITE_QUEUE_ENABLED)
+    write_queue.start()
+    # Воркеры фоновой генерации роадмапов (подхватывают задачи, брошенные прошлым процессом)
+    await roadmap_jobs.start()
+    if answer_cache is not None:
+        await run_in_threadpool(_warm_answer_cache)
+    metrics_flusher = asyncio.create_task(_flush_metrics_periodically()) if settings.METRICS_MULTIPROC_DIR else None
+    yield
+    if metrics_flusher is not None:
+        metrics_flusher.cancel()
+        registry.flush()
+    await roadmap_jobs.stop()
+    # Закрываем общий пул HTTP-соединений к Gemini
+    await llm_client.aclose()
+    password_hasher.shutdown()
+    # Дописываем то, что осталось в очереди
+    await run_in_threadpool(write_queue.stop)
+
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,12 +70,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Профилирование SQL на каждый запрос (см. SQL_PROFILING в config)
+if settings.SQL_PROFILING:
+    app.add_middleware(SQLProfilerMiddleware, debug=settings.SQL_PROFILING_DEBUG)
+
+# Метрики HTTP — самым внешним слоем, чтобы латентность включала все остальные middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(roadmap.router, prefix="/api/v1/roadmaps", tags=["roadmaps"])
 app.include_router(assessment.router, prefix="/api/v1/quiz", tags=["quiz"])
 app.include_router(roadmap_v2.router, prefix="/api/v2/roadmaps", tags=["Roadmaps (v2)"])
 app.include_router(chat.router, prefix="/api/v1/chat", tags=["AI Mentor"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to SmartPath API", "status": "running"}
\ No newline at end of file
+    return {"message": "Welcome to SmartPath API", "status": "running"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Закрывайте на уровне сети/прокси: эндпоинт без авторизации, как принято для Prometheus
+    if not settings.METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,11 +1,17 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean, Index, PrimaryKeyConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base import Base
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
-    
+    # История чата пользователя читается по времени
+    __table_args__ = (
+        Index("ix_chat_messages_user_created", "user_id", "created_at"),
+        # Keyset по id внутри темы: контекст для промпта и постраничная история
+        Index("ix_chat_messages_user_topic_id", "user_id", "context_topic", "id"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     role = Column(String) # "user" or "ai"
@@ -17,3 +23,18 @@ class ChatMessage(Base):
     is_liked = Column(Boolean, nullable=True) # None, True (like), False (dislike)
     
     user = relationship("User", back_populates="chat_messages")
+
+
+# Сжатая история разговора по теме: сообщения с id <= summarized_until_id
+# уже свернуты в summary и в промпт целиком не попадают
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "context_topic"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id"))
+    context_topic = Column(String)
+    summary = Column(Text, nullable=False, default="")
+    summarized_until_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,20 @@
+# app/models/job.py
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+from datetime import datetime
+from app.db.base import Base
+
+
+# Фоновая генерация роадмапа. Хранится в БД, чтобы пережить рестарт воркера.
+# Статусы: QUEUED -> RUNNING -> DONE / FAILED
+class RoadmapJob(Base):
+    __tablename__ = "roadmap_jobs"
+
+    id = Column(String, primary_key=True)  # uuid4 hex, чтобы id нельзя было угадать
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    status = Column(String, default="QUEUED", index=True)
+    request_json = Column(Text)  # RoadmapGenerateRequestV2 как JSON
+    career_id = Column(Integer, ForeignKey("careers.id"), nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
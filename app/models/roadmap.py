@@ -1,5 +1,5 @@
 # app/models/roadmap.py
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Boolean, Index, JSON
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
@@ -8,7 +8,7 @@ from app.db.base import Base
 class Career(Base):
     __tablename__ = "careers"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     title = Column(String)
     description = Column(Text)
 
@@ -17,9 +17,12 @@ class Career(Base):
     total_estimated_hours = Column(Integer)
     total_weeks = Column(Integer)
     focus = Column(String)
-    assumptions_json = Column(Text)  # Храним как JSON-строку ["...", "..."]
+    assumptions_json = Column(JSON)  # ["...", "..."]
+    # Растет при каждой записи контента (модули, мета) — ключ снимков и ETag
+    content_version = Column(Integer, nullable=False, default=1, server_default="1")
 
-    modules = relationship("Module", back_populates="career", cascade="all, delete-orphan")
+    modules = relationship("Module", back_populates="career", cascade="all, delete-orphan",
+                           order_by="Module.order_index")
     milestones = relationship("Milestone", back_populates="career", cascade="all, delete-orphan")
 
 
@@ -27,9 +30,10 @@ class Career(Base):
 class Module(Base):
     __tablename__ = "modules"
     id = Column(Integer, primary_key=True, index=True)
-    career_id = Column(Integer, ForeignKey("careers.id"))
+    career_id = Column(Integer, ForeignKey("careers.id"), index=True)
     module_id_str = Column(String)  # "M1", "M2"
-    depends_on_json = Column(Text)  # ["M0"]
+    depends_on_json = Column(JSON)  # ["M0"]
+    order_index = Column(Integer)  # позиция в топологическом порядке depends_on (с 1)
     topic = Column(String)
     goal = Column(Text)
     summary = Column(Text, nullable=True) # <-- НОВОЕ ПОЛЕ: Краткое содержание
@@ -51,7 +55,7 @@ class Milestone(Base):
     id = Column(Integer, primary_key=True, index=True)
     career_id = Column(Integer, ForeignKey("careers.id"))
     name = Column(String)
-    modules_json = Column(Text)  # ["M1", "M2"]
+    modules_json = Column(JSON)  # ["M1", "M2"]
     outcome = Column(Text)
     career = relationship("Career", back_populates="milestones")
 
@@ -60,7 +64,7 @@ class Milestone(Base):
 class Resource(Base):
     __tablename__ = "resources"
     id = Column(Integer, primary_key=True, index=True)
-    module_id = Column(Integer, ForeignKey("modules.id"))  # Связь с Module
+    module_id = Column(Integer, ForeignKey("modules.id"), index=True)  # Связь с Module
     title = Column(String)
     type = Column(String)
     url = Column(String)
@@ -79,8 +83,8 @@ class PracticeTask(Base):
     module_id = Column(Integer, ForeignKey("modules.id"), unique=True)
     title = Column(String)
     description = Column(Text)
-    deliverables_json = Column(Text)
-    acceptance_criteria_json = Column(Text)
+    deliverables_json = Column(JSON)
+    acceptance_criteria_json = Column(JSON)
 
     module = relationship("Module", back_populates="practice_task")
 
@@ -91,7 +95,7 @@ class Checkpoint(Base):
     module_id = Column(Integer, ForeignKey("modules.id"), unique=True)
     what_to_show = Column(Text)
     how_to_self_check = Column(Text)
-    rubric_json = Column(Text, nullable=True) # Храним как JSON-строку
+    rubric_json = Column(JSON, nullable=True)
 
     module = relationship("Module", back_populates="checkpoint")
 
@@ -100,9 +104,9 @@ class Checkpoint(Base):
 class Question(Base):
     __tablename__ = "questions"
     id = Column(Integer, primary_key=True, index=True)
-    module_id = Column(Integer, ForeignKey("modules.id"))
+    module_id = Column(Integer, ForeignKey("modules.id"), index=True)
     question_text = Column(Text)
-    options_json = Column(Text)
+    options_json = Column(JSON)  # ["A", "B", ...]
     correct_index = Column(Integer)
     explanation = Column(Text)  # <-- ВАЖНОЕ ПОЛЕ
 
@@ -112,6 +116,12 @@ class Question(Base):
 # UserProgress теперь ссылается на Module
 class UserProgress(Base):
     __tablename__ = "user_progress"
+    # Одна запись на (пользователь, модуль): защищает start_career от гонки
+    # и покрывает все выборки прогресса по user_id
+    __table_args__ = (
+        Index("ux_user_progress_user_module", "user_id", "module_id", unique=True),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     module_id = Column(Integer, ForeignKey("modules.id"))  # <-- Ссылка на module
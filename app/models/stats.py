@@ -0,0 +1,19 @@
+# app/models/stats.py
+from sqlalchemy import Column, Integer, ForeignKey, JSON, DateTime
+from datetime import datetime
+from app.db.base import Base
+
+
+# Денормализованная статистика профиля. Обновляется в той же транзакции,
+# что и прогресс (start_career / submit_quiz), поэтому /me — один SELECT по PK.
+# Пересобрать из user_progress: python rebuild_user_stats.py
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    xp = Column(Integer, nullable=False, default=0)
+    level = Column(Integer, nullable=False, default=1)
+    completed_modules = Column(Integer, nullable=False, default=0)
+    modules_started = Column(Integer, nullable=False, default=0)
+    badges_json = Column(JSON, nullable=False, default=list)  # ["First Step", ...]
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
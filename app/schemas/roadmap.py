@@ -46,6 +46,25 @@ class CareerResponse(CareerBase):
         from_attributes = True
 
 
+# --- Listing (sparse fieldsets) ---
+class CareerProgressSummary(BaseModel):
+    total: int
+    completed: int
+    available: int
+
+
+class CareerListItem(BaseModel):
+    """
+    Элемент GET /roadmaps/: в ответе только запрошенные поля (fields=/include=),
+    id есть всегда — это и ключ курсора.
+    """
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    progress: Optional[CareerProgressSummary] = None
+    nodes: Optional[List[RoadmapNodeResponse]] = None
+
+
 class RoadmapGenerateRequest(BaseModel):
     target_role: str
     current_experience: str
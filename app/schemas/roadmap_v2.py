@@ -1,6 +1,7 @@
 # app/schemas/roadmap_v2.py
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+from datetime import datetime
 
 
 # --- Схема запроса на генерацию ---
@@ -15,7 +16,8 @@ class RoadmapGenerateRequestV2(BaseModel):
 
 
 # --- Схемы для ответа (Response Schemas) ---
-# Начинаем с самых вложенных элементов
+# Начинаем с самых вложенных элементов.
+# Поля *_json исторически так названы — это JSON-колонки, отдаются массивами
 
 class ResourceResponse(BaseModel):
     title: str
@@ -34,8 +36,8 @@ class ResourceResponse(BaseModel):
 class PracticeTaskResponse(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
-    deliverables_json: Optional[str] = None
-    acceptance_criteria_json: Optional[str] = None
+    deliverables_json: List[str] = []
+    acceptance_criteria_json: List[str] = []
 
     class Config:
         from_attributes = True
@@ -45,7 +47,7 @@ class PracticeTaskResponse(BaseModel):
 class CheckpointResponse(BaseModel):
     what_to_show: Optional[str] = None
     how_to_self_check: Optional[str] = None
-    rubric_json: Optional[str] = None
+    rubric_json: List[str] = []
 
     class Config:
         from_attributes = True
@@ -54,7 +56,7 @@ class CheckpointResponse(BaseModel):
 
 class QuestionResponse(BaseModel):
     question_text: str
-    options_json: str
+    options_json: List[str]
     correct_index: int
     explanation: Optional[str] = None
 
@@ -65,7 +67,7 @@ class QuestionResponse(BaseModel):
 
 class ModuleResponse(BaseModel):
     module_id_str: str
-    depends_on_json: str
+    depends_on_json: List[str] = []
     topic: str
     goal: str
     estimated_hours: int
@@ -81,7 +83,7 @@ class ModuleResponse(BaseModel):
 
 class MilestoneResponse(BaseModel):
     name: str
-    modules_json: str
+    modules_json: List[str] = []
     outcome: str
 
     class Config:
@@ -96,7 +98,7 @@ class RoadmapMetaResponse(BaseModel):
     total_estimated_hours: int
     total_weeks: int
     focus: str
-    assumptions_json: str
+    assumptions_json: List[str] = []
 
     class Config:
         from_attributes = True
@@ -112,3 +114,13 @@ class CareerResponseV2(BaseModel):
     class Config:
         from_attributes = True
         orm_mode = True
+
+
+# --- Фоновая генерация ---
+class RoadmapJobResponse(BaseModel):
+    job_id: str
+    status: str  # QUEUED / RUNNING / DONE / FAILED
+    career_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
@@ -1,17 +1,14 @@
 # app/services/ai_roadmap.py
-import json
-import google.generativeai as genai
 from app.core.config import settings
+from app.services.llm import llm_client, parse_json_text
 
 
 class AIService:
     def __init__(self):
-        # Настраиваем Gemini при запуске
-        if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
+        # Сам клиент Gemini общий (app/services/llm.py), здесь только выбираем модель
+        if settings.LLM_PROVIDER in ("gemini", "record") and not settings.GEMINI_API_KEY:
             print("WARNING: GEMINI_API_KEY is missing in config.py")
+        self.model_name = settings.GEMINI_ROADMAP_MODEL
 
     def generate_roadmap(self, role: str, experience: str, goal: str, hours: int):
         """
@@ -53,15 +50,10 @@ class AIService:
 
         try:
             # Отправляем запрос
-            response = self.model.generate_content(prompt)
-            raw_text = response.text
+            raw_text = llm_client.generate_text_sync(prompt, model=self.model_name)
 
-            # Чистим ответ: Gemini любит оборачивать JSON в ```json ... ```
-            cleaned_text = raw_text.replace("```json", "").replace("```", "").strip()
-
-            # Превращаем строку в Python словарь
-            data = json.loads(cleaned_text)
-            return data
+            # Чистим ответ и превращаем строку в Python словарь
+            return parse_json_text(raw_text)
 
         except Exception as e:
             print(f"Error generating AI roadmap: {e}")
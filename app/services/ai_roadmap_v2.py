@@ -1,20 +1,85 @@
-# app/services/ai_roadmap.py
-import json
-import google.generativeai as genai
+# app/services/ai_roadmap_v2.py
+import re
+from typing import Any, AsyncIterator, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.cache import TieredCache, TTLCache, SQLiteCache, make_cache_key
 from app.core.config import settings
+from app.core.metrics import registry, cache_requests_total
+from app.core.singleflight import SingleFlight
+from app.services.llm import llm_client, parse_json_text
+from app.services.json_stream import RoadmapStreamParser
+
+# Меняйте при любой правке промпта: старые записи кэша перестанут совпадать по ключу
+PROMPT_VERSION = "v2.1"
+
+
+def _normalize(value) -> str:
+    return " ".join(str(value or "").split()).casefold()
+
+
+def roadmap_cache_key(role: str, current_stack: str, goal: str, hours: int, learning_style: str,
+                      focus: str, constraints: str, model: str) -> str:
+    """
+    Ключ кэша по нормализованной анкете: регистр, лишние пробелы и порядок
+    технологий в current_stack ("FastAPI, SQL" == "sql,fastapi") не важны.
+    """
+    stack = sorted({_normalize(item) for item in re.split(r"[,;]", current_stack or "") if item.strip()})
+    return make_cache_key("roadmap_v2", {
+        "role": _normalize(role),
+        "current_stack": stack,
+        "goal": _normalize(goal),
+        "hours": int(hours),
+        "learning_style": _normalize(learning_style),
+        "focus": _normalize(focus),
+        "constraints": _normalize(constraints),
+        "prompt_version": PROMPT_VERSION,
+        "model": model,
+    })
+
+
+def _build_cache() -> Optional[TieredCache]:
+    if not settings.ROADMAP_CACHE_ENABLED:
+        return None
+    ttl = settings.ROADMAP_CACHE_TTL_SECONDS
+    disk = SQLiteCache(settings.ROADMAP_CACHE_PATH, ttl) if settings.ROADMAP_CACHE_PATH else None
+    return TieredCache(TTLCache(settings.ROADMAP_CACHE_MAXSIZE, ttl), disk)
+
+
+roadmap_cache = _build_cache()
+
+
+@registry.add_collector
+def _collect_roadmap_cache_stats():
+    if roadmap_cache is not None:
+        cache_requests_total.set_total(roadmap_cache.memory_hits, cache="roadmap", result="memory_hit")
+        cache_requests_total.set_total(roadmap_cache.disk_hits, cache="roadmap", result="disk_hit")
+        cache_requests_total.set_total(roadmap_cache.misses, cache="roadmap", result="miss")
+
+
+# Одинаковые анкеты, пришедшие одновременно, ждут один вызов Gemini
+roadmap_inflight = SingleFlight()
 
 
 class AIService:
-    def __init__(self):
-        # Настраиваем Gemini при запуске
-        if settings.GEMINI_API_KEY:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
+    def __init__(self, cache: Optional[TieredCache] = None):
+        # Сам клиент Gemini общий (app/services/llm.py), здесь только выбираем модель
+        if settings.LLM_PROVIDER in ("gemini", "record") and not settings.GEMINI_API_KEY:
             print("WARNING: GEMINI_API_KEY is missing in config.py")
+        self.model_name = settings.GEMINI_ROADMAP_MODEL
+        self.cache = cache
 
-    def generate_roadmap(self, role: str, current_stack: str, goal: str, hours: int, learning_style: str, focus: str, constraints: str):
-        prompt = f"""
+    def _cache_get(self, key: str):
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _cache_set(self, key: str, data: dict):
+        # Кэшируем только валидные v2-ответы, запасной шаблон не должен залипнуть на неделю
+        if self.cache is not None and isinstance(data, dict) and data.get("modules"):
+            self.cache.set(key, data)
+
+    def _build_prompt(self, role: str, current_stack: str, goal: str, hours: int, learning_style: str, focus: str, constraints: str) -> str:
+        return f"""
         Act as a Senior IT Mentor and Curriculum Designer. Create a comprehensive, custom learning roadmap for a user.
 
         User Profile:
@@ -118,23 +183,81 @@ class AIService:
         }}
         """
 
+    def generate_roadmap(self, role: str, current_stack: str, goal: str, hours: int, learning_style: str, focus: str, constraints: str):
+        key = roadmap_cache_key(role, current_stack, goal, hours, learning_style, focus, constraints, self.model_name)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(role, current_stack, goal, hours, learning_style, focus, constraints)
         try:
-            # Отправляем запрос
-            response = self.model.generate_content(prompt)
-            raw_text = response.text
+            raw_text = llm_client.generate_text_sync(prompt, model=self.model_name)
+            data = parse_json_text(raw_text)
+
+        except Exception as e:
+            print(f"Error generating AI roadmap: {e}")
+            # Возвращаем запасной вариант, если API упал или вернул кривой JSON
+            return self._get_fallback_data(role)
+
+        self._cache_set(key, data)
+        return data
+
+    async def agenerate_roadmap(self, role: str, current_stack: str, goal: str, hours: int, learning_style: str, focus: str, constraints: str,
+                                fallback: bool = True):
+        """
+        Асинхронная версия generate_roadmap: пока ждем Gemini, поток не блокируется.
+        fallback=False — вместо запасного шаблона пробрасывает ошибку (фоновые задачи:
+        задача должна стать FAILED, а не сохранить пустую карьеру).
+        """
+        key = roadmap_cache_key(role, current_stack, goal, hours, learning_style, focus, constraints, self.model_name)
+        # SQLite-уровень кэша — блокирующий I/O, в event loop его не выполняем
+        cached = await run_in_threadpool(self._cache_get, key)
+        if cached is not None:
+            return cached
 
-            # Чистим ответ: Gemini любит оборачивать JSON в ```json ... ```
-            cleaned_text = raw_text.replace("```json", "").replace("```", "").strip()
+        prompt = self._build_prompt(role, current_stack, goal, hours, learning_style, focus, constraints)
 
-            # Превращаем строку в Python словарь
-            data = json.loads(cleaned_text)
+        async def call_llm():
+            raw_text = await llm_client.generate_text(prompt, model=self.model_name)
+            data = parse_json_text(raw_text)
+            await run_in_threadpool(self._cache_set, key, data)
+            return data
+
+        try:
+            # Результат общий для всех ожидающих — его нельзя мутировать
+            data = await roadmap_inflight.do(key, call_llm)
+            if not fallback and not (isinstance(data, dict) and data.get("modules")):
+                raise ValueError("AI response has no modules")
             return data
 
         except Exception as e:
             print(f"Error generating AI roadmap: {e}")
-            # Возвращаем запасной вариант, если API упал или вернул кривой JSON
+            if not fallback:
+                raise
             return self._get_fallback_data(role)
 
+    async def astream_roadmap(self, role: str, current_stack: str, goal: str, hours: int, learning_style: str, focus: str, constraints: str) -> AsyncIterator[tuple[str, Any]]:
+        """
+        Потоковая генерация: отдает ("roadmap_meta", dict) и ("module", dict)
+        сразу, как только соответствующий объект закрылся в ответе модели.
+        Запасного шаблона нет — ошибки пробрасываются вызывающему.
+        """
+        key = roadmap_cache_key(role, current_stack, goal, hours, learning_style, focus, constraints, self.model_name)
+        cached = await run_in_threadpool(self._cache_get, key)
+        if cached is not None:
+            if "roadmap_meta" in cached:
+                yield "roadmap_meta", cached["roadmap_meta"]
+            for module_data in cached.get("modules", []):
+                yield "module", module_data
+            return
+
+        prompt = self._build_prompt(role, current_stack, goal, hours, learning_style, focus, constraints)
+        parser = RoadmapStreamParser()
+        async for text in llm_client.stream_text(prompt, model=self.model_name):
+            for event in parser.feed(text):
+                yield event
+        await run_in_threadpool(self._cache_set, key, parser.finish())
+
     def _get_fallback_data(self, role):
         return {
             "title": f"Path to {role} (Offline Mode)",
@@ -153,4 +276,4 @@ class AIService:
         }
 
 
-ai_service = AIService()
\ No newline at end of file
+ai_service = AIService(cache=roadmap_cache)
\ No newline at end of file
@@ -0,0 +1,300 @@
+# app/services/answer_cache.py
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.core.metrics import registry, cache_requests_total
+from app.models.chat import ChatMessage
+
+# Слова-связки вопросов: "what is a decorator" и "explain decorators pls" должны совпасть
+STOP_WORDS = frozenset("""
+a an the is are was were be do does did can could would should will i me my you your we
+what whats how why when which who explain please pls plz tell about show give example
+in on of to for with and or it this that there here some any just difference between
+""".split())
+
+_WORD_RE = re.compile(r"[a-zа-яё0-9_+#]+")
+
+
+def normalize_question(text: str) -> str:
+    words = []
+    for word in _WORD_RE.findall(text.casefold()):
+        if word in STOP_WORDS:
+            continue
+        # Простейший стемминг: decorators -> decorator
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+def text_features(normalized: str, ngram_range: tuple[int, int] = (3, 5)) -> dict[str, int]:
+    """Слова + символьные n-граммы внутри слов (устойчивы к опечаткам и словоформам)."""
+    counts: dict[str, int] = {}
+    lo, hi = ngram_range
+    for word in normalized.split():
+        counts["w:" + word] = counts.get("w:" + word, 0) + 1
+        padded = f" {word} "
+        for n in range(lo, hi + 1):
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+@dataclass
+class CachedAnswer:
+    reply: str
+    question: str
+    similarity: float
+    liked: Optional[bool]
+    source_id: int  # id исходного ответа AI (для link)
+
+
+@dataclass
+class _Entry:
+    question: str
+    reply: str
+    message_ids: set[int]  # исходный ответ AI и все ответы, выданные из кэша
+    liked: Optional[bool] = None
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class _TopicIndex:
+    """
+    Матрица hashed log-TF (строка на ответ) + document frequency по признакам.
+    IDF применяется в момент поиска, поэтому добавление и удаление — O(dim),
+    без пересчета уже сохраненных векторов.
+    """
+
+    def __init__(self, dim: int):
+        self.matrix = np.zeros((8, dim), dtype=np.float32)
+        self.df = np.zeros(dim, dtype=np.float32)
+        self.entries: list[_Entry] = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, vector, entry: _Entry) -> int:
+        row = len(self.entries)
+        if row == self.matrix.shape[0]:
+            grown = np.zeros((row * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[:row] = self.matrix
+            self.matrix = grown
+        self.matrix[row] = vector
+        self.df += vector > 0
+        self.entries.append(entry)
+        return row
+
+    def remove(self, row: int) -> _Entry:
+        # swap-with-last: удаление без сдвига матрицы
+        last = len(self.entries) - 1
+        self.df -= self.matrix[row] > 0
+        entry = self.entries[row]
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.entries[row] = self.entries[last]
+        self.matrix[last] = 0
+        self.entries.pop()
+        return entry
+
+    def search(self, vector):
+        n = len(self.entries)
+        idf = np.log((1.0 + n) / (1.0 + self.df)) + 1.0
+        query = vector * idf
+        query_norm = np.linalg.norm(query)
+        if n == 0 or query_norm == 0:
+            return np.zeros(0, dtype=np.float32)
+        weighted = self.matrix[:n] * idf
+        norms = np.linalg.norm(weighted, axis=1)
+        norms[norms == 0] = 1.0
+        return (weighted @ query) / (norms * query_norm)
+
+
+class AnswerCache:
+    """
+    Локальный кэш ответов AI-ментора по похожести вопроса, отдельно на каждую
+    context_topic. Без внешних эмбеддингов: hashed TF-IDF по словам и символьным
+    n-граммам в NumPy. Ответ отдается, если cosine >= threshold; лайкнутые
+    ответы в приоритете, дизлайкнутые удаляются из индекса.
+
+    Память ограничена: не больше max_entries ответов на процесс (dim float32 на
+    каждый), при переполнении вытесняется давно не использованный ответ темы.
+    Кэш локален для процесса; при старте прогревается из chat_messages.
+    """
+
+    def __init__(self, dim: int, max_entries: int, max_per_topic: int, threshold: float):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.max_per_topic = max_per_topic
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._topics: dict[str, _TopicIndex] = {}
+        self._by_message: dict[int, tuple[str, _Entry]] = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _topic_key(topic: Optional[str]) -> str:
+        return " ".join((topic or "").split()).casefold()
+
+    def _vectorize(self, question: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in text_features(normalize_question(question)).items():
+            vector[zlib.crc32(feature.encode()) % self.dim] += 1.0 + np.log(count)
+        return vector
+
+    def lookup(self, topic: Optional[str], question: str) -> Optional[CachedAnswer]:
+        vector = self._vectorize(question)
+        with self._lock:
+            index = self._topics.get(self._topic_key(topic))
+            if index is None or not len(index) or not vector.any():
+                self.misses += 1
+                return None
+            sims = index.search(vector)
+            best, best_key = None, None
+            for row in np.flatnonzero(sims >= self.threshold):
+                entry = index.entries[row]
+                if entry.liked is False:
+                    continue
+                key = (entry.liked is True, float(sims[row]))
+                if best_key is None or key > best_key:
+                    best, best_key = entry, key
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            best.last_used = time.monotonic()
+            return CachedAnswer(best.reply, best.question, best_key[1], best.liked, min(best.message_ids))
+
+    def add(self, topic: Optional[str], question: str, reply: str, message_id: int,
+            liked: Optional[bool] = None):
+        if liked is False or not reply:
+            return
+        vector = self._vectorize(question)
+        if not vector.any():
+            return
+        topic_key = self._topic_key(topic)
+        with self._lock:
+            index = self._topics.get(topic_key)
+            if index is None:
+                index = self._topics[topic_key] = _TopicIndex(self.dim)
+            if len(index) >= self.max_per_topic:
+                self._evict_lru(topic_key, index)
+            elif self._size >= self.max_entries:
+                largest = max(self._topics, key=lambda t: len(self._topics[t]))
+                self._evict_lru(largest, self._topics[largest])
+            entry = _Entry(question=question, reply=reply, message_ids={message_id}, liked=liked)
+            index.add(vector, entry)
+            self._by_message[message_id] = (topic_key, entry)
+            self._size += 1
+
+    def link(self, message_id: int, source_id: int):
+        """Ответ, выданный из кэша, сохранен как новое сообщение — его лайк относится к той же записи."""
+        with self._lock:
+            found = self._by_message.get(source_id)
+            if found is not None:
+                found[1].message_ids.add(message_id)
+                self._by_message[message_id] = found
+
+    def feedback(self, message_id: int, is_liked: bool):
+        with self._lock:
+            found = self._by_message.get(message_id)
+            if found is None:
+                return
+            topic_key, entry = found
+            if is_liked:
+                entry.liked = True
+                return
+            index = self._topics[topic_key]
+            row = next((i for i, e in enumerate(index.entries) if e is entry), None)
+            if row is not None:
+                self._remove(topic_key, index, row)
+
+    def _remove(self, topic_key: str, index: _TopicIndex, row: int):
+        entry = index.remove(row)
+        for message_id in entry.message_ids:
+            self._by_message.pop(message_id, None)
+        self._size -= 1
+        if not len(index):
+            del self._topics[topic_key]
+
+    def _evict_lru(self, topic_key: str, index: _TopicIndex):
+        row = min(range(len(index.entries)), key=lambda i: index.entries[i].last_used)
+        self._remove(topic_key, index, row)
+
+    def warm(self, db: Session, limit: int) -> int:
+        """
+        Загружает последние limit ответов AI. Вопрос — предыдущее сообщение
+        пользователя в той же теме. Копии ответа, выданные из кэша, сворачиваются
+        в одну запись: дизлайк любой копии исключает ответ, лайк — помечает.
+        """
+        if limit <= 0:
+            return 0
+        question = aliased(ChatMessage)
+        question_id = db.query(func.max(question.id)).filter(
+            question.user_id == ChatMessage.user_id,
+            question.context_topic == ChatMessage.context_topic,
+            question.role == "user",
+            question.id < ChatMessage.id,
+        ).correlate(ChatMessage).scalar_subquery()
+        answers = db.query(ChatMessage.id, ChatMessage.context_topic, ChatMessage.content,
+                           ChatMessage.is_liked, question_id.label("question_id")).filter(
+            ChatMessage.role == "ai",
+        ).order_by(ChatMessage.id.desc()).limit(limit).all()
+
+        groups: dict[tuple, dict] = {}
+        for answer in reversed(answers):
+            group = groups.setdefault((self._topic_key(answer.context_topic), answer.content),
+                                      {"topic": answer.context_topic, "ids": [], "liked": None,
+                                       "question_id": answer.question_id})
+            group["ids"].append(answer.id)
+            if answer.is_liked is not None and group["liked"] is not False:
+                group["liked"] = answer.is_liked
+
+        question_ids = {g["question_id"] for g in groups.values() if g["question_id"]}
+        questions = dict(db.query(ChatMessage.id, ChatMessage.content)
+                         .filter(ChatMessage.id.in_(question_ids)).all()) if question_ids else {}
+        for (_, reply), group in groups.items():
+            if group["liked"] is False or group["question_id"] not in questions:
+                continue
+            first_id, *copies = group["ids"]
+            self.add(group["topic"], questions[group["question_id"]], reply, first_id, liked=group["liked"])
+            for message_id in copies:
+                self.link(message_id, first_id)
+        return len(groups)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "entries": self._size,
+            "topics": len(self._topics),
+            "memory_bytes": sum(index.matrix.nbytes + index.df.nbytes for index in self._topics.values()),
+        }
+
+
+answer_cache = AnswerCache(
+    dim=settings.CHAT_ANSWER_CACHE_DIM,
+    max_entries=settings.CHAT_ANSWER_CACHE_MAX_ENTRIES,
+    max_per_topic=settings.CHAT_ANSWER_CACHE_MAX_PER_TOPIC,
+    threshold=settings.CHAT_ANSWER_CACHE_THRESHOLD,
+) if settings.CHAT_ANSWER_CACHE_ENABLED else None
+
+
+@registry.add_collector
+def _collect_answer_cache_stats():
+    if answer_cache is not None:
+        cache_requests_total.set_total(answer_cache.hits, cache="chat_answer", result="hit")
+        cache_requests_total.set_total(answer_cache.misses, cache="chat_answer", result="miss")
@@ -0,0 +1,117 @@
+# app/services/auth_cache.py
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from jose import jwt
+from sqlalchemy import event, inspect
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import registry, cache_requests_total
+from app.models.user import User
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """
+    Неизменяемый снимок пользователя для зависимостей FastAPI.
+    Не привязан к сессии, поэтому безопасно живет в кэше между запросами.
+    """
+    id: int
+    email: str
+    username: Optional[str]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_orm_user(cls, user: User) -> "CurrentUser":
+        return cls(id=user.id, email=user.email, username=user.username, created_at=user.created_at)
+
+
+class AuthCache:
+    """
+    Два уровня кэша для get_current_user:
+    - token -> проверенные claims (экономим jwt.decode и HMAC на каждый запрос);
+      запись живет не дольше exp самого токена;
+    - email -> CurrentUser (экономим SELECT из users).
+    Кэш локален для процесса: изменения пользователя через ORM сбрасывают его
+    сразу, а в других воркерах устаревание ограничено TTL.
+    """
+
+    def __init__(self, maxsize: int, token_ttl: float, user_ttl: float):
+        self.tokens = TTLCache(maxsize=maxsize, ttl=token_ttl)
+        self.users = TTLCache(maxsize=maxsize, ttl=user_ttl)
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+
+    def decode_token(self, token: str) -> dict:
+        """
+        Возвращает claims токена. JWTError пробрасывается как есть.
+        """
+        claims = self.tokens.get(token)
+        if claims is not None and claims.get("exp", 0) > time.time():
+            self.token_hits += 1
+            return claims
+
+        self.token_misses += 1
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        self.tokens.set(token, claims)
+        return claims
+
+    def get_user(self, email: str) -> Optional[CurrentUser]:
+        user = self.users.get(email)
+        if user is None:
+            self.user_misses += 1
+        else:
+            self.user_hits += 1
+        return user
+
+    def set_user(self, user: CurrentUser):
+        self.users.set(user.email, user)
+
+    def invalidate_user(self, email: str):
+        self.users.delete(email)
+
+    def stats(self) -> dict:
+        token_total = self.token_hits + self.token_misses
+        user_total = self.user_hits + self.user_misses
+        return {
+            "token_hits": self.token_hits,
+            "token_misses": self.token_misses,
+            "token_hit_ratio": round(self.token_hits / token_total, 4) if token_total else 0.0,
+            "user_hits": self.user_hits,
+            "user_misses": self.user_misses,
+            "user_hit_ratio": round(self.user_hits / user_total, 4) if user_total else 0.0,
+            "tokens_cached": len(self.tokens),
+            "users_cached": len(self.users),
+        }
+
+
+auth_cache = AuthCache(
+    maxsize=settings.AUTH_CACHE_MAXSIZE,
+    token_ttl=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+    user_ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+)
+
+
+@registry.add_collector
+def _collect_auth_cache_stats():
+    cache_requests_total.set_total(auth_cache.token_hits, cache="auth_token", result="hit")
+    cache_requests_total.set_total(auth_cache.token_misses, cache="auth_token", result="miss")
+    cache_requests_total.set_total(auth_cache.user_hits, cache="auth_user", result="hit")
+    cache_requests_total.set_total(auth_cache.user_misses, cache="auth_user", result="miss")
+
+
+# Инвалидация при любом изменении пользователя через ORM.
+# Массовые query(User).update()/delete() эти события не вызывают — после них
+# нужно звать auth_cache.invalidate_user вручную.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User):
+    history = inspect(target).attrs.email.history
+    for email in {target.email, *(history.deleted or ())}:
+        if email:
+            auth_cache.invalidate_user(email)
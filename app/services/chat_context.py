@@ -0,0 +1,200 @@
+# app/services/chat_context.py
+import hashlib
+from dataclasses import dataclass
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.chat import ChatMessage, ChatSummary
+from app.services.llm import llm_client
+
+# Грубая оценка без токенизатора: ~4 символа на токен для английского текста и кода
+CHARS_PER_TOKEN = 4
+
+ROLE_NAMES = {"user": "Student", "ai": "Mentor"}
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a tutoring conversation on the topic "{topic}".
+
+Current summary (may be empty):
+{summary}
+
+New messages to fold in:
+{messages}
+
+Write the updated summary in at most {max_words} words. Keep what the student
+already knows, what they struggled with, decisions made and any code or tools
+they use. Plain text, no preamble.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 3, 0)].rstrip() + "..."
+
+
+def _format_message(role: str, content: str, max_tokens: int) -> str:
+    return f"{ROLE_NAMES.get(role, role)}: {truncate_to_tokens(' '.join(content.split()), max_tokens)}"
+
+
+@dataclass(frozen=True)
+class ChatContext:
+    history: str  # блок для промпта (сводка + последние реплики), может быть пустым
+    digest: str  # отпечаток history — часть ключа coalescing одинаковых вопросов
+    message_ids: tuple[int, ...]  # реплики, попавшие в промпт
+    window_start_id: int  # всё старше этого id (и новее сводки) пора сворачивать
+    tokens: int
+
+
+class ChatContextAssembler:
+    """
+    Собирает историю разговора для промпта AI-ментора в пределах бюджета токенов.
+
+    - последние реплики по (user_id, context_topic) — keyset по id через индекс
+      ix_chat_messages_user_topic_id, не больше CHAT_CONTEXT_RECENT_MESSAGES;
+    - всё, что старше окна, хранится сводкой в chat_summaries и обновляется
+      инкрементально (отдельным вызовом LLM уже после ответа пользователю).
+    Поэтому размер промпта не растет с длиной разговора.
+    """
+
+    def __init__(self, token_budget: int, recent_messages: int, message_max_tokens: int,
+                 summary_max_tokens: int, summary_min_batch: int, summary_max_batch: int):
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self.message_max_tokens = message_max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_min_batch = summary_min_batch
+        self.summary_max_batch = summary_max_batch
+
+    def assemble(self, db: Session, user_id: int, topic: str, before_id: int, reserved_tokens: int) -> ChatContext:
+        """
+        before_id — id текущего вопроса (уже сохранен), reserved_tokens — промпт без истории.
+        """
+        summary = db.get(ChatSummary, (user_id, topic))
+        summarized_until = summary.summarized_until_id if summary else 0
+
+        rows = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+            ChatMessage.user_id == user_id,
+            ChatMessage.context_topic == topic,
+            ChatMessage.id > summarized_until,
+            ChatMessage.id < before_id,
+        ).order_by(ChatMessage.id.desc()).limit(self.recent_messages).all()
+
+        budget = self.token_budget - reserved_tokens
+        blocks = []
+        if summary and summary.summary:
+            summary_block = "Summary of the earlier conversation:\n" + truncate_to_tokens(
+                summary.summary, self.summary_max_tokens
+            )
+            if estimate_tokens(summary_block) <= budget:
+                blocks.append(summary_block)
+                budget -= estimate_tokens(summary_block)
+
+        # От новых к старым, пока помещаемся; не поместившиеся уйдут в сводку
+        included = []
+        for row in rows:
+            line = _format_message(row.role, row.content or "", self.message_max_tokens)
+            cost = estimate_tokens(line) + 1
+            if cost > budget:
+                break
+            included.append((row.id, line))
+            budget -= cost
+        included.reverse()
+
+        if included:
+            blocks.append("Recent conversation:\n" + "\n".join(line for _, line in included))
+
+        history = "\n\n".join(blocks)
+        return ChatContext(
+            history=history,
+            digest=hashlib.sha256(history.encode()).hexdigest()[:16],
+            message_ids=tuple(message_id for message_id, _ in included),
+            window_start_id=included[0][0] if included else before_id,
+            tokens=estimate_tokens(history),
+        )
+
+    # --- Свертка старых реплик в сводку ---
+
+    def _load_overflow(self, user_id: int, topic: str, before_id: int):
+        with SessionLocal() as db:
+            summary = db.get(ChatSummary, (user_id, topic))
+            summarized_until = summary.summarized_until_id if summary else 0
+            rows = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+                ChatMessage.user_id == user_id,
+                ChatMessage.context_topic == topic,
+                ChatMessage.id > summarized_until,
+                ChatMessage.id < before_id,
+            ).order_by(ChatMessage.id).limit(self.summary_max_batch).all()
+            return summary is not None, (summary.summary if summary else ""), summarized_until, rows
+
+    def _store_summary(self, user_id: int, topic: str, exists: bool, expected_until: int,
+                       new_until: int, text: str) -> bool:
+        # Оптимистично: если параллельный запрос уже свернул эти реплики, наш результат отбрасываем
+        with SessionLocal() as db:
+            if exists:
+                updated = db.execute(
+                    update(ChatSummary).where(
+                        ChatSummary.user_id == user_id,
+                        ChatSummary.context_topic == topic,
+                        ChatSummary.summarized_until_id == expected_until,
+                    ).values(summary=text, summarized_until_id=new_until)
+                ).rowcount
+            else:
+                try:
+                    db.execute(insert(ChatSummary).values(
+                        user_id=user_id, context_topic=topic, summary=text, summarized_until_id=new_until
+                    ))
+                    updated = 1
+                except IntegrityError:
+                    db.rollback()
+                    return False
+            db.commit()
+            return bool(updated)
+
+    async def refresh_summary(self, user_id: int, topic: str, window_start_id: int) -> bool:
+        """
+        Сворачивает реплики между сводкой и окном последних сообщений.
+        Вызывается после ответа пользователю; ошибки LLM не критичны — свернем в следующий раз.
+        """
+        exists, summary, summarized_until, rows = await run_in_threadpool(
+            self._load_overflow, user_id, topic, window_start_id
+        )
+        if len(rows) < self.summary_min_batch:
+            return False
+
+        prompt = SUMMARY_PROMPT.format(
+            topic=topic,
+            summary=summary or "(empty)",
+            messages="\n".join(_format_message(r.role, r.content or "", self.message_max_tokens) for r in rows),
+            max_words=self.summary_max_tokens * 3 // 4,
+        )
+        try:
+            text = await llm_client.generate_text(prompt, model=settings.GEMINI_CHAT_MODEL)
+        except Exception as e:
+            print(f"Chat summary error: {e}")
+            return False
+
+        text = truncate_to_tokens(text.strip(), self.summary_max_tokens)
+        return await run_in_threadpool(
+            self._store_summary, user_id, topic, exists, summarized_until, rows[-1].id, text
+        )
+
+
+chat_context = ChatContextAssembler(
+    token_budget=settings.CHAT_CONTEXT_TOKEN_BUDGET,
+    recent_messages=settings.CHAT_CONTEXT_RECENT_MESSAGES,
+    message_max_tokens=settings.CHAT_CONTEXT_MESSAGE_MAX_TOKENS,
+    summary_max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS,
+    summary_min_batch=settings.CHAT_SUMMARY_MIN_BATCH,
+    summary_max_batch=settings.CHAT_SUMMARY_MAX_BATCH,
+)
@@ -0,0 +1,134 @@
+# app/services/json_stream.py
+import json
+import re
+from typing import Any, Optional
+
+# Символы, меняющие состояние сканера. Всё остальное пропускаем одним прыжком re.search
+_STRUCTURAL = re.compile(r'[{}\[\]":\\]')
+_IN_STRING = re.compile(r'["\\]')
+
+
+class RoadmapStreamParser:
+    """
+    Инкрементальный парсер JSON-ответа v2-генератора.
+
+    feed() принимает очередной кусок текста и возвращает готовые события:
+    - (<ключ>, value) — объект/массив верхнего уровня закрылся (например "roadmap_meta");
+    - ("module", value) — закрылся очередной элемент массива stream_key ("modules").
+    Каждое значение разбирается json.loads один раз, как только закрылась его скобка.
+    Уже разобранный текст выкидывается из буфера, так что буфер не больше
+    одного модуля. Мусор до первой "{" и после последней "}" (```json) игнорируется.
+    """
+
+    def __init__(self, stream_key: str = "modules", keep_result: bool = True):
+        self.stream_key = stream_key
+        self.keep_result = keep_result
+        self.result: dict[str, Any] = {}
+
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._key_start: Optional[int] = None  # начало строки-ключа на глубине 1
+        self._last_string: Optional[str] = None
+        self._key: Optional[str] = None  # текущий ключ верхнего уровня
+        self._in_stream_array = False
+        self._capture_start: Optional[int] = None
+        self._capture_depth: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        events: list[tuple[str, Any]] = []
+        if self._done:
+            return events
+
+        self._buf += chunk
+        buf = self._buf
+        i = self._pos
+
+        if not self._started:
+            i = buf.find("{", i)
+            if i < 0:
+                self._buf, self._pos = "", 0
+                return events
+            self._started = True
+            self._depth = 1
+            i += 1
+
+        while not self._done:
+            match = (_IN_STRING if self._in_string else _STRUCTURAL).search(buf, i)
+            if match is None:
+                i = len(buf)
+                break
+            i = match.start()
+            ch = buf[i]
+
+            if self._in_string:
+                if ch == "\\":
+                    if i + 1 >= len(buf):
+                        break  # экранированный символ придет в следующем куске
+                    i += 2
+                    continue
+                self._in_string = False
+                if self._key_start is not None:
+                    self._last_string = json.loads(buf[self._key_start:i + 1])
+                    self._key_start = None
+            elif ch == "\\":
+                pass  # вне строки в валидном JSON не встречается
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._key_start = i
+            elif ch == ":":
+                if self._depth == 1:
+                    self._key = self._last_string
+            elif ch in "{[":
+                self._depth += 1
+                if self._capture_start is None:
+                    if self._depth == 2 and self._key == self.stream_key and ch == "[":
+                        self._in_stream_array = True
+                    elif self._depth == 2 or (self._depth == 3 and self._in_stream_array):
+                        self._capture_start, self._capture_depth = i, self._depth
+            else:  # "}" или "]"
+                if self._capture_start is not None and self._depth == self._capture_depth:
+                    value = json.loads(buf[self._capture_start:i + 1])
+                    events.append(self._emit(value))
+                    self._capture_start = self._capture_depth = None
+                elif self._depth == 2 and self._in_stream_array:
+                    self._in_stream_array = False
+                self._depth -= 1
+                if self._depth == 0:
+                    self._done = True
+            i += 1
+
+        # Выкидываем уже разобранный текст
+        keep_from = i
+        for start in (self._capture_start, self._key_start):
+            if start is not None:
+                keep_from = min(keep_from, start)
+        self._buf = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._capture_start is not None:
+            self._capture_start -= keep_from
+        if self._key_start is not None:
+            self._key_start -= keep_from
+        return events
+
+    def _emit(self, value: Any) -> tuple[str, Any]:
+        if self._capture_depth == 3:
+            if self.keep_result:
+                self.result.setdefault(self.stream_key, []).append(value)
+            return "module", value
+        if self.keep_result:
+            self.result[self._key] = value
+        return self._key, value
+
+    def finish(self) -> dict[str, Any]:
+        if not self._done:
+            raise ValueError("Incomplete JSON: stream ended before the root object was closed")
+        return self.result
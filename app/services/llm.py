@@ -0,0 +1,94 @@
+# app/services/llm.py
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.metrics import LLMCallTimer
+from app.services.llm_providers import LLMProvider, LLMTimeoutError, build_provider  # noqa: F401
+
+
+def parse_json_text(raw_text: str):
+    """
+    Превращает ответ модели в Python-объект.
+    Gemini любит оборачивать JSON в ```json ... ```, поэтому сначала чистим.
+    """
+    cleaned_text = raw_text.replace("```json", "").replace("```", "").strip()
+    return json.loads(cleaned_text)
+
+
+class LLMClient:
+    """
+    Единая точка вызова LLM для всего приложения (чат, сводки, генерация роадмапов).
+
+    Сам вызов делает провайдер (LLM_PROVIDER: gemini, fake, record, replay —
+    см. app/services/llm_providers.py), а здесь общие для всех таймауты и метрики.
+    Так весь стек можно гонять под нагрузкой без квоты и сети.
+    """
+
+    def __init__(self, provider: LLMProvider, timeout: float):
+        self.provider = provider
+        self.timeout = timeout
+
+    async def generate_text(self, prompt: str, *, model: str, timeout: Optional[float] = None) -> str:
+        """
+        Асинхронный вызов: не занимает поток из пула AnyIO, пока ждем ответ модели.
+        """
+        timeout = timeout or self.timeout
+        with LLMCallTimer(model, "generate") as call:
+            try:
+                response = await asyncio.wait_for(self.provider.generate(prompt, model), timeout=timeout)
+            except asyncio.TimeoutError as e:
+                raise LLMTimeoutError(f"LLM call timed out after {timeout}s") from e
+            call.usage = response.usage
+        return response.text
+
+    async def stream_text(self, prompt: str, *, model: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Стриминг ответа кусками по мере генерации.
+        timeout здесь — максимальная пауза между кусками, а не время всего ответа.
+        Если потребитель перестал читать (клиент отключился -> генератор закрыт/отменен),
+        upstream-стрим закрывается в finally, и Gemini перестает генерировать токены.
+        """
+        timeout = timeout or self.timeout
+        # Латентность стрима — до последнего куска; обрыв клиентом попадет в outcome как GeneratorExit
+        with LLMCallTimer(model, "stream") as call:
+            stream = self.provider.stream(prompt, model)
+            started = False
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError as e:
+                        if not started:
+                            raise LLMTimeoutError(f"LLM stream did not start within {timeout}s") from e
+                        raise LLMTimeoutError(f"LLM stream stalled for {timeout}s") from e
+                    started = True
+                    # usage накопительный — берем из последнего куска, где он есть
+                    if chunk.usage is not None:
+                        call.usage = chunk.usage
+                    if chunk.text:
+                        yield chunk.text
+            finally:
+                await stream.aclose()
+
+    def generate_text_sync(self, prompt: str, *, model: str) -> str:
+        """
+        Синхронный вариант для старых sync-эндпоинтов и скриптов.
+        Таймаут задается на уровне HTTP-клиента.
+        """
+        with LLMCallTimer(model, "generate_sync") as call:
+            response = self.provider.generate_sync(prompt, model)
+            call.usage = response.usage
+        return response.text
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+
+llm_client = LLMClient(
+    provider=build_provider(settings.LLM_PROVIDER),
+    timeout=settings.LLM_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,467 @@
+# app/services/llm_providers.py
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.core.config import settings
+
+# Провайдер — это "куда уходит промпт". Таймауты, метрики и пул соединений
+# остаются в LLMClient (app/services/llm.py), поэтому любой провайдер
+# ведет себя для вызывающего кода одинаково: LLMTimeoutError, исключения с "429" и т.д.
+
+
+class LLMTimeoutError(Exception):
+    """LLM не ответил за отведенное время."""
+
+
+class CassetteMissError(Exception):
+    """В режиме replay для промпта нет записанной кассеты."""
+
+
+@dataclass
+class LLMUsage:
+    # Те же имена, что у usage_metadata в google-genai (см. observe_llm_usage)
+    prompt_token_count: Optional[int] = None
+    candidates_token_count: Optional[int] = None
+
+
+@dataclass
+class LLMChunk:
+    text: str
+    usage: Optional[LLMUsage] = None
+
+
+def _usage_from_gemini(usage_metadata) -> Optional[LLMUsage]:
+    if usage_metadata is None:
+        return None
+    return LLMUsage(
+        prompt_token_count=getattr(usage_metadata, "prompt_token_count", None),
+        candidates_token_count=getattr(usage_metadata, "candidates_token_count", None),
+    )
+
+
+class LLMProvider(ABC):
+    """
+    generate / stream / generate_sync возвращают текст и usage.
+    stream — async-генератор кусков; закрытие генератора должно закрывать upstream.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str, model: str) -> LLMChunk:
+        ...
+
+    @abstractmethod
+    def stream(self, prompt: str, model: str) -> AsyncIterator[LLMChunk]:
+        ...
+
+    @abstractmethod
+    def generate_sync(self, prompt: str, model: str) -> LLMChunk:
+        ...
+
+    async def aclose(self):
+        pass
+
+
+class GeminiProvider(LLMProvider):
+    """
+    Google Gemini через google-genai. Один genai.Client, а значит один пул
+    HTTP-соединений (sync и async) на все запросы вместо нового TCP/TLS на каждый вызов.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str], timeout: float, max_connections: int, max_keepalive: int):
+        self._api_key = api_key
+        self.timeout = timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        self._client = None
+
+    @property
+    def client(self):
+        # Создаем лениво: импорт модуля не должен падать без GEMINI_API_KEY
+        if self._client is None:
+            if not self._api_key:
+                # Проверяем здесь, а не в Settings: миграции и скрипты грузят настройки без LLM
+                raise RuntimeError("GEMINI_API_KEY is not set (required for LLM_PROVIDER=gemini/record)")
+            from google import genai
+            from google.genai import types
+
+            self._client = genai.Client(
+                api_key=self._api_key,
+                http_options=types.HttpOptions(
+                    timeout=int(self.timeout * 1000),  # SDK ждет миллисекунды
+                    client_args={"limits": self._limits},
+                    async_client_args={"limits": self._limits},
+                ),
+            )
+        return self._client
+
+    async def generate(self, prompt: str, model: str) -> LLMChunk:
+        response = await self.client.aio.models.generate_content(model=model, contents=prompt)
+        return LLMChunk(response.text or "", _usage_from_gemini(response.usage_metadata))
+
+    async def stream(self, prompt: str, model: str) -> AsyncIterator[LLMChunk]:
+        stream = await self.client.aio.models.generate_content_stream(model=model, contents=prompt)
+        try:
+            async for chunk in stream:
+                # usage_metadata накопительный — LLMClient берет последний, где он есть
+                yield LLMChunk(chunk.text or "", _usage_from_gemini(chunk.usage_metadata))
+        finally:
+            await stream.aclose()
+
+    def generate_sync(self, prompt: str, model: str) -> LLMChunk:
+        response = self.client.models.generate_content(model=model, contents=prompt)
+        return LLMChunk(response.text or "", _usage_from_gemini(response.usage_metadata))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aio.aclose()
+            self._client.close()
+            self._client = None
+
+
+# --- Fake ---
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 символа на токен, как в chat_context
+    return max((len(text) + 3) // 4, 1)
+
+
+def _prompt_field(prompt: str, label: str, default: str) -> str:
+    match = re.search(rf'{label}:?\s*"([^"]*)"', prompt)
+    return match.group(1) if match and match.group(1).strip() else default
+
+
+def fake_roadmap_v2(role: str, hours_per_week: int, modules: int) -> dict:
+    """Роадмап в формате промпта v2 (все обязательные поля, суммы часов сходятся)."""
+    hours = [6 + (i * 3) % 7 for i in range(modules)]
+    total = sum(hours)
+    module_list = []
+    for i, module_hours in enumerate(hours, start=1):
+        topic = f"{role} fundamentals, part {i}"
+        module_list.append({
+            "module_id": f"M{i}",
+            "depends_on": [f"M{i - 1}"] if i > 1 else [],
+            "topic": topic,
+            "goal": f"Apply {topic.lower()} in a small working project.",
+            "estimated_hours": module_hours,
+            "resources": [
+                {"title": f"{topic}: official docs", "type": "docs", "url": f"https://docs.example.com/m{i}",
+                 "search_query": f"{topic} documentation", "level": "beginner",
+                 "why_this": "Primary reference for the module.", "time_estimate_hours": 2},
+                {"title": f"{topic}: video course", "type": "video", "url": f"https://video.example.com/m{i}",
+                 "search_query": f"{topic} course", "level": "intermediate",
+                 "why_this": "Walks through the concepts end to end.", "time_estimate_hours": 3},
+                {"title": f"{topic}: hands-on repo", "type": "repo", "url": f"https://github.com/example/m{i}",
+                 "search_query": f"{topic} example project", "level": "intermediate",
+                 "why_this": "Code to read and extend.", "time_estimate_hours": 1},
+            ],
+            "practice_task": {
+                "title": f"Mini-project {i}",
+                "description": f"Build a small service that uses {topic.lower()}.",
+                "deliverables": ["Git repository", "README with run instructions"],
+                "acceptance_criteria": ["Runs locally with one command", "Has at least 3 tests"],
+                "stretch_goals": ["Add CI"],
+            },
+            "checkpoint": {
+                "what_to_show": "A working demo and the repository.",
+                "how_to_self_check": "Explain every file to a peer in 5 minutes.",
+                "rubric": ["Correctness", "Code quality", "Explanation"],
+            },
+            "quiz": [
+                {"question": f"{topic}: question {q}?", "options": ["Option A", "Option B", "Option C", "Option D"],
+                 "correct_index": q % 4, "explanation": f"Option {'ABCD'[q % 4]} is correct; the others miss the key idea."}
+                for q in range(1, 6)
+            ],
+        })
+    return {
+        "roadmap_meta": {
+            "title": f"Path to {role}",
+            "description": f"A practical route to {role} in {modules} modules.",
+            "difficulty": "Intermediate",
+            "hours_per_week": hours_per_week,
+            "total_estimated_hours": total,
+            "total_weeks": math.ceil(total / max(hours_per_week, 1)),
+            "focus": "job-ready",
+            "constraints": ["free-only"],
+            "assumptions": ["Comfortable with basic programming"],
+            "missing_info": [],
+            "milestones": [
+                {"name": "Foundations", "modules": [m["module_id"] for m in module_list[:max(modules // 2, 1)]],
+                 "outcome": "Can build small projects", "deliverable": "Repository"},
+            ],
+            "environment": {"os": "Linux", "tools": ["IDE", "Git"], "setup_steps": ["Install Python"]},
+        },
+        "modules": module_list,
+    }
+
+
+def fake_roadmap_v1(role: str) -> dict:
+    return {
+        "title": f"Path to {role}",
+        "description": f"Five steps towards {role}.",
+        "nodes": [
+            {"title": f"Step {i}", "desc": f"Learn step {i} of {role}. It builds on the previous step.",
+             "quiz": {"text": f"Question for step {i}?", "options": ["Option A", "Option B", "Option C"], "correct": 0}}
+            for i in range(1, 6)
+        ],
+    }
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    Детерминированный провайдер для нагрузочных тестов и бенчмарков без сети.
+
+    Ответ зависит только от промпта: роадмапы v1/v2 — валидный JSON по схеме
+    промпта, сводка чата — короткий текст, остальное — ответ ментора.
+    Время ответа: задержка до первого токена (логнормальное распределение с
+    медианой latency_ms) + длина ответа / tokens_per_second. С вероятностью
+    error_rate вызов падает с "429", с вероятностью timeout_rate — зависает
+    (его обрывает таймаут LLMClient). Случайность — из Random(seed), так что
+    последовательность задержек и ошибок воспроизводима.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float, latency_sigma: float, tokens_per_second: float,
+                 error_rate: float, timeout_rate: float, seed: int, roadmap_modules: int,
+                 reply_tokens: int, timeout: float):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.roadmap_modules = roadmap_modules
+        self.reply_tokens = reply_tokens
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def respond(self, prompt: str) -> str:
+        if '"roadmap_meta"' in prompt:
+            hours = re.search(r"Available Time:\s*(\d+)", prompt)
+            role = _prompt_field(prompt, "- Role", "Developer")
+            return json.dumps(fake_roadmap_v2(role, int(hours.group(1)) if hours else 10, self.roadmap_modules))
+        if '"nodes"' in prompt:
+            return json.dumps(fake_roadmap_v1(_prompt_field(prompt, "Wants to become", "Developer")))
+        if "running summary" in prompt:
+            topic = _prompt_field(prompt, "topic", "the topic")
+            return f"The student has been studying {topic} and asked several follow-up questions."
+        topic = _prompt_field(prompt, "studying the topic", "programming")
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        sentence = f"In {topic}, start from the core idea and try it in a small example ({digest}). "
+        return (sentence * (self.reply_tokens * 4 // len(sentence) + 1))[:self.reply_tokens * 4].strip()
+
+    def _plan(self, text: str) -> tuple[float, float, Optional[str]]:
+        """(задержка до первого токена, время генерации, сбой: None / "error" / "timeout")."""
+        with self._lock:
+            self.calls += 1
+            first_token = self._random.lognormvariate(math.log(max(self.latency_ms, 0.001) / 1000), self.latency_sigma)
+            roll = self._random.random()
+        failure = "error" if roll < self.error_rate else "timeout" if roll < self.error_rate + self.timeout_rate else None
+        generation = _estimate_tokens(text) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return first_token, generation, failure
+
+    def _usage(self, prompt: str, text: str) -> LLMUsage:
+        return LLMUsage(prompt_token_count=_estimate_tokens(prompt), candidates_token_count=_estimate_tokens(text))
+
+    @staticmethod
+    def _error():
+        return RuntimeError("429 RESOURCE_EXHAUSTED (injected by FakeLLMProvider)")
+
+    async def generate(self, prompt: str, model: str) -> LLMChunk:
+        text = self.respond(prompt)
+        first_token, generation, failure = self._plan(text)
+        if failure == "timeout":
+            await asyncio.sleep(self.timeout * 2)
+        await asyncio.sleep(first_token)
+        if failure == "error":
+            raise self._error()
+        await asyncio.sleep(generation)
+        return LLMChunk(text, self._usage(prompt, text))
+
+    async def stream(self, prompt: str, model: str) -> AsyncIterator[LLMChunk]:
+        text = self.respond(prompt)
+        first_token, generation, failure = self._plan(text)
+        if failure == "timeout":
+            await asyncio.sleep(self.timeout * 2)
+        await asyncio.sleep(first_token)
+        if failure == "error":
+            raise self._error()
+        # Куски примерно по 20 токенов, как у Gemini
+        step = 80
+        pieces = [text[i:i + step] for i in range(0, len(text), step)] or [""]
+        for index, piece in enumerate(pieces):
+            if index:
+                await asyncio.sleep(generation / len(pieces))
+            last = index == len(pieces) - 1
+            yield LLMChunk(piece, self._usage(prompt, text) if last else None)
+
+    def generate_sync(self, prompt: str, model: str) -> LLMChunk:
+        text = self.respond(prompt)
+        first_token, generation, failure = self._plan(text)
+        if failure == "timeout":
+            time.sleep(self.timeout)
+            raise LLMTimeoutError(f"LLM call timed out after {self.timeout}s")
+        time.sleep(first_token)
+        if failure == "error":
+            raise self._error()
+        time.sleep(generation)
+        return LLMChunk(text, self._usage(prompt, text))
+
+
+# --- Record / replay ---
+
+class CassetteProvider(LLMProvider):
+    """
+    Запись и воспроизведение реальных ответов.
+
+    record: вызывает inner (Gemini) и сохраняет ответ в <directory>/<sha256(model, prompt)>.json
+    вместе с кусками стрима и задержками между ними.
+    replay: отдает записанное без сети; если realtime — с записанными задержками,
+    так что бенчмарк видит реалистичную латентность LLM. Нет кассеты — CassetteMissError.
+    """
+
+    def __init__(self, directory: str, mode: str, inner: Optional[LLMProvider] = None, realtime: bool = True):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("record mode needs an inner provider")
+        self.directory = directory
+        self.mode = mode
+        self.inner = inner
+        self.realtime = realtime
+        self.name = mode
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, prompt: str, model: str) -> str:
+        key = hashlib.sha256(json.dumps([model, prompt]).encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _save(self, prompt: str, model: str, chunks: list[tuple[float, str]], usage: Optional[LLMUsage]):
+        cassette = {
+            "model": model,
+            "prompt": prompt,
+            "text": "".join(text for _, text in chunks),
+            "chunks": [{"delay": round(delay, 4), "text": text} for delay, text in chunks],
+            "usage": asdict(usage) if usage else None,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        path = self._path(prompt, model)
+        # Пишем во временный файл и переименовываем: параллельный replay не прочитает половину
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def _load(self, prompt: str, model: str) -> dict:
+        path = self._path(prompt, model)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise CassetteMissError(f"No cassette for model={model} prompt sha={os.path.basename(path)}") from None
+
+    @staticmethod
+    def _cassette_usage(cassette: dict) -> Optional[LLMUsage]:
+        return LLMUsage(**cassette["usage"]) if cassette.get("usage") else None
+
+    async def generate(self, prompt: str, model: str) -> LLMChunk:
+        if self.mode == "record":
+            start = time.perf_counter()
+            result = await self.inner.generate(prompt, model)
+            self._save(prompt, model, [(time.perf_counter() - start, result.text)], result.usage)
+            return result
+        cassette = self._load(prompt, model)
+        if self.realtime:
+            await asyncio.sleep(sum(chunk["delay"] for chunk in cassette["chunks"]))
+        return LLMChunk(cassette["text"], self._cassette_usage(cassette))
+
+    async def stream(self, prompt: str, model: str) -> AsyncIterator[LLMChunk]:
+        if self.mode == "record":
+            chunks, usage = [], None
+            last = time.perf_counter()
+            inner = self.inner.stream(prompt, model)
+            try:
+                async for chunk in inner:
+                    now = time.perf_counter()
+                    chunks.append((now - last, chunk.text))
+                    last = now
+                    usage = chunk.usage or usage
+                    yield chunk
+            finally:
+                # Клиент отключился (GeneratorExit) — закрываем стрим Gemini сразу, а не в GC
+                await inner.aclose()
+            # Сохраняем только дочитанный до конца стрим
+            self._save(prompt, model, chunks, usage)
+            return
+        cassette = self._load(prompt, model)
+        chunks = cassette["chunks"]
+        for index, chunk in enumerate(chunks):
+            if self.realtime:
+                await asyncio.sleep(chunk["delay"])
+            last = index == len(chunks) - 1
+            yield LLMChunk(chunk["text"], self._cassette_usage(cassette) if last else None)
+
+    def generate_sync(self, prompt: str, model: str) -> LLMChunk:
+        if self.mode == "record":
+            start = time.perf_counter()
+            result = self.inner.generate_sync(prompt, model)
+            self._save(prompt, model, [(time.perf_counter() - start, result.text)], result.usage)
+            return result
+        cassette = self._load(prompt, model)
+        if self.realtime:
+            time.sleep(sum(chunk["delay"] for chunk in cassette["chunks"]))
+        return LLMChunk(cassette["text"], self._cassette_usage(cassette))
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+def build_provider(name: str) -> LLMProvider:
+    """LLM_PROVIDER: gemini | fake | record | replay."""
+    def gemini():
+        return GeminiProvider(
+            api_key=settings.GEMINI_API_KEY,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        )
+
+    if name == "gemini":
+        return gemini()
+    if name == "fake":
+        return FakeLLMProvider(
+            latency_ms=settings.LLM_FAKE_LATENCY_MS,
+            latency_sigma=settings.LLM_FAKE_LATENCY_SIGMA,
+            tokens_per_second=settings.LLM_FAKE_TOKENS_PER_SECOND,
+            error_rate=settings.LLM_FAKE_ERROR_RATE,
+            timeout_rate=settings.LLM_FAKE_TIMEOUT_RATE,
+            seed=settings.LLM_FAKE_SEED,
+            roadmap_modules=settings.LLM_FAKE_ROADMAP_MODULES,
+            reply_tokens=settings.LLM_FAKE_REPLY_TOKENS,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+        )
+    if name in ("record", "replay"):
+        return CassetteProvider(settings.LLM_CASSETTE_DIR, name,
+                                inner=gemini() if name == "record" else None,
+                                realtime=settings.LLM_REPLAY_REALTIME)
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
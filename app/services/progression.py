@@ -0,0 +1,249 @@
+# app/services/progression.py
+import heapq
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import registry, cache_requests_total
+from app.models.roadmap import Module, UserProgress
+
+
+def _parse_depends_on(raw) -> list[str]:
+    if not raw:
+        return []
+    if isinstance(raw, str):  # Text-колонка до миграции 0004
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+    return [dep for dep in raw if isinstance(dep, str)] if isinstance(raw, list) else []
+
+
+def topological_order(names: list[Optional[str]], depends_on: list) -> tuple[list[int], list[set[int]]]:
+    """
+    Топологическая сортировка модулей по depends_on ("M1", "M2"...).
+    Вход — позиции в порядке генерации; при равенстве сохраняется этот порядок.
+    Возвращает (порядок позиций, prerequisites по позициям).
+
+    Данные от AI: ссылки на несуществующие модули и на себя игнорируются,
+    а модули из цикла ставятся в конец, и у них остаются только зависимости
+    от модулей раньше по порядку — иначе их никогда нельзя было бы открыть.
+    """
+    positions = {name: pos for pos, name in enumerate(names) if name}
+    prerequisites = [
+        {positions[dep] for dep in _parse_depends_on(raw) if dep in positions and positions[dep] != pos}
+        for pos, raw in enumerate(depends_on)
+    ]
+
+    dependents = [[] for _ in names]
+    remaining = [len(prereqs) for prereqs in prerequisites]
+    for pos, prereqs in enumerate(prerequisites):
+        for dep in prereqs:
+            dependents[dep].append(pos)
+
+    ready = [pos for pos, count in enumerate(remaining) if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        pos = heapq.heappop(ready)
+        order.append(pos)
+        for child in dependents[pos]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                heapq.heappush(ready, child)
+
+    if len(order) < len(names):
+        placed = set(order)
+        for pos in range(len(names)):
+            if pos not in placed:
+                prerequisites[pos] &= placed
+                order.append(pos)
+                placed.add(pos)
+
+    return order, prerequisites
+
+
+@dataclass(frozen=True)
+class CareerGraph:
+    """
+    DAG модулей карьеры (по id модулей). Неизменяемый — безопасно живет в кэше.
+    """
+    order: tuple[int, ...]  # топологический порядок
+    prerequisites: dict[int, frozenset[int]]
+    dependents: dict[int, tuple[int, ...]]  # обратный индекс: кого может открыть модуль
+
+    @property
+    def roots(self) -> tuple[int, ...]:
+        return tuple(module_id for module_id in self.order if not self.prerequisites[module_id])
+
+    @classmethod
+    def from_rows(cls, rows) -> "CareerGraph":
+        """rows: (id, module_id_str, depends_on_json), уже в сохраненном порядке."""
+        ids = [row[0] for row in rows]
+        order, prerequisites = topological_order([row[1] for row in rows], [row[2] for row in rows])
+
+        dependents: dict[int, list[int]] = {module_id: [] for module_id in ids}
+        for pos in order:
+            for dep in prerequisites[pos]:
+                dependents[ids[dep]].append(ids[pos])
+
+        return cls(
+            order=tuple(ids[pos] for pos in order),
+            prerequisites={ids[pos]: frozenset(ids[dep] for dep in prerequisites[pos]) for pos in order},
+            dependents={module_id: tuple(children) for module_id, children in dependents.items()},
+        )
+
+
+def module_order_indexes(modules: list[dict]) -> list[int]:
+    """
+    order_index (с 1) для строк модулей в порядке генерации — по топологическому порядку.
+    """
+    order, _ = topological_order(
+        [m.get("module_id_str") for m in modules], [m.get("depends_on_json") for m in modules]
+    )
+    indexes = [0] * len(modules)
+    for idx, pos in enumerate(order):
+        indexes[pos] = idx + 1
+    return indexes
+
+
+class ProgressionEngine:
+    """
+    Разблокировка модулей по графу зависимостей.
+
+    Граф карьеры разбирается из depends_on_json один раз и кэшируется
+    (модули карьеры после генерации не меняются; при записи кэш сбрасывается).
+    Завершение модуля стоит два запроса: статусы prerequisites его зависимых
+    модулей и один UPDATE ... WHERE module_id IN (...) для всех, кто готов.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.graphs = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.module_careers = TTLCache(maxsize=maxsize * 32, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def graph(self, db: Session, career_id: int) -> CareerGraph:
+        graph = self.graphs.get(career_id)
+        if graph is not None:
+            self.hits += 1
+            return graph
+
+        self.misses += 1
+        rows = db.execute(
+            select(Module.id, Module.module_id_str, Module.depends_on_json)
+            .where(Module.career_id == career_id)
+            .order_by(Module.order_index, Module.id)
+        ).all()
+        graph = CareerGraph.from_rows(rows)
+        self.graphs.set(career_id, graph)
+        for module_id in graph.order:
+            self.module_careers.set(module_id, career_id)
+        return graph
+
+    def career_of(self, db: Session, module_id: int) -> Optional[int]:
+        career_id = self.module_careers.get(module_id)
+        if career_id is None:
+            career_id = db.execute(select(Module.career_id).where(Module.id == module_id)).scalar()
+        return career_id
+
+    def invalidate(self, career_id: int):
+        self.graphs.delete(career_id)
+
+    def initial_statuses(self, db: Session, career_id: int) -> dict[int, str]:
+        """Статусы при старте карьеры: модули без зависимостей открыты, остальные закрыты."""
+        graph = self.graph(db, career_id)
+        return {
+            module_id: "LOCKED" if graph.prerequisites[module_id] else "AVAILABLE"
+            for module_id in graph.order
+        }
+
+    def complete_module(self, db: Session, user_id: int, module_id: int) -> list[int]:
+        """
+        Открывает модули, у которых теперь выполнены все prerequisites.
+        Прогресс самого module_id уже должен быть COMPLETED в этой транзакции.
+        Возвращает id открытых модулей. Не коммитит.
+        """
+        career_id = self.career_of(db, module_id)
+        if career_id is None:
+            return []
+        graph = self.graph(db, career_id)
+        candidates = graph.dependents.get(module_id, ())
+        if not candidates:
+            return []
+
+        needed = set().union(*(graph.prerequisites[c] for c in candidates)) - {module_id}
+        completed = {module_id}
+        if needed:
+            completed |= set(db.execute(
+                select(UserProgress.module_id).where(
+                    UserProgress.user_id == user_id,
+                    UserProgress.module_id.in_(needed),
+                    UserProgress.status == "COMPLETED",
+                )
+            ).scalars())
+
+        ready = [c for c in candidates if graph.prerequisites[c] <= completed]
+        if ready:
+            db.execute(
+                update(UserProgress)
+                .where(
+                    UserProgress.user_id == user_id,
+                    UserProgress.module_id.in_(ready),
+                    UserProgress.status == "LOCKED",
+                )
+                .values(status="AVAILABLE")
+                .execution_options(synchronize_session=False)
+            )
+        return ready
+
+    def reorder_career(self, db: Session, career_id: int):
+        """
+        Пересчитывает order_index модулей карьеры по графу (после потоковой
+        генерации, где модули пишутся в порядке прихода). Один executemany. Не коммитит.
+        """
+        self.invalidate(career_id)
+        rows = db.execute(
+            select(Module.id, Module.order_index)
+            .where(Module.career_id == career_id)
+            .order_by(Module.order_index, Module.id)
+        ).all()
+        graph = self.graph(db, career_id)
+        stored = {row.id: row.order_index for row in rows}
+        changed = [
+            {"module_pk": module_id, "new_order_index": idx + 1}
+            for idx, module_id in enumerate(graph.order) if stored.get(module_id) != idx + 1
+        ]
+        if changed:
+            db.connection().execute(
+                update(Module.__table__)
+                .where(Module.__table__.c.id == bindparam("module_pk"))
+                .values(order_index=bindparam("new_order_index")),
+                changed,
+            )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "graphs_cached": len(self.graphs),
+        }
+
+
+progression = ProgressionEngine(
+    maxsize=settings.PROGRESSION_CACHE_MAXSIZE,
+    ttl=settings.PROGRESSION_CACHE_TTL_SECONDS,
+)
+
+
+@registry.add_collector
+def _collect_progression_stats():
+    cache_requests_total.set_total(progression.hits, cache="progression_graph", result="hit")
+    cache_requests_total.set_total(progression.misses, cache="progression_graph", result="miss")
@@ -0,0 +1,207 @@
+# app/services/roadmap_jobs.py
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.job import RoadmapJob
+from app.schemas.roadmap_v2 import RoadmapGenerateRequestV2
+from app.services.ai_roadmap_v2 import ai_service
+from app.services.roadmap_persistence import save_roadmap_v2
+
+TERMINAL_STATUSES = ("DONE", "FAILED")
+
+
+class RoadmapJobQueue:
+    """
+    Очередь фоновой генерации роадмапов.
+
+    Источник правды — таблица roadmap_jobs, in-memory очередь хранит только id.
+    Ограниченное число воркеров (ROADMAP_JOB_WORKERS) забирает задачи атомарным
+    UPDATE ... WHERE status = 'QUEUED', поэтому при нескольких процессах uvicorn
+    одну задачу не выполнят дважды. Брошенные задачи (процесс упал) подбирает
+    sweeper при старте и затем периодически. Id, уже стоящие в очереди этого
+    процесса и еще не взятые воркером, повторно не ставятся.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._pending: set[str] = set()
+
+    # --- Жизненный цикл (вызывается из lifespan в main.py) ---
+
+    async def start(self):
+        # Очередь создаем внутри работающего event loop
+        self._queue = asyncio.Queue()
+        for i in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._queue = None
+        self._pending.clear()
+
+    # --- API для эндпоинтов ---
+
+    def create_job(self, db: Session, user_id: int, request: RoadmapGenerateRequestV2) -> RoadmapJob:
+        job = RoadmapJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            status="QUEUED",
+            request_json=request.model_dump_json(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def enqueue(self, job_id: str):
+        if self._queue is None:
+            # Без lifespan (TestClient без with, скрипты) воркеров нет: задача
+            # осталась бы QUEUED навсегда
+            raise RuntimeError("RoadmapJobQueue is not started: call start() in the app lifespan first")
+        if job_id in self._pending:
+            return
+        self._pending.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    # --- Внутренности ---
+
+    async def _worker(self, worker_no: int):
+        while True:
+            job_id = await self._queue.get()
+            self._pending.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Roadmap job {job_id} crashed in worker {worker_no}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        claimed = await run_in_threadpool(self._claim, job_id)
+        if claimed is None:
+            return  # Уже взята другим воркером/процессом или завершена
+        user_id, request = claimed
+
+        try:
+            ai_data = await ai_service.agenerate_roadmap(
+                role=request.role, current_stack=request.current_stack, goal=request.goal,
+                hours=request.hours_per_week, learning_style=request.learning_style,
+                focus=request.focus, constraints=request.constraints, fallback=False
+            )
+            await run_in_threadpool(self._persist, job_id, user_id, ai_data)
+        except Exception as e:
+            await run_in_threadpool(self._finish, job_id, "FAILED", None, str(e))
+
+    def _claim(self, job_id: str) -> Optional[tuple[int, RoadmapGenerateRequestV2]]:
+        db = SessionLocal()
+        try:
+            updated = db.query(RoadmapJob).filter(
+                RoadmapJob.id == job_id, RoadmapJob.status == "QUEUED"
+            ).update(
+                {"status": "RUNNING", "attempts": RoadmapJob.attempts + 1, "updated_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+            if updated != 1:
+                return None
+            job = db.get(RoadmapJob, job_id)
+            return job.user_id, RoadmapGenerateRequestV2.model_validate_json(job.request_json)
+        finally:
+            db.close()
+
+    def _persist(self, job_id: str, user_id: int, ai_data: dict):
+        db = SessionLocal()
+        try:
+            # Роадмап и статус задачи — в одной транзакции
+            graph = save_roadmap_v2(db, user_id, ai_data, commit=False)
+            db.query(RoadmapJob).filter(RoadmapJob.id == job_id).update(
+                {"status": "DONE", "career_id": graph["career"]["id"], "updated_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _finish(self, job_id: str, status: str, career_id: Optional[int], error: Optional[str]):
+        db = SessionLocal()
+        try:
+            db.query(RoadmapJob).filter(RoadmapJob.id == job_id).update(
+                {"status": status, "career_id": career_id, "error": error, "updated_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _sweeper(self):
+        # При старте забираем все QUEUED: очередь прошлого процесса потеряна вместе с ним
+        include_recent = True
+        while True:
+            try:
+                for job_id in await run_in_threadpool(self._recover, include_recent):
+                    self.enqueue(job_id)
+                include_recent = False
+            except Exception as e:
+                print(f"Roadmap job sweeper error: {e}")
+            await asyncio.sleep(settings.ROADMAP_JOB_SWEEP_SECONDS)
+
+    def _recover(self, include_recent: bool) -> list[str]:
+        """
+        Возвращает RUNNING-задачи упавших воркеров в очередь (или FAILED, если
+        попытки кончились) и отдает id всех ожидающих QUEUED-задач.
+        Id, которые уже ждут в очереди этого процесса, enqueue пропускает;
+        дубль из другого процесса отсеет _claim.
+        """
+        db = SessionLocal()
+        try:
+            stale_before = datetime.utcnow() - timedelta(seconds=settings.ROADMAP_JOB_STALE_SECONDS)
+            stale = db.query(RoadmapJob).filter(
+                RoadmapJob.status == "RUNNING", RoadmapJob.updated_at < stale_before
+            ).all()
+            requeued = []
+            for job in stale:
+                if job.attempts >= settings.ROADMAP_JOB_MAX_ATTEMPTS:
+                    job.status = "FAILED"
+                    job.error = "Worker stopped while processing the job"
+                else:
+                    job.status = "QUEUED"
+                    requeued.append(job.id)
+                job.updated_at = datetime.utcnow()
+            db.commit()
+
+            query = db.query(RoadmapJob.id).filter(RoadmapJob.status == "QUEUED")
+            if not include_recent:
+                # Свежие QUEUED уже лежат в очереди своего процесса — их не трогаем
+                orphan_before = datetime.utcnow() - timedelta(seconds=settings.ROADMAP_JOB_SWEEP_SECONDS)
+                query = query.filter(RoadmapJob.updated_at < orphan_before)
+            rows = query.order_by(RoadmapJob.created_at).all()
+            return requeued + [row.id for row in rows if row.id not in requeued]
+        finally:
+            db.close()
+
+
+def job_to_response(job: RoadmapJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "career_id": job.career_id,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+roadmap_jobs = RoadmapJobQueue(concurrency=settings.ROADMAP_JOB_WORKERS)
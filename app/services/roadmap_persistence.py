@@ -0,0 +1,218 @@
+# app/services/roadmap_persistence.py
+from typing import Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models.roadmap import (
+    Career, Module, Milestone, Resource, PracticeTask, Checkpoint, Question
+)
+from app.services.progression import module_order_indexes, progression
+
+# Ресурс от AI может содержать лишние ключи — в БД пишем только известные колонки
+RESOURCE_FIELDS = ("title", "type", "url", "search_query", "level", "why_this", "time_estimate_hours")
+
+
+# --- Разбор ответа AI в "граф" из готовых строк для INSERT ---
+# Граф: {"career": {...}, "milestones": [{...}], "modules": [{"module": {...}, "resources": [...],
+#        "practice_task": {...} | None, "checkpoint": {...} | None, "questions": [...]}]}
+# После write_roadmap в строках появляются "id", и из графа сразу собирается ответ API.
+
+def career_row_v2(user_id: Optional[int], meta: dict) -> dict:
+    return {
+        "user_id": user_id,
+        "title": meta.get("title", "Untitled Roadmap"),
+        "description": meta.get("description", ""),
+        "difficulty": meta.get("difficulty", "Intermediate"),
+        "total_estimated_hours": meta.get("total_estimated_hours", 0),
+        "total_weeks": meta.get("total_weeks", 0),
+        "focus": meta.get("focus", "job-ready"),
+        "assumptions_json": meta.get("assumptions", []),
+    }
+
+
+def milestone_rows_v2(meta: dict) -> list[dict]:
+    return [
+        {
+            "name": ms_data.get("name"),
+            "modules_json": ms_data.get("modules", []),
+            "outcome": ms_data.get("outcome"),
+        }
+        for ms_data in meta.get("milestones", [])
+    ]
+
+
+def module_graph_v2(module_data: dict) -> dict:
+    pt_data = module_data.get("practice_task")
+    cp_data = module_data.get("checkpoint")
+    return {
+        "module": {
+            "module_id_str": module_data.get("module_id"),
+            "depends_on_json": module_data.get("depends_on", []),
+            "topic": module_data.get("topic"),
+            "goal": module_data.get("goal"),
+            "summary": module_data.get("summary"),
+            "estimated_hours": module_data.get("estimated_hours", 0),
+        },
+        "resources": [
+            {field: res_data.get(field) for field in RESOURCE_FIELDS}
+            for res_data in module_data.get("resources", [])
+        ],
+        "practice_task": {
+            "title": pt_data.get("title"),
+            "description": pt_data.get("description"),
+            "deliverables_json": pt_data.get("deliverables", []),
+            "acceptance_criteria_json": pt_data.get("acceptance_criteria", []),
+        } if pt_data else None,
+        "checkpoint": {
+            "what_to_show": cp_data.get("what_to_show"),
+            "how_to_self_check": cp_data.get("how_to_self_check"),
+            "rubric_json": cp_data.get("rubric", []),
+        } if cp_data else None,
+        "questions": [
+            {
+                "question_text": q_data.get("question"),
+                "options_json": q_data.get("options", []),
+                "correct_index": q_data.get("correct_index"),
+                "explanation": q_data.get("explanation"),
+            }
+            for q_data in module_data.get("quiz", [])
+        ],
+    }
+
+
+def roadmap_graph_v2(user_id: Optional[int], ai_data: dict) -> dict:
+    meta = ai_data.get("roadmap_meta", {})
+    return {
+        "career": career_row_v2(user_id, meta),
+        "milestones": milestone_rows_v2(meta),
+        "modules": [module_graph_v2(m) for m in ai_data.get("modules", [])],
+    }
+
+
+def roadmap_graph_v1(user_id: Optional[int], ai_data: dict) -> dict:
+    """
+    Старый формат генератора (title/description/nodes[] с quiz) -> тот же граф.
+    """
+    modules = []
+    for idx, node_data in enumerate(ai_data.get("nodes", [])):
+        quiz = node_data.get("quiz")
+        modules.append({
+            "module": {
+                "module_id_str": f"M{idx + 1}",
+                "depends_on_json": [f"M{idx}"] if idx > 0 else [],
+                "topic": node_data.get("title"),
+                "goal": node_data.get("desc"),
+                "summary": node_data.get("summary"),
+                "estimated_hours": node_data.get("estimated_hours", 0),
+            },
+            "resources": [
+                {
+                    "title": res["title"], "type": res["type"], "url": res["url"], "search_query": None,
+                    "level": res.get("level", "beginner"), "why_this": res.get("why_this", ""),
+                    "time_estimate_hours": res.get("time_estimate_hours", 0),
+                }
+                for res in node_data.get("resources", [])
+            ],
+            "practice_task": None,
+            "checkpoint": None,
+            "questions": [
+                {
+                    "question_text": q["text"], "options_json": q["options"],
+                    "correct_index": q["correct"], "explanation": q.get("explanation", ""),
+                }
+                for q in (quiz if isinstance(quiz, list) else [])
+            ],
+        })
+    return {
+        "career": {"user_id": user_id, "title": ai_data["title"], "description": ai_data["description"]},
+        "milestones": [],
+        "modules": modules,
+    }
+
+
+# --- Запись ---
+
+def _insert_many(db: Session, model, rows: list[dict]):
+    # executemany одним вызовом; id дочерних строк ответу не нужны, RETURNING не просим
+    if rows:
+        db.execute(insert(model), rows)
+
+
+def write_modules(db: Session, career_id: int, modules: list[dict], start_index: Optional[int] = None):
+    """
+    Пишет модули и всё их содержимое: один INSERT ... RETURNING для модулей
+    (id нужны для связей и ответа), затем по одному executemany на таблицу.
+    order_index — топологический порядок по depends_on; при потоковой записи
+    (start_index = сколько модулей уже записано) — порядок прихода, а итоговый
+    порядок пересчитывает progression.reorder_career. Не коммитит.
+    """
+    if not modules:
+        return
+
+    if start_index is None:
+        order_indexes = module_order_indexes([m["module"] for m in modules])
+    else:
+        order_indexes = range(start_index + 1, start_index + len(modules) + 1)
+    for module, order_index in zip(modules, order_indexes):
+        module["module"]["order_index"] = order_index
+
+    module_rows = [{**m["module"], "career_id": career_id} for m in modules]
+    module_ids = db.execute(
+        insert(Module).returning(Module.id, sort_by_parameter_order=True), module_rows
+    ).scalars().all()
+
+    resources, practice_tasks, checkpoints, questions = [], [], [], []
+    for module, module_id in zip(modules, module_ids):
+        module["module"]["id"] = module_id
+        resources += [{**r, "module_id": module_id} for r in module["resources"]]
+        questions += [{**q, "module_id": module_id} for q in module["questions"]]
+        if module["practice_task"]:
+            practice_tasks.append({**module["practice_task"], "module_id": module_id})
+        if module["checkpoint"]:
+            checkpoints.append({**module["checkpoint"], "module_id": module_id})
+
+    _insert_many(db, Resource, resources)
+    _insert_many(db, PracticeTask, practice_tasks)
+    _insert_many(db, Checkpoint, checkpoints)
+    _insert_many(db, Question, questions)
+    # Новая версия контента: снимки и ETag старой версии больше не подходят
+    db.execute(update(Career).where(Career.id == career_id).values(content_version=Career.content_version + 1))
+    progression.invalidate(career_id)
+
+
+def write_roadmap_meta(db: Session, career_id: Optional[int], career_row: dict, milestones: list[dict]) -> int:
+    """
+    Создает Career (или обновляет уже созданный) и добавляет milestones. Не коммитит.
+    """
+    if career_id is None:
+        career_id = db.execute(insert(Career).values(**career_row).returning(Career.id)).scalar_one()
+    else:
+        values = {k: v for k, v in career_row.items() if k != "user_id"}
+        values["content_version"] = Career.content_version + 1
+        db.execute(update(Career).where(Career.id == career_id).values(**values))
+    career_row["id"] = career_id
+
+    _insert_many(db, Milestone, [{**ms, "career_id": career_id} for ms in milestones])
+    return career_id
+
+
+def write_roadmap(db: Session, graph: dict, commit: bool = True) -> dict:
+    """
+    Сохраняет весь роадмап одной транзакцией: по одному INSERT на таблицу вместо
+    commit + refresh на каждый модуль. Возвращает тот же граф с проставленными id —
+    ответ собирается из памяти, без повторного чтения из БД.
+    """
+    career_id = write_roadmap_meta(db, None, graph["career"], graph["milestones"])
+    write_modules(db, career_id, graph["modules"])
+    if commit:
+        db.commit()
+    return graph
+
+
+def save_roadmap_v2(db: Session, user_id: int, ai_data: dict, commit: bool = True) -> dict:
+    """
+    Сохраняет ответ v2-генератора как личный роадмап пользователя.
+    Используется и синхронным эндпоинтом, и фоновыми задачами генерации.
+    """
+    return write_roadmap(db, roadmap_graph_v2(user_id, ai_data), commit=commit)
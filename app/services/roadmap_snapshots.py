@@ -0,0 +1,128 @@
+# app/services/roadmap_snapshots.py
+import gzip
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import registry, cache_requests_total
+
+# Заглушка статуса в сериализованном снимке: по ней JSON режется на куски,
+# между которыми потом вставляются статусы конкретного пользователя
+STATUS_PLACEHOLDER = "\x00status\x00"
+_PLACEHOLDER_JSON = json.dumps(STATUS_PLACEHOLDER).encode()
+
+_STATUS_JSON: dict[str, bytes] = {}
+
+
+def _status_json(status: str) -> bytes:
+    encoded = _STATUS_JSON.get(status)
+    if encoded is None:
+        encoded = _STATUS_JSON[status] = json.dumps(status).encode()
+    return encoded
+
+
+@dataclass(frozen=True)
+class RoadmapSnapshot:
+    """
+    Готовый JSON роадмапа (CareerResponse) без статусов: parts[i] — байты
+    между статусами узлов, module_ids — узлы в том же порядке.
+    """
+    career_id: int
+    version: int
+    module_ids: tuple[int, ...]
+    parts: tuple[bytes, ...]
+
+    @classmethod
+    def from_body(cls, career_id: int, version: int, module_ids: list[int], body: bytes) -> "RoadmapSnapshot":
+        parts = body.split(_PLACEHOLDER_JSON)
+        if len(parts) != len(module_ids) + 1:
+            raise ValueError("Status placeholder count does not match roadmap nodes")
+        return cls(career_id, version, tuple(module_ids), tuple(parts))
+
+    def render(self, progress_map: dict[int, str]) -> bytes:
+        chunks = [self.parts[0]]
+        for module_id, part in zip(self.module_ids, self.parts[1:]):
+            chunks.append(_status_json(progress_map.get(module_id, "LOCKED")))
+            chunks.append(part)
+        return b"".join(chunks)
+
+
+def roadmap_etag(career_id: int, version: int, progress_map: dict[int, str]) -> str:
+    """
+    Сильный ETag: версия контента карьеры + статусы пользователя.
+    Считается до загрузки контента — на 304 снимок вообще не нужен.
+    """
+    statuses = ",".join(f"{module_id}:{status}" for module_id, status in sorted(progress_map.items()))
+    digest = hashlib.blake2b(statuses.encode(), digest_size=8).hexdigest()
+    return f'"r{career_id}.v{version}.{digest}"'
+
+
+def gzip_etag(etag: str) -> str:
+    # Сжатое представление — другие байты, значит и другой сильный ETag
+    return etag[:-1] + '-gzip"'
+
+
+class RoadmapSnapshotCache:
+    """
+    Снимки контента по (career_id, content_version) и gzip-тела по ETag.
+    Контент после генерации не меняется, а любая запись модулей поднимает
+    content_version — старые снимки просто перестают запрашиваться.
+    Сжатое тело зависит только от ETag, поэтому общее для всех пользователей
+    с одинаковыми статусами (например, еще не начавших карьеру).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, gzip_min_bytes: int):
+        self.snapshots = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.compressed = TTLCache(maxsize=maxsize * 4, ttl=ttl)
+        self.gzip_min_bytes = gzip_min_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, career_id: int, version: int,
+            build: Callable[[], Optional[RoadmapSnapshot]]) -> Optional[RoadmapSnapshot]:
+        snapshot = self.snapshots.get((career_id, version))
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        self.misses += 1
+        snapshot = build()
+        if snapshot is not None:
+            self.snapshots.set((snapshot.career_id, snapshot.version), snapshot)
+        return snapshot
+
+    def compress(self, etag: str, body: bytes) -> Optional[bytes]:
+        """gzip-тело для ETag или None, если ответ слишком мал для сжатия."""
+        if len(body) < self.gzip_min_bytes:
+            return None
+        compressed = self.compressed.get(etag)
+        if compressed is None:
+            compressed = gzip.compress(body, compresslevel=6)
+            self.compressed.set(etag, compressed)
+        return compressed
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "snapshots_cached": len(self.snapshots),
+            "compressed_cached": len(self.compressed),
+        }
+
+
+roadmap_snapshots = RoadmapSnapshotCache(
+    maxsize=settings.ROADMAP_SNAPSHOT_CACHE_MAXSIZE,
+    ttl=settings.ROADMAP_SNAPSHOT_TTL_SECONDS,
+    gzip_min_bytes=settings.ROADMAP_SNAPSHOT_GZIP_MIN_BYTES,
+)
+
+
+@registry.add_collector
+def _collect_snapshot_stats():
+    cache_requests_total.set_total(roadmap_snapshots.hits, cache="roadmap_snapshot", result="hit")
+    cache_requests_total.set_total(roadmap_snapshots.misses, cache="roadmap_snapshot", result="miss")
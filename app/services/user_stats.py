@@ -0,0 +1,135 @@
+# app/services/user_stats.py
+from datetime import datetime
+from typing import Optional, Union
+
+from sqlalchemy import Connection, case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.roadmap import UserProgress
+from app.models.stats import UserStats
+from app.models.user import User
+
+# Геймификация: 1 модуль = 100 XP, каждые 500 XP новый уровень (1 -> 5 модулей)
+XP_PER_MODULE = 100
+XP_PER_LEVEL = 500
+
+# (имя, иконка, описание, условие по (completed_modules, level))
+BADGES = [
+    ("Explorer", "hiking", "Started the journey", lambda completed, level: True),  # за регистрацию
+    ("First Step", "flag", "Completed first module", lambda completed, level: completed >= 1),
+    ("High Five", "sentiment_satisfied_alt", "Completed 5 modules", lambda completed, level: completed >= 5),
+    ("Dedicated", "local_fire_department", "Completed 10 modules", lambda completed, level: completed >= 10),
+    ("Pro", "school", "Reached Level 5", lambda completed, level: level >= 5),
+]
+_BADGES_BY_NAME = {name: (name, icon, description) for name, icon, description, _ in BADGES}
+
+
+def level_for_xp(xp: int) -> int:
+    return 1 + xp // XP_PER_LEVEL
+
+
+def unlocked_badges(completed: int, level: int) -> list[str]:
+    return [name for name, _, _, rule in BADGES if rule(completed, level)]
+
+
+def build_stats_row(user_id: int, completed: int, started: int) -> dict:
+    xp = completed * XP_PER_MODULE
+    level = level_for_xp(xp)
+    return {
+        "user_id": user_id,
+        "xp": xp,
+        "level": level,
+        "completed_modules": completed,
+        "modules_started": started,
+        "badges_json": unlocked_badges(completed, level),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def badges_for_response(badges: list[str]) -> list[dict]:
+    return [
+        {"name": name, "icon": icon, "description": description}
+        for name, icon, description in (_BADGES_BY_NAME[b] for b in badges or [] if b in _BADGES_BY_NAME)
+    ]
+
+
+def create_user_stats(db: Session, user_id: int):
+    """Пустая статистика нового пользователя. Не коммитит."""
+    db.execute(insert(UserStats).values(**build_stats_row(user_id, 0, 0)))
+
+
+def record_progress(db: Session, user_id: int, completed_delta: int = 0, started_delta: int = 0):
+    """
+    Инкрементально обновляет статистику в текущей транзакции (коммитит вызывающий).
+    Счетчики и производные xp/level меняются одним атомарным UPDATE — параллельные
+    запросы не теряют инкременты. Бейджи пересчитываются, только если набор изменился.
+    """
+    completed = UserStats.completed_modules + completed_delta
+    row = db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(
+            completed_modules=completed,
+            modules_started=UserStats.modules_started + started_delta,
+            xp=completed * XP_PER_MODULE,
+            level=1 + completed * XP_PER_MODULE // XP_PER_LEVEL,
+            updated_at=datetime.utcnow(),
+        )
+        .returning(UserStats.completed_modules, UserStats.level, UserStats.badges_json)
+    ).first()
+
+    if row is None:
+        # Пользователь из времени до user_stats и без бэкфилла — собираем из прогресса
+        db.flush()
+        rebuild_user_stats(db, user_ids=[user_id])
+        return
+
+    badges = unlocked_badges(row.completed_modules, row.level)
+    if badges != row.badges_json:
+        db.execute(update(UserStats).where(UserStats.user_id == user_id).values(badges_json=badges))
+
+
+def _aggregate_progress(conn: Union[Session, Connection], user_ids: Optional[list[int]]):
+    # Один GROUP BY по user_progress (индекс user_id+module_id); пользователи без прогресса — нули
+    completed = func.coalesce(func.sum(case((UserProgress.status == "COMPLETED", 1), else_=0)), 0)
+    query = (
+        select(User.id, completed.label("completed"), func.count(UserProgress.id).label("started"))
+        .outerjoin(UserProgress, UserProgress.user_id == User.id)
+        .group_by(User.id)
+    )
+    if user_ids is not None:
+        query = query.where(User.id.in_(user_ids))
+    return conn.execute(query).all()
+
+
+def rebuild_user_stats(conn: Union[Session, Connection], user_ids: Optional[list[int]] = None,
+                       dry_run: bool = False, chunk_size: int = 5000) -> dict:
+    """
+    Пересобирает user_stats из user_progress пачками (бэкфилл и сверка).
+    Возвращает сколько строк проверено и сколько расходилось с сохраненными.
+    Не коммитит.
+    """
+    rows = [build_stats_row(r.id, int(r.completed), int(r.started)) for r in _aggregate_progress(conn, user_ids)]
+
+    stored_query = select(
+        UserStats.user_id, UserStats.xp, UserStats.level, UserStats.completed_modules,
+        UserStats.modules_started, UserStats.badges_json,
+    )
+    if user_ids is not None:
+        stored_query = stored_query.where(UserStats.user_id.in_(user_ids))
+    stored = {r.user_id: tuple(r[1:]) for r in conn.execute(stored_query)}
+
+    drifted = [
+        row for row in rows
+        if stored.get(row["user_id"]) != (
+            row["xp"], row["level"], row["completed_modules"], row["modules_started"], row["badges_json"]
+        )
+    ]
+
+    if not dry_run:
+        for i in range(0, len(drifted), chunk_size):
+            chunk = drifted[i:i + chunk_size]
+            conn.execute(delete(UserStats).where(UserStats.user_id.in_([r["user_id"] for r in chunk])))
+            conn.execute(insert(UserStats), chunk)
+
+    return {"checked": len(rows), "drifted": len(drifted), "fixed": 0 if dry_run else len(drifted)}
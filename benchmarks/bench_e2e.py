@@ -0,0 +1,393 @@
+# benchmarks/bench_e2e.py
+"""
+Сквозной бенчмарк API на синтетических данных.
+
+    python -m benchmarks.bench_e2e [--scale 1.0] [--concurrency 32] [--requests 500]
+                                   [--output result.json] [--baseline baseline.json]
+
+1. Создает SQLite-базу миграциями и наполняет ее bulk INSERT'ами
+   (при --scale 1: 100k пользователей, 50k карьер по 8 модулей, 1M строк
+   user_progress, 5M сообщений чата). --db PATH сохраняет базу между запусками:
+   если в ней уже есть пользователи, наполнение пропускается.
+2. Поднимает настоящий uvicorn с LLM_PROVIDER=fake (латентность LLM задается
+   --llm-latency-ms / --llm-tokens-per-second) и SQL-профилированием.
+3. По очереди гоняет сценарии (login, me, roadmaps_list, roadmap_detail,
+   quiz_submit, chat_ask, roadmap_generate) с --concurrency параллельными
+   клиентами и печатает JSON: запросы в секунду, p50/p95/p99, ошибки и число
+   SQL-запросов на HTTP-запрос (заголовок X-DB-Statements).
+
+--baseline сравнивает с сохраненным результатом (--output прошлого запуска):
+регрессия — p95 или throughput хуже больше чем на --tolerance, либо SQL-запросов
+на запрос стало больше. Есть регрессии — код выхода 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_USERS = 100_000
+BASE_CAREERS = 50_000
+BASE_PROGRESS_ROWS = 1_000_000
+BASE_CHAT_MESSAGES = 5_000_000
+MODULES_PER_CAREER = 8
+RESOURCES_PER_MODULE = 2
+QUESTIONS_PER_MODULE = 3
+CHAT_TOPICS = ("Python", "SQL", "Docker", "Git", "Algorithms")
+PASSWORD = "bench-password"
+
+SCENARIOS = ("login", "me", "roadmaps_list", "roadmap_detail", "quiz_submit", "chat_ask", "roadmap_generate")
+# Генерация роадмапа с LLM на порядки медленнее остального — по умолчанию меньше запросов
+SLOW_SCENARIOS = {"login": 0.2, "roadmap_generate": 0.1}
+
+
+def _environment(args, db_path: str, tmp: str) -> dict:
+    return {
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "ROADMAP_CACHE_PATH": os.path.join(tmp, "roadmap_cache.db"),
+        "SECRET_KEY": "bench-secret",
+        "LLM_PROVIDER": "fake",
+        "LLM_FAKE_LATENCY_MS": str(args.llm_latency_ms),
+        "LLM_FAKE_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "LLM_FAKE_REPLY_TOKENS": "120",
+        "SQL_PROFILING": "true",
+        "SQL_PROFILING_DEBUG": "true",  # X-DB-Statements в каждом ответе
+        "RATE_LIMITS": json.dumps({scope: "1000000/second" for scope in
+                                   ("default", "chat", "roadmap_generate", "login")}),
+    }
+
+
+# --- Данные ---
+
+def _insert(conn, sql: str, rows, chunk: int = 50_000) -> int:
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            conn.exec_driver_sql(sql, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        conn.exec_driver_sql(sql, batch)
+        total += len(batch)
+    return total
+
+
+def _sqlite_value(value):
+    if isinstance(value, list):  # JSON-колонки
+        return json.dumps(value)
+    return value.isoformat(" ") if hasattr(value, "isoformat") else value
+
+
+def _started_career(user_id: int, round_no: int, catalog_careers: int) -> int:
+    # Только каталоговые (нечетные id) карьеры: они видны всем, у каждого пользователя — разные
+    return 2 * ((round_no * 3 + user_id * 7) % catalog_careers) + 1
+
+
+def seed(scale: float) -> dict:
+    from app.db.session import engine
+    from app.core.security import get_password_hash
+    from app.services.user_stats import build_stats_row
+
+    users = max(int(BASE_USERS * scale), 10)
+    careers = max(int(BASE_CAREERS * scale), 10)
+    catalog = careers // 2
+    starts = max(int(BASE_PROGRESS_ROWS * scale) // MODULES_PER_CAREER, users)
+    chat_per_user = max(int(BASE_CHAT_MESSAGES * scale) // users, 2)
+    modules = careers * MODULES_PER_CAREER
+    # bcrypt один раз: у всех пользователей одинаковый пароль
+    hashed = get_password_hash(PASSWORD)
+    depends = ["[]"] + [json.dumps([f"M{i}"]) for i in range(1, MODULES_PER_CAREER)]
+
+    started_by_user: dict[int, int] = {}
+    counts = {}
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        counts["users"] = _insert(conn, "INSERT INTO users (id, email, username, hashed_password) VALUES (?, ?, ?, ?)",
+                                  ((u, f"user{u}@bench.example.com", f"user{u}", hashed) for u in range(1, users + 1)))
+        counts["careers"] = _insert(conn, "INSERT INTO careers (id, user_id, title, description, difficulty, "
+                                          "total_estimated_hours, total_weeks, focus, assumptions_json) "
+                                          "VALUES (?, ?, ?, 'Synthetic career', 'Intermediate', 80, 8, 'job-ready', '[]')",
+                                    ((c, None if c % 2 else c // 2 % users + 1, f"Career {c}")
+                                     for c in range(1, careers + 1)))
+        counts["modules"] = _insert(conn, "INSERT INTO modules (id, career_id, module_id_str, depends_on_json, "
+                                          "order_index, topic, goal, estimated_hours) VALUES (?, ?, ?, ?, ?, ?, 'g', 10)",
+                                    ((m, (m - 1) // MODULES_PER_CAREER + 1, f"M{(m - 1) % MODULES_PER_CAREER + 1}",
+                                      depends[(m - 1) % MODULES_PER_CAREER], (m - 1) % MODULES_PER_CAREER + 1, f"Topic {m}")
+                                     for m in range(1, modules + 1)))
+        counts["resources"] = _insert(conn, "INSERT INTO resources (module_id, title, type, url, level, time_estimate_hours) "
+                                            "VALUES (?, 'Resource', 'docs', 'https://example.com', 'beginner', 2)",
+                                      ((m,) for m in range(1, modules + 1) for _ in range(RESOURCES_PER_MODULE)))
+        counts["questions"] = _insert(conn, "INSERT INTO questions (module_id, question_text, options_json, correct_index, "
+                                            "explanation) VALUES (?, 'Question?', '[\"A\", \"B\", \"C\", \"D\"]', 0, 'e')",
+                                      ((m,) for m in range(1, modules + 1) for _ in range(QUESTIONS_PER_MODULE)))
+
+        def progress():
+            for start in range(starts):
+                user_id, round_no = start % users + 1, start // users
+                started_by_user[user_id] = started_by_user.get(user_id, 0) + 1
+                first = (_started_career(user_id, round_no, catalog) - 1) * MODULES_PER_CAREER + 1
+                for m in range(first, first + MODULES_PER_CAREER):
+                    yield user_id, m, "AVAILABLE" if m == first else "LOCKED"
+
+        counts["user_progress"] = _insert(conn, "INSERT INTO user_progress (user_id, module_id, status) VALUES (?, ?, ?)",
+                                          progress())
+        counts["user_stats"] = _insert(conn, "INSERT INTO user_stats (user_id, xp, level, completed_modules, "
+                                             "modules_started, badges_json, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       (tuple(map(_sqlite_value, build_stats_row(
+                                           u, 0, started_by_user.get(u, 0) * MODULES_PER_CAREER).values()))
+                                        for u in range(1, users + 1)))
+
+        def chat():
+            for u in range(1, users + 1):
+                for i in range(chat_per_user):
+                    role = "user" if i % 2 == 0 else "ai"
+                    yield (u, role, f"{role} message {i} about {CHAT_TOPICS[u % len(CHAT_TOPICS)]}",
+                           CHAT_TOPICS[u % len(CHAT_TOPICS)], f"2026-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}")
+
+        counts["chat_messages"] = _insert(conn, "INSERT INTO chat_messages (user_id, role, content, context_topic, "
+                                                "created_at) VALUES (?, ?, ?, ?, ?)", chat())
+        conn.exec_driver_sql("ANALYZE")
+    return counts
+
+
+def dataset_info() -> dict:
+    from app.db.session import engine
+
+    with engine.connect() as conn:
+        return {table: conn.exec_driver_sql(f"SELECT max(rowid) FROM {table}").scalar() or 0
+                for table in ("users", "careers", "modules", "user_progress", "chat_messages")}
+
+
+# --- Нагрузка ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env={**os.environ, **env},
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start in 120s")
+
+
+class Workload:
+    """Запросы сценариев для случайных пользователей, у которых есть начатая карьера."""
+
+    def __init__(self, users: int, careers: int, seed: int):
+        from app.core.security import create_access_token
+
+        self.users = users
+        self.catalog = careers // 2
+        self.random = random.Random(seed)
+        self._tokens: dict[int, str] = {}
+        self._create_token = create_access_token
+
+    def _user(self) -> tuple[int, dict]:
+        user_id = self.random.randint(1, self.users)
+        if user_id not in self._tokens:
+            self._tokens[user_id] = self._create_token(subject=f"user{user_id}@bench.example.com")
+        return user_id, {"Authorization": f"Bearer {self._tokens[user_id]}"}
+
+    def request(self, scenario: str, i: int) -> dict:
+        user_id, headers = self._user()
+        career_id = _started_career(user_id, 0, self.catalog)
+        first_module = (career_id - 1) * MODULES_PER_CAREER + 1
+        if scenario == "login":
+            return {"method": "POST", "url": "/api/v1/auth/login",
+                    "data": {"username": f"user{user_id}@bench.example.com", "password": PASSWORD}}
+        if scenario == "me":
+            return {"method": "GET", "url": "/api/v1/auth/me", "headers": headers}
+        if scenario == "roadmaps_list":
+            return {"method": "GET", "url": "/api/v1/roadmaps/", "headers": headers}
+        if scenario == "roadmap_detail":
+            return {"method": "GET", "url": f"/api/v1/roadmaps/{career_id}", "headers": headers}
+        if scenario == "quiz_submit":
+            # id вопросов модуля идут подряд (см. seed), правильный ответ всегда 0
+            first_question = (first_module - 1) * QUESTIONS_PER_MODULE + 1
+            answers = [{"question_id": q, "selected_option_index": 0}
+                       for q in range(first_question, first_question + QUESTIONS_PER_MODULE)]
+            return {"method": "POST", "url": f"/api/v1/quiz/node/{first_module}/submit", "headers": headers,
+                    "json": answers}
+        if scenario == "chat_ask":
+            return {"method": "POST", "url": "/api/v1/chat/ask", "headers": headers,
+                    "json": {"message": f"How do I use feature {i} here?",
+                             "context_topic": CHAT_TOPICS[user_id % len(CHAT_TOPICS)]}}
+        if scenario == "roadmap_generate":
+            # Разные анкеты: кэш роадмапов не должен подменять вызов LLM
+            return {"method": "POST", "url": "/api/v2/roadmaps/generate", "headers": headers,
+                    "json": {"role": f"Backend Developer {i}", "goal": "job", "hours_per_week": 10}}
+        raise ValueError(scenario)
+
+
+async def run_scenario(base_url: str, workload: Workload, scenario: str, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    latencies, statements, statuses = [], [], {}
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(workload.request(scenario, i))
+
+    async def client_loop(client: httpx.AsyncClient):
+        while True:
+            try:
+                spec = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.request(**spec)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if "x-db-statements" in response.headers:
+                statements.append(int(response.headers["x-db-statements"]))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    ok = sum(count for status, count in statuses.items() if status.isdigit() and int(status) < 400)
+    pct = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0] if latencies else 0.0] * 99
+    return {
+        "requests": requests,
+        "ok": ok,
+        "errors": requests - ok,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(pct[49] * 1000, 2),
+        "p95_ms": round(pct[94] * 1000, 2),
+        "p99_ms": round(pct[98] * 1000, 2),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 2),
+        "queries_avg": round(statistics.fmean(statements), 2) if statements else None,
+        "queries_max": max(statements, default=None),
+    }
+
+
+# --- Сравнение с базовой линией ---
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[dict]:
+    regressions = []
+    for scenario, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(scenario)
+        if not base:
+            continue
+        checks = [
+            ("p95_ms", result["p95_ms"] > base["p95_ms"] * (1 + tolerance)),
+            ("throughput_rps", result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance)),
+            # Число запросов детерминировано — любой рост это регрессия
+            ("queries_avg", result["queries_avg"] is not None and base.get("queries_avg") is not None
+             and result["queries_avg"] > base["queries_avg"] + 0.5),
+            ("errors", result["errors"] > base["errors"]),
+        ]
+        for metric, failed in checks:
+            if failed:
+                regressions.append({"scenario": scenario, "metric": metric,
+                                    "baseline": base.get(metric), "current": result[metric]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset size relative to 100k users / 5M messages")
+    parser.add_argument("--db", help="SQLite file to create or reuse (default: temporary)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario (fewer for login/generate)")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here (use it later as --baseline)")
+    parser.add_argument("--baseline", help="previous --output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    tmp = tempfile.mkdtemp(prefix="smartpath-e2e-")
+    db_path = os.path.abspath(args.db or os.path.join(tmp, "bench.db"))
+    env = _environment(args, db_path, tmp)
+    # Настройки приложения читаются при импорте — окружение выставляем до него
+    os.environ.update(env)
+    from app.db.migrations import upgrade_db
+
+    upgrade_db()
+    data = dataset_info()
+    if data["users"]:
+        print(f"Reusing dataset in {db_path}", file=sys.stderr)
+        seed_seconds = None
+    else:
+        start = time.perf_counter()
+        seed(args.scale)
+        seed_seconds = round(time.perf_counter() - start, 1)
+        data = dataset_info()
+
+    port = _free_port()
+    server = start_server(env, port)
+    try:
+        workload = Workload(data["users"], data["careers"], args.seed)
+        results = {}
+        for scenario in scenarios:
+            requests = max(int(args.requests * SLOW_SCENARIOS.get(scenario, 1.0)), 1)
+            print(f"{scenario}: {requests} requests, concurrency {args.concurrency}", file=sys.stderr)
+            results[scenario] = asyncio.run(
+                run_scenario(f"http://127.0.0.1:{port}", workload, scenario, requests, args.concurrency)
+            )
+    finally:
+        server.terminate()
+        server.wait(30)
+
+    report = {
+        "config": {"scale": args.scale, "concurrency": args.concurrency, "requests": args.requests,
+                   "llm_latency_ms": args.llm_latency_ms, "llm_tokens_per_second": args.llm_tokens_per_second},
+        "dataset": {**data, "seed_seconds": seed_seconds},
+        "scenarios": results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/bench_query_plans.py
+"""
+Планы и латентность горячих запросов на большом объеме прогресса.
+
+    python -m benchmarks.bench_query_plans [--progress-rows 1000000] [--compare]
+
+Создает БД миграциями Alembic, наполняет ее (по умолчанию 1M строк user_progress,
+10k модулей, вопросы, ресурсы, история чата) и для каждого горячего запроса
+печатает EXPLAIN QUERY PLAN и среднее время. Если какой-то запрос сканирует
+таблицу без индекса — код выхода 1.
+
+--compare дополнительно удаляет индексы из миграции 0001 и повторяет замеры,
+чтобы было видно, что именно они дают.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="smartpath-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("GEMINI_API_KEY", "bench-offline")
+
+from app.db.migrations import upgrade_db  # noqa: E402
+from app.db.session import engine  # noqa: E402
+
+MODULES_PER_CAREER = 20
+CAREERS_PER_USER = 5
+CHAT_MESSAGES_PER_USER = 20
+
+# Запросы в том виде, в каком их строят эндпоинты (параметры — типичные значения)
+QUERIES = {
+    "progress_map_for_list": (
+        "SELECT user_progress.module_id, user_progress.status FROM user_progress "
+        "JOIN modules ON modules.id = user_progress.module_id "
+        "WHERE user_progress.user_id = :user_id AND modules.career_id IN "
+        "(SELECT careers.id FROM careers WHERE careers.user_id IS NULL OR careers.user_id = :user_id)"
+    ),
+    "progress_for_module": (
+        "SELECT * FROM user_progress WHERE user_progress.user_id = :user_id "
+        "AND user_progress.module_id = :module_id LIMIT 1"
+    ),
+    "modules_of_career": "SELECT * FROM modules WHERE modules.career_id = :career_id",
+    "questions_of_module": "SELECT * FROM questions WHERE questions.module_id = :module_id",
+    "resources_of_career": (
+        "SELECT resources.* FROM resources WHERE resources.module_id IN "
+        "(SELECT modules.id FROM modules WHERE modules.career_id = :career_id)"
+    ),
+    "visible_careers": "SELECT * FROM careers WHERE careers.user_id IS NULL OR careers.user_id = :user_id",
+    "recent_chat": (
+        "SELECT * FROM chat_messages WHERE chat_messages.user_id = :user_id "
+        "ORDER BY chat_messages.created_at DESC LIMIT 20"
+    ),
+}
+
+# Индексы, добавленные миграцией 0001 (для --compare)
+NEW_INDEXES = {
+    "ix_careers_user_id": "careers (user_id)",
+    "ix_modules_career_id": "modules (career_id)",
+    "ix_questions_module_id": "questions (module_id)",
+    "ix_resources_module_id": "resources (module_id)",
+    "ix_chat_messages_user_created": "chat_messages (user_id, created_at)",
+    "ux_user_progress_user_module": "user_progress (user_id, module_id)",
+}
+
+
+def _insert(conn, sql: str, rows, chunk: int = 50_000):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk:
+            conn.exec_driver_sql(sql, batch)
+            batch = []
+    if batch:
+        conn.exec_driver_sql(sql, batch)
+
+
+def seed(progress_rows: int) -> dict:
+    users = max(progress_rows // (CAREERS_PER_USER * MODULES_PER_CAREER), 1)
+    careers = max(users // 20, CAREERS_PER_USER * 2)
+    modules = careers * MODULES_PER_CAREER
+    rnd = random.Random(42)
+
+    with engine.begin() as conn:
+        _insert(conn, "INSERT INTO users (id, email, hashed_password) VALUES (?, ?, 'x')",
+                ((u, f"user{u}@bench.local") for u in range(1, users + 1)))
+        # Половина карьер — общие каталоговые, половина — личные сгенерированные
+        _insert(conn, "INSERT INTO careers (id, user_id, title) VALUES (?, ?, ?)",
+                ((c, None if c % 2 else rnd.randint(1, users), f"Career {c}") for c in range(1, careers + 1)))
+        _insert(conn, "INSERT INTO modules (id, career_id, module_id_str, topic) VALUES (?, ?, ?, 't')",
+                ((m, (m - 1) // MODULES_PER_CAREER + 1, f"M{(m - 1) % MODULES_PER_CAREER + 1}")
+                 for m in range(1, modules + 1)))
+        _insert(conn, "INSERT INTO questions (module_id, question_text, options_json, correct_index) "
+                      "VALUES (?, 'q', '[]', 0)",
+                ((m,) for m in range(1, modules + 1) for _ in range(3)))
+        _insert(conn, "INSERT INTO resources (module_id, title, type, url) VALUES (?, 'r', 'docs', 'https://x')",
+                ((m,) for m in range(1, modules + 1) for _ in range(3)))
+
+        def progress():
+            for u in range(1, users + 1):
+                for c in rnd.sample(range(1, careers + 1), CAREERS_PER_USER):
+                    first = (c - 1) * MODULES_PER_CAREER + 1
+                    for m in range(first, first + MODULES_PER_CAREER):
+                        yield u, m, "AVAILABLE" if m == first else "LOCKED"
+
+        _insert(conn, "INSERT INTO user_progress (user_id, module_id, status) VALUES (?, ?, ?)", progress())
+        _insert(conn, "INSERT INTO chat_messages (user_id, role, content, created_at) "
+                      "VALUES (?, 'user', 'hi', datetime('2026-01-01', '+' || ? || ' minutes'))",
+                ((u, i) for u in range(1, users + 1) for i in range(CHAT_MESSAGES_PER_USER)))
+        conn.exec_driver_sql("ANALYZE")
+
+    return {"users": users, "careers": careers, "modules": modules,
+            "progress_rows": users * CAREERS_PER_USER * MODULES_PER_CAREER}
+
+
+def _params(sizes: dict) -> dict:
+    user_id = sizes["users"] // 2
+    with engine.connect() as conn:
+        module_id = conn.exec_driver_sql(
+            "SELECT module_id FROM user_progress WHERE user_id = ? LIMIT 1", (user_id,)
+        ).scalar()
+    return {"user_id": user_id, "module_id": module_id, "career_id": (module_id - 1) // MODULES_PER_CAREER + 1}
+
+
+def measure(params: dict, repeat: int) -> dict:
+    from sqlalchemy import text
+
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params)]
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params).fetchall()
+            avg_ms = (time.perf_counter() - start) * 1000 / repeat
+            # "SCAN <table>" без индекса = полный проход по таблице
+            full_scans = [step for step in plan if step.startswith("SCAN") and "INDEX" not in step]
+            results[name] = {"avg_ms": round(avg_ms, 3), "plan": plan, "uses_index": not full_scans}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--progress-rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--compare", action="store_true", help="re-run without the 0001 indexes")
+    args = parser.parse_args()
+
+    upgrade_db()
+    start = time.perf_counter()
+    sizes = seed(args.progress_rows)
+    sizes["seed_seconds"] = round(time.perf_counter() - start, 1)
+    params = _params(sizes)
+
+    report = {"data": sizes, "params": params, "with_indexes": measure(params, args.repeat)}
+
+    if args.compare:
+        with engine.begin() as conn:
+            for name in NEW_INDEXES:
+                conn.exec_driver_sql(f"DROP INDEX {name}")
+            conn.exec_driver_sql("ANALYZE")
+        # Без индексов запросы на порядки медленнее — меньше повторов
+        report["without_indexes"] = measure(params, max(args.repeat // 10, 1))
+        with engine.begin() as conn:
+            for name, target in NEW_INDEXES.items():
+                unique = "UNIQUE " if name.startswith("ux_") else ""
+                conn.exec_driver_sql(f"CREATE {unique}INDEX {name} ON {target}")
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    all_indexed = all(r["uses_index"] for r in report["with_indexes"].values())
+    sys.exit(0 if all_indexed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# benchmarks/bench_roadmap_persistence.py
+"""
+Время записи одного сгенерированного роадмапа (8 модулей x 3 ресурса + 5 вопросов
++ практика + чекпоинт): старый путь (commit + refresh на каждый модуль)
+против write_roadmap (одна транзакция, bulk INSERT).
+
+    python -m benchmarks.bench_roadmap_persistence [--roadmaps 50] [--modules 8]
+
+Пишет во временную файловую SQLite-базу, чтобы fsync на каждый commit был честным.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import user, chat, roadmap, job  # noqa: F401 — регистрируем все таблицы
+from app.models.roadmap import (
+    Career, Module, Milestone, Resource, PracticeTask, Checkpoint, Question
+)
+from app.services.roadmap_persistence import save_roadmap_v2
+
+
+def make_ai_data(modules: int) -> dict:
+    return {
+        "roadmap_meta": {
+            "title": "Python Backend", "description": "d" * 200, "difficulty": "Intermediate",
+            "total_estimated_hours": modules * 10, "total_weeks": modules, "focus": "job-ready",
+            "assumptions": ["a", "b"],
+            "milestones": [{"name": "MS1", "modules": ["M1", "M2"], "outcome": "o"}],
+        },
+        "modules": [
+            {
+                "module_id": f"M{i}", "depends_on": [f"M{i - 1}"] if i > 1 else [],
+                "topic": f"Topic {i}", "goal": "g" * 100, "estimated_hours": 10,
+                "resources": [
+                    {"title": f"R{j}", "type": "docs", "url": "https://example.com", "search_query": "q",
+                     "level": "beginner", "why_this": "w" * 80, "time_estimate_hours": 2}
+                    for j in range(3)
+                ],
+                "practice_task": {"title": "P", "description": "d" * 300, "deliverables": ["x"],
+                                  "acceptance_criteria": ["y"]},
+                "checkpoint": {"what_to_show": "w", "how_to_self_check": "h", "rubric": ["r1", "r2"]},
+                "quiz": [
+                    {"question": f"Q{k}?", "options": ["A", "B", "C", "D"], "correct_index": 0,
+                     "explanation": "e" * 150}
+                    for k in range(5)
+                ],
+            }
+            for i in range(1, modules + 1)
+        ],
+    }
+
+
+def legacy_save(db, user_id: int, ai_data: dict):
+    """Старая реализация из roadmap_v2.generate_custom_roadmap_v2 (до bulk-записи)."""
+    meta = ai_data.get("roadmap_meta", {})
+    new_career = Career(
+        user_id=user_id, title=meta.get("title", "Untitled Roadmap"),
+        description=meta.get("description", ""), difficulty=meta.get("difficulty", "Intermediate"),
+        total_estimated_hours=meta.get("total_estimated_hours", 0),
+        total_weeks=meta.get("total_weeks", 0), focus=meta.get("focus", "job-ready"),
+        assumptions_json=json.dumps(meta.get("assumptions", []))
+    )
+    db.add(new_career)
+    db.commit()
+    db.refresh(new_career)
+
+    for ms_data in meta.get("milestones", []):
+        db.add(Milestone(
+            career_id=new_career.id, name=ms_data.get("name"),
+            modules_json=json.dumps(ms_data.get("modules", [])), outcome=ms_data.get("outcome")
+        ))
+
+    for module_data in ai_data["modules"]:
+        new_module = Module(
+            career_id=new_career.id, module_id_str=module_data.get("module_id"),
+            depends_on_json=json.dumps(module_data.get("depends_on", [])),
+            topic=module_data.get("topic"), goal=module_data.get("goal"),
+            estimated_hours=module_data.get("estimated_hours", 0)
+        )
+        db.add(new_module)
+        db.commit()
+        db.refresh(new_module)
+
+        for res_data in module_data.get("resources", []):
+            db.add(Resource(module_id=new_module.id, **res_data))
+        pt_data = module_data["practice_task"]
+        db.add(PracticeTask(
+            module_id=new_module.id, title=pt_data.get("title"), description=pt_data.get("description"),
+            deliverables_json=json.dumps(pt_data.get("deliverables", [])),
+            acceptance_criteria_json=json.dumps(pt_data.get("acceptance_criteria", []))
+        ))
+        cp_data = module_data["checkpoint"]
+        db.add(Checkpoint(
+            module_id=new_module.id, what_to_show=cp_data.get("what_to_show"),
+            how_to_self_check=cp_data.get("how_to_self_check"),
+            rubric_json=json.dumps(cp_data.get("rubric", []))
+        ))
+        for q_data in module_data.get("quiz", []):
+            db.add(Question(
+                module_id=new_module.id, question_text=q_data.get("question"),
+                options_json=json.dumps(q_data.get("options", [])),
+                correct_index=q_data.get("correct_index"), explanation=q_data.get("explanation")
+            ))
+
+    db.commit()
+    db.refresh(new_career)
+    # Ответ старого эндпоинта трогал все связи -> ленивые загрузки
+    for m in new_career.modules:
+        m.resources, m.practice_task, m.checkpoint, m.questions
+    new_career.milestones
+    return new_career
+
+
+def run(name: str, save, Session, roadmaps: int, ai_data: dict) -> dict:
+    timings = []
+    for _ in range(roadmaps):
+        db = Session()
+        start = time.perf_counter()
+        save(db, 1, ai_data)
+        timings.append((time.perf_counter() - start) * 1000)
+        db.close()
+    timings.sort()
+    return {
+        "name": name,
+        "roadmaps": roadmaps,
+        "mean_ms": round(statistics.mean(timings), 2),
+        "p50_ms": round(timings[len(timings) // 2], 2),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--roadmaps", type=int, default=50)
+    parser.add_argument("--modules", type=int, default=8)
+    args = parser.parse_args()
+
+    ai_data = make_ai_data(args.modules)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, save in (("legacy_per_module_commit", legacy_save), ("bulk_single_transaction", save_roadmap_v2)):
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, name + '.db')}")
+            Base.metadata.create_all(engine)
+            Session = sessionmaker(bind=engine, autoflush=False)
+            results.append(run(name, save, Session, args.roadmaps, ai_data))
+            engine.dispose()
+
+    speedup = results[0]["mean_ms"] / results[1]["mean_ms"] if results[1]["mean_ms"] else 0
+    print(json.dumps({"modules_per_roadmap": args.modules, "results": results,
+                      "speedup": round(speedup, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_roadmap_reads.py
+"""
+Количество SQL-запросов и латентность чтения роадмапов при росте данных.
+
+    python -m benchmarks.bench_roadmap_reads [--sizes 5,50,200] [--modules 8]
+
+Для каждого размера создает N карьер x M модулей x 3 ресурса с прогрессом
+пользователя по всем модулям и дергает GET /api/v1/roadmaps/ и
+GET /api/v1/roadmaps/{id}. Детальный ответ меряется дважды: "detail_cold" —
+со сброшенным кэшем снимков (контент читается из базы), "detail_warm" — из
+снимка в памяти (в базу идут только версия и статусы). Число запросов в каждой
+колонке не должно зависеть от N: если оно растет, скрипт завершается с кодом 1
+(годится как проверка в CI).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="smartpath-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("ROADMAP_CACHE_PATH", f"{_tmp}/roadmap_cache.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("GEMINI_API_KEY", "bench-offline")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.db.session import engine, SessionLocal  # noqa: E402
+from app.db.migrations import upgrade_db  # noqa: E402
+from app.models.roadmap import Career, Module, Resource, UserProgress  # noqa: E402
+from app.services.roadmap_snapshots import roadmap_snapshots  # noqa: E402
+
+_statements = []
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    _statements.append(statement)
+
+
+def seed(user_id: int, careers: int, modules: int):
+    with SessionLocal() as db:
+        for c in range(careers):
+            career_id = db.execute(insert(Career).values(
+                user_id=user_id if c % 2 else None, title=f"Career {c}", description="d"
+            ).returning(Career.id)).scalar_one()
+            module_ids = db.execute(
+                insert(Module).returning(Module.id, sort_by_parameter_order=True),
+                [{"career_id": career_id, "module_id_str": f"M{i + 1}", "order_index": i + 1, "topic": f"T{i}", "goal": "g"}
+                 for i in range(modules)]
+            ).scalars().all()
+            db.execute(insert(Resource), [
+                {"module_id": m, "title": "r", "type": "docs", "url": "https://x", "level": "beginner"}
+                for m in module_ids for _ in range(3)
+            ])
+            db.execute(insert(UserProgress), [
+                {"user_id": user_id, "module_id": m, "status": "AVAILABLE"} for m in module_ids
+            ])
+        db.commit()
+
+
+def measure(client: TestClient, headers: dict, url: str, repeat: int = 5, cold: bool = False) -> dict:
+    counts, timings = [], []
+    for _ in range(repeat):
+        if cold:
+            roadmap_snapshots.snapshots.clear()
+        _statements.clear()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        counts.append(len(_statements))
+    return {"queries": max(counts), "p50_ms": round(sorted(timings)[len(timings) // 2], 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="5,50,200")
+    parser.add_argument("--modules", type=int, default=8)
+    args = parser.parse_args()
+
+    upgrade_db()
+    client = TestClient(app)
+    client.post("/api/v1/auth/register", json={"email": "bench@example.com", "password": "bench"})
+    token = client.post("/api/v1/auth/login", data={"username": "bench@example.com", "password": "bench"}).json()
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    user_id = client.get("/api/v1/auth/me", headers=headers).json()["id"]
+
+    results, seeded = [], 0
+    for size in [int(s) for s in args.sizes.split(",")]:
+        seed(user_id, size - seeded, args.modules)
+        seeded = size
+        results.append({
+            "careers": size,
+            "list": measure(client, headers, "/api/v1/roadmaps/"),
+            "detail_cold": measure(client, headers, "/api/v1/roadmaps/1", cold=True),
+            # Первый запрос прогревает снимок, замеряются уже попадания
+            "detail_warm": measure(client, headers, "/api/v1/roadmaps/1"),
+        })
+
+    constant = all(len({r[key]["queries"] for r in results}) == 1
+                   for key in ("list", "detail_cold", "detail_warm"))
+    print(json.dumps({"modules_per_career": args.modules, "results": results,
+                      "constant_query_count": constant}, indent=2))
+    sys.exit(0 if constant else 1)
+
+
+if __name__ == "__main__":
+    main()
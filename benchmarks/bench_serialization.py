@@ -0,0 +1,142 @@
+# benchmarks/bench_serialization.py
+"""
+Микробенчмарк сериализации тяжелых ответов роадмапов (без БД и HTTP).
+
+    python -m benchmarks.bench_serialization [--careers 50] [--modules 8] [--repeat 50]
+
+Сравнивает для списка карьер (GET /api/v1/roadmaps/) и v2-роадмапа
+(8 модулей x 3 ресурса + 5 вопросов + задача + чекпоинт):
+- jsonable_encoder: валидация по response_model + jsonable_encoder + json.dumps
+  (путь FastAPI без dump_json, например до 0.130);
+- revalidate: модели собираются в эндпоинте, затем FastAPI валидирует их еще раз
+  и сериализует через dump_json (прежний v2-путь на свежем FastAPI);
+- serializer: ResponseSerializer — одна валидация и сразу байты.
+"""
+import argparse
+import json
+import os
+import time
+from typing import List
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+os.environ.setdefault("GEMINI_API_KEY", "bench-offline")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.core.serialization import ResponseSerializer  # noqa: E402
+from app.schemas.roadmap import CareerResponse  # noqa: E402
+from app.schemas.roadmap_v2 import CareerResponseV2, ModuleResponse  # noqa: E402
+
+
+def career_listing(careers: int, modules: int) -> list[dict]:
+    return [
+        {
+            "id": c, "title": f"Career {c}", "description": "Backend path " * 5,
+            "nodes": [
+                {
+                    "id": c * 100 + m, "title": f"Topic {m}", "description_content": "Goal " * 20,
+                    "summary": "Summary " * 10, "order_index": m + 1, "status": "LOCKED",
+                    "resources": [
+                        {"title": f"Resource {r}", "type": "docs", "url": f"https://example.com/{c}/{m}/{r}",
+                         "level": "beginner", "why_this": "Because " * 5}
+                        for r in range(3)
+                    ],
+                }
+                for m in range(modules)
+            ],
+        }
+        for c in range(careers)
+    ]
+
+
+def roadmap_v2(modules: int) -> dict:
+    return {
+        "roadmap_meta": {
+            "title": "Backend", "description": "d" * 200, "difficulty": "Intermediate",
+            "total_estimated_hours": 120, "total_weeks": 12, "focus": "job-ready",
+            "assumptions_json": ["Knows Python basics", "Has 10h/week"],
+        },
+        "modules": [
+            {
+                "module_id_str": f"M{m + 1}", "depends_on_json": [f"M{m}"] if m else [],
+                "topic": f"Topic {m}", "goal": "Goal " * 20, "estimated_hours": 10,
+                "resources": [
+                    {"title": f"R{r}", "type": "docs", "url": f"https://example.com/{m}/{r}", "search_query": "q",
+                     "level": "beginner", "why_this": "Because " * 5, "time_estimate_hours": 2}
+                    for r in range(3)
+                ],
+                "practice_task": {"title": "Task", "description": "Build " * 20,
+                                  "deliverables_json": ["repo", "readme"], "acceptance_criteria_json": ["tests"]},
+                "checkpoint": {"what_to_show": "demo", "how_to_self_check": "check " * 10, "rubric_json": ["a", "b"]},
+                "questions": [
+                    {"question_text": f"Question {q}?", "options_json": ["A", "B", "C", "D"],
+                     "correct_index": 0, "explanation": "Because " * 5}
+                    for q in range(5)
+                ],
+            }
+            for m in range(modules)
+        ],
+        "milestones": [{"name": "MS1", "modules_json": ["M1", "M2"], "outcome": "o"}],
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    fn()  # прогрев
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - start) * 1000 / repeat, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--careers", type=int, default=50)
+    parser.add_argument("--modules", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    listing = career_listing(args.careers, args.modules)
+    list_adapter = TypeAdapter(List[CareerResponse])
+    list_serializer = ResponseSerializer(List[CareerResponse])
+
+    roadmap = roadmap_v2(args.modules)
+    v2_adapter = TypeAdapter(CareerResponseV2)
+    v2_serializer = ResponseSerializer(CareerResponseV2)
+
+    def v2_revalidate():
+        built = CareerResponseV2(
+            roadmap_meta=roadmap["roadmap_meta"],
+            modules=[ModuleResponse.model_validate(m) for m in roadmap["modules"]],
+            milestones=roadmap["milestones"],
+        )
+        return v2_adapter.dump_json(v2_adapter.validate_python(built, from_attributes=True))
+
+    # Все пути должны давать одинаковый JSON
+    assert json.loads(list_serializer.dump(listing)) == jsonable_encoder(list_adapter.validate_python(listing))
+    assert json.loads(v2_serializer.dump(roadmap)) == json.loads(v2_revalidate())
+
+    results = {
+        "listing": {
+            "careers": args.careers,
+            "bytes": len(list_serializer.dump(listing)),
+            "jsonable_encoder_ms": timed(
+                lambda: json.dumps(jsonable_encoder(list_adapter.validate_python(listing))).encode(), args.repeat),
+            "serializer_ms": timed(lambda: list_serializer.dump(listing), args.repeat),
+        },
+        "roadmap_v2": {
+            "modules": args.modules,
+            "bytes": len(v2_serializer.dump(roadmap)),
+            "jsonable_encoder_ms": timed(
+                lambda: json.dumps(jsonable_encoder(v2_adapter.validate_python(roadmap))).encode(), args.repeat),
+            "revalidate_ms": timed(v2_revalidate, args.repeat),
+            "serializer_ms": timed(lambda: v2_serializer.dump(roadmap), args.repeat),
+        },
+    }
+    for section in results.values():
+        section["speedup_vs_jsonable_encoder"] = round(section["jsonable_encoder_ms"] / section["serializer_ms"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
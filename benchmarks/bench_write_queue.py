@@ -0,0 +1,125 @@
+# benchmarks/bench_write_queue.py
+"""
+Пропускная способность записей на SQLite: транзакция на каждый запрос
+(как сейчас) против очереди с одним писателем и group commit
+(SQLITE_WRITE_QUEUE_ENABLED).
+
+    python -m benchmarks.bench_write_queue [--writes 2000] [--concurrency 16] [--max-batch 64] [--max-delay-ms 2]
+
+Каждая запись — сохранение сообщения чата (та же единица, что в /chat/ask).
+--concurrency потоков пишут одновременно, как воркеры threadpool под нагрузкой.
+Файловая SQLite-база во временной папке, чтобы fsync на каждый commit был честным.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1.chat import _insert_message
+from app.db.base import Base
+from app.db.write_queue import SQLiteWriteQueue
+from app.models import user, chat, roadmap, job, stats  # noqa: F401 — регистрируем все таблицы
+
+
+def per_request_commit(url: str):
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=32)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def write(i: int):
+        with Session() as db:
+            _insert_message(db, i % 100 + 1, "user", f"question {i}", "Bench")
+            db.commit()
+
+    return write, engine.dispose
+
+
+def group_commit(url: str, max_batch: int, max_delay: float):
+    queue = SQLiteWriteQueue(url, enabled=True, max_batch=max_batch, max_delay=max_delay, max_pending=10 ** 6)
+    queue.start()
+
+    def write(i: int):
+        queue.submit(_insert_message, i % 100 + 1, "user", f"question {i}", "Bench").result()
+
+    return write, queue.stop, queue
+
+
+def run(name: str, write, writes: int, concurrency: int) -> dict:
+    latencies, errors = [], []
+    counter = iter(range(writes))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                write(i)
+            except Exception as e:  # "database is locked" и т.п. — считаем, а не падаем
+                errors.append(type(e).__name__)
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    pct = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "name": name,
+        "writes": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "writes_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(pct[49] * 1000, 2),
+        "p95_ms": round(pct[94] * 1000, 2),
+        "p99_ms": round(pct[98] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("per_request_commit", "group_commit"):
+            url = f"sqlite:///{os.path.join(tmp, name + '.db')}"
+            engine = create_engine(url)
+            Base.metadata.create_all(engine)
+            engine.dispose()
+
+            if name == "per_request_commit":
+                write, close = per_request_commit(url)
+                results.append(run(name, write, args.writes, args.concurrency))
+            else:
+                write, close, queue = group_commit(url, args.max_batch, args.max_delay_ms / 1000)
+                result = run(name, write, args.writes, args.concurrency)
+                result["queue"] = queue.stats()
+                results.append(result)
+            close()
+
+    baseline, grouped = results
+    speedup = grouped["writes_per_second"] / baseline["writes_per_second"] if baseline["writes_per_second"] else 0
+    print(json.dumps({"concurrency": args.concurrency, "results": results,
+                      "speedup": round(speedup, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -161,7 +161,18 @@ async function handleRegister(event) {
 async function loadRoadmaps() {
     // showLoading('Loading roadmaps...'); // Optional, might be too flashy for fast loads
     try {
-        const roadmaps = await apiRequest('/roadmaps/');
+        // Dashboard only needs titles: skip nodes/resources and page through with the cursor
+        const roadmaps = [];
+        const limit = 100;
+        let cursor = null;
+        while (true) {
+            const query = `?fields=id,title,description&include=&limit=${limit}` + (cursor ? `&cursor=${cursor}` : '');
+            const page = await apiRequest(`/roadmaps/${query}`);
+            if (!page) break;
+            roadmaps.push(...page);
+            if (page.length < limit) break;
+            cursor = page[page.length - 1].id;
+        }
         const container = document.getElementById('roadmap-list');
         container.innerHTML = '';
 
@@ -1,11 +1,10 @@
 # initial_data.py
 import sys
-import json
 
 sys.path.append(".")
 
-from app.db.session import SessionLocal, engine
-from app.db.base import Base
+from app.db.session import SessionLocal
+from app.db.migrations import upgrade_db
 
 # --- ВАЖНО: Импортируем ВСЕ модели, чтобы SQLAlchemy знала о них ---
 from app.models.user import User  # <--- Этой строки не хватало!
@@ -13,9 +12,9 @@ from app.models.roadmap import Career, Module, Question, UserProgress
 
 
 def init_db():
-    print("Creating tables...")
-    # Создаем таблицы (теперь User импортирован, и ошибка исчезнет)
-    Base.metadata.create_all(bind=engine)
+    print("Applying migrations...")
+    # Схема — через Alembic (то же, что `alembic upgrade head`)
+    upgrade_db()
 
     db = SessionLocal()
 
@@ -80,7 +79,7 @@ def init_db():
             new_question = Question(
                 node_id=new_node.id,
                 text=q_data["text"],
-                options_json=json.dumps(q_data["options"]),
+                options_json=q_data["options"],
                 correct_option_index=q_data["correct"]
             )
             db.add(new_question)
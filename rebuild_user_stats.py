@@ -0,0 +1,35 @@
+# rebuild_user_stats.py
+"""
+Сверка и пересборка user_stats из user_progress.
+
+    python rebuild_user_stats.py             # исправить расхождения
+    python rebuild_user_stats.py --dry-run   # только показать, сколько строк разошлось
+    python rebuild_user_stats.py --user 42   # один пользователь
+"""
+import argparse
+import sys
+
+sys.path.append(".")
+
+from app.db.session import SessionLocal
+from app.services.user_stats import rebuild_user_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--user", type=int, action="append", dest="user_ids")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = rebuild_user_stats(db, user_ids=args.user_ids, dry_run=args.dry_run)
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"checked={report['checked']} drifted={report['drifted']} fixed={report['fixed']}")
+
+
+if __name__ == "__main__":
+    main()